@@ -0,0 +1,197 @@
+"""Full-account data export, streamed with flat memory.
+
+Every table a user owns is read with ``yield_per`` (a server-side cursor on
+Postgres) and written out row by row, so memory use does not grow with the
+size of the account. Two formats:
+
+- ``zip``: ``account.json`` plus one CSV per table;
+- ``ndjson``: one JSON object per line, each tagged with its ``type``.
+
+Both are generators of byte chunks for a streamed response. The
+``export_account`` background job writes the same bytes to
+``ACCOUNT_EXPORT_DIR`` for large accounts; files older than
+``ACCOUNT_EXPORT_MAX_AGE`` seconds are deleted when the next export runs.
+"""
+import csv
+import io
+import json
+import os
+import time
+import uuid
+import zipfile
+from datetime import date, datetime
+
+from flask import current_app
+from sqlalchemy import select
+
+from app import db
+from jobs import job_handler
+from models import (
+    CustomFood, Exercise, ExerciseNote, FoodLog, Profile, User, WaterLog, WorkoutDay, WorkoutLog, WorkoutPlan,
+    WorkoutSet,
+)
+
+FORMAT_VERSION = 1
+FORMATS = {"zip": "application/zip", "ndjson": "application/x-ndjson"}
+YIELD_PER = 500
+CHUNK_BYTES = 64 * 1024
+
+
+def _columns(model):
+    # user_id is the same on every row; the account header says whose export it is
+    return [column for column in model.__table__.c if column.name != "user_id"]
+
+
+def _sections(user_id):
+    """(name, statement) for every table in the export, in a stable order."""
+    def owned(model):
+        return select(*_columns(model)).where(model.user_id == user_id).order_by(model.id)
+
+    return [
+        ("profile", owned(Profile)),
+        ("plans", owned(WorkoutPlan)),
+        ("days", select(*_columns(WorkoutDay)).join(WorkoutPlan)
+            .where(WorkoutPlan.user_id == user_id).order_by(WorkoutDay.id)),
+        ("exercises", select(*_columns(Exercise)).join(WorkoutDay).join(WorkoutPlan)
+            .where(WorkoutPlan.user_id == user_id).order_by(Exercise.id)),
+        ("workout_logs", owned(WorkoutLog)),
+        ("workout_sets", owned(WorkoutSet)),
+        ("exercise_notes", owned(ExerciseNote)),
+        ("food_logs", owned(FoodLog)),
+        ("water_logs", owned(WaterLog)),
+        ("custom_foods", owned(CustomFood)),
+    ]
+
+
+def _rows(stmt):
+    return db.session.execute(stmt.execution_options(yield_per=YIELD_PER))
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+def _account(user_id):
+    user = db.session.get(User, user_id)
+    return {
+        "format_version": FORMAT_VERSION,
+        "exported_at": datetime.utcnow().isoformat(),
+        "email": user.email,
+        "created_at": _plain(user.created_at),
+    }
+
+
+def _chunked(pieces):
+    """Join small strings into chunks of about CHUNK_BYTES."""
+    buffer, size = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= CHUNK_BYTES:
+            yield "".join(buffer).encode()
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer).encode()
+
+
+def ndjson_chunks(user_id):
+    def lines():
+        yield json.dumps({"type": "account", **_account(user_id)}) + "\n"
+        for name, stmt in _sections(user_id):
+            for row in _rows(stmt):
+                yield json.dumps({"type": name, **{k: _plain(v) for k, v in row._mapping.items()}}) + "\n"
+
+    return _chunked(lines())
+
+
+class _Sink:
+    """Write-only file for zipfile; the bytes written so far are handed out with ``take``."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def _csv_lines(stmt):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    result = _rows(stmt)
+    writer.writerow(result.keys())
+    for row in result:
+        writer.writerow([_plain(v) for v in row])
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+    yield out.getvalue()
+
+
+def zip_chunks(user_id):
+    # zipfile streams to a file it can't seek by writing sizes after each member
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("account.json", json.dumps(_account(user_id), indent=2))
+        for name, stmt in _sections(user_id):
+            with archive.open(f"{name}.csv", "w", force_zip64=True) as member:
+                for chunk in _chunked(_csv_lines(stmt)):
+                    member.write(chunk)
+                    if len(sink.buffer) >= CHUNK_BYTES:
+                        yield sink.take()
+    yield sink.take()
+
+
+def export_chunks(user_id, fmt):
+    return zip_chunks(user_id) if fmt == "zip" else ndjson_chunks(user_id)
+
+
+def download_name(fmt):
+    return f"forgefit_export_{date.today().isoformat()}.{fmt}"
+
+
+def _export_dir():
+    path = current_app.config["ACCOUNT_EXPORT_DIR"]
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _prune(directory):
+    cutoff = time.time() - current_app.config["ACCOUNT_EXPORT_MAX_AGE"]
+    for entry in os.scandir(directory):
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            pass  # Pruned by another worker
+
+
+def export_path(name):
+    """Path of a finished background export, or None once it has been pruned."""
+    path = os.path.join(_export_dir(), os.path.basename(name))
+    return path if os.path.exists(path) else None
+
+
+@job_handler("export_account")
+def export_account_job(user_id, fmt="zip"):
+    """Background job: write the export to ACCOUNT_EXPORT_DIR."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}'")
+    directory = _export_dir()
+    _prune(directory)
+    # Unguessable name, written under a temporary one so a half-written file is never served
+    name = f"{uuid.uuid4().hex}.{fmt}"
+    tmp = os.path.join(directory, name + ".tmp")
+    with open(tmp, "wb") as f:
+        for chunk in export_chunks(user_id, fmt):
+            f.write(chunk)
+    os.replace(tmp, os.path.join(directory, name))
+    return {"file": name, "filename": download_name(fmt)}
@@ -1,11 +1,32 @@
 import json
+import logging
 import os
 import re
-
-import anthropic
-
-from app import db
-from models import WorkoutPlan, WorkoutDay, Exercise, WorkoutLog, ExerciseNote
+import threading
+import time
+
+import metrics
+import plan_cache
+from instrumentation import external_call
+from jobs import ACTIVE_STATUSES, cancel, enqueue, job_handler, latest_job
+from plans import load_logs_and_notes, plan_exercises
+from plan_parser import PlanStreamParser
+from plan_writer import MAX_DAYS, create_plan
+from progression import local_plan
+
+logger = logging.getLogger(__name__)
+
+MODEL = "claude-sonnet-4-5-20250929"
+# Marks the end of a prompt prefix the API may cache and reuse across calls. Prefixes
+# shorter than MIN_CACHEABLE_TOKENS (for this model) are never cached, breakpoint or not
+CACHE_CONTROL = {"type": "ephemeral"}
+MIN_CACHEABLE_TOKENS = 1024
+# Follow-up requests for plan days that were missing or malformed
+MAX_REPAIR_ROUNDS = 1
+
+_client = None
+_client_key = None
+_client_lock = threading.Lock()
 
 PLAN_TYPE_LABELS = {
     "push_pull_legs": "Push / Pull / Legs",
@@ -36,14 +57,72 @@ PLAN_TYPE_INSTRUCTIONS = {
 }
 
 
-def generate_plan_with_ai(profile_data, week_number, previous_plan=None):
-    """Call Claude API to generate a structured workout plan."""
+def get_client():
+    """The process-wide Anthropic client.
+
+    One client means one HTTP connection pool, so calls after the first skip
+    the TCP/TLS handshake. The SDK client is safe to share between threads.
+    The SDK itself is imported here, on first use: it takes longer to import
+    than the rest of the app put together.
+    """
+    import anthropic
+
+    global _client, _client_key
     api_key = os.environ.get("ANTHROPIC_API_KEY")
     if not api_key:
         raise ValueError("ANTHROPIC_API_KEY environment variable is not set.")
+    with _client_lock:
+        if _client is None or _client_key != api_key:
+            _client = anthropic.Anthropic(api_key=api_key)
+            _client_key = api_key
+        return _client
+
+
+def _report_usage(call, started, usage, ttft=None):
+    """Record latency and token usage (including prompt-cache hits) for one API call."""
+    elapsed = time.monotonic() - started
+    cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+    cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+    metrics.observe(f"ai_{call}_seconds", elapsed)
+    if ttft is not None:
+        metrics.observe(f"ai_{call}_ttft_seconds", ttft)
+    metrics.incr("ai_input_tokens", usage.input_tokens, call=call)
+    metrics.incr("ai_output_tokens", usage.output_tokens, call=call)
+    metrics.incr("ai_cache_read_tokens", cache_read, call=call)
+    metrics.incr("ai_cache_write_tokens", cache_write, call=call)
+    logger.info(
+        "anthropic %s: %.2fs%s, input=%d cache_read=%d cache_write=%d output=%d",
+        call, elapsed, f" (first token {ttft:.2f}s)" if ttft is not None else "",
+        usage.input_tokens, cache_read, cache_write, usage.output_tokens,
+    )
+
+
+PLAN_SYSTEM_PROMPT = """You are an expert certified personal trainer and strength coach. Generate structured workout plans as JSON only. No explanations, no markdown fences — just the JSON array.
+
+Requirements for every plan:
+- Each day must include compound movements plus accessory/isolation work (5-8 exercises per day)
+- Calculate working weights as percentages of the user's 1RM for compound lifts
+- Round all weights to the nearest 2.5kg
+- Include appropriate sets and reps for the user's goal
+- Mark compound movements as is_compound: true
+- For EVERY exercise, set "muscle_group" to one of: chest, back, legs, shoulders, arms, core, glutes, full_body
+- For machine exercises (cable machines, adjustable benches, leg press, lat pulldown, etc.), include specific setup instructions in "notes" (e.g. "Set bench to position 3 — roughly 30° incline"). Reference the user's gym equipment brand where relevant.
 
-    client = anthropic.Anthropic(api_key=api_key)
+Return ONLY valid JSON — no markdown, no explanation. Use this exact format:
+[
+  {
+    "day_index": 0,
+    "label": "Day Name",
+    "exercises": [
+      {"name": "Exercise Name", "sets": 4, "reps": 8, "weight_kg": 70.0, "is_compound": true, "muscle_group": "chest", "notes": "Set bench to position 3 — roughly 30° incline"},
+      {"name": "Exercise Name", "sets": 3, "reps": 12, "weight_kg": 20.0, "is_compound": false, "muscle_group": "arms", "notes": ""}
+    ]
+  }
+]"""
 
+
+def _plan_profile_block(profile_data):
+    """The per-user part of the plan prompt, identical from week to week."""
     goal_desc = GOAL_LABELS.get(profile_data["goal"], profile_data["goal"])
     plan_type_desc = PLAN_TYPE_LABELS.get(profile_data["plan_type"], profile_data["plan_type"])
     plan_type_instr = PLAN_TYPE_INSTRUCTIONS.get(profile_data["plan_type"], "")
@@ -51,9 +130,7 @@ def generate_plan_with_ai(profile_data, week_number, previous_plan=None):
     gym_equipment = profile_data.get("gym_equipment") or "standard gym equipment"
     exercise_notes = profile_data.get("exercise_notes", {})
 
-    prompt = f"""Generate a {profile_data['days_per_week']}-day weekly workout plan.
-
-User profile:
+    block = f"""User profile:
 - Height: {profile_data['height_cm']}cm
 - Weight: {profile_data['weight_kg']}kg
 - Goal: {goal_desc}
@@ -61,25 +138,34 @@ User profile:
 - 1RM - Squat: {profile_data['squat_1rm']}kg, Bench Press: {profile_data['bench_1rm']}kg, Deadlift: {profile_data['deadlift_1rm']}kg, Overhead Press: {profile_data['ohp_1rm']}kg
 - Gym equipment: {gym_equipment}
 
-Plan type instructions: {plan_type_instr}
-
-This is WEEK {week_number}.
-
-Requirements:
-- Each day must include compound movements plus accessory/isolation work (5-8 exercises per day)
-- Calculate working weights as percentages of the user's 1RM for compound lifts
-- Round all weights to the nearest 2.5kg
-- Include appropriate sets and reps for the user's goal
-- Mark compound movements as is_compound: true
-- For EVERY exercise, set "muscle_group" to one of: chest, back, legs, shoulders, arms, core, glutes, full_body
-- For machine exercises (cable machines, adjustable benches, leg press, lat pulldown, etc.), include specific setup instructions in "notes" (e.g. "Set bench to position 3 — roughly 30° incline"). Reference the equipment brand ({gym_equipment}) where relevant."""
+Plan type instructions: {plan_type_instr}"""
 
     if exercise_notes:
-        notes_list = "\n".join(f"- {name}: {note}" for name, note in exercise_notes.items())
-        prompt += f"""
+        # Sorted so the block, and therefore the cache key, is stable
+        notes_list = "\n".join(f"- {name}: {note}" for name, note in sorted(exercise_notes.items()))
+        block += f"""
 
 User notes on specific exercises (account for these when programming):
 {notes_list}"""
+    return block
+
+
+def generate_plan_with_ai(profile_data, week_number, previous_plan=None):
+    """Call Claude API to generate a structured workout plan.
+
+    The trainer prompt and format spec, then the user's profile, are sent
+    as system blocks, without a cache breakpoint: together they are well
+    under MIN_CACHEABLE_TOKENS, so the API would not cache them. The reply
+    is parsed and validated day by day as it streams. Days that are
+    missing or can't be repaired are asked for again on their own, rather
+    than regenerating the whole plan; raises ValueError if that still
+    leaves gaps.
+    """
+    client = get_client()
+
+    prompt = f"""Generate a {profile_data['days_per_week']}-day weekly workout plan.
+
+This is WEEK {week_number}."""
 
     if previous_plan and week_number > 1:
         prompt += f"""
@@ -94,71 +180,131 @@ Apply progressive overload based on ACTUAL performance:
 - For accessories: add 1 rep or slightly increase weight based on actual performance
 - Keep the same exercise structure and day labels"""
 
-    prompt += """
-
-Return ONLY valid JSON — no markdown, no explanation. Use this exact format:
-[
-  {
-    "day_index": 0,
-    "label": "Day Name",
-    "exercises": [
-      {"name": "Exercise Name", "sets": 4, "reps": 8, "weight_kg": 70.0, "is_compound": true, "muscle_group": "chest", "notes": "Set bench to position 3 — roughly 30° incline"},
-      {"name": "Exercise Name", "sets": 3, "reps": 12, "weight_kg": 20.0, "is_compound": false, "muscle_group": "arms", "notes": ""}
+    system = [
+        {"type": "text", "text": PLAN_SYSTEM_PROMPT},
+        {"type": "text", "text": _plan_profile_block(profile_data)},
     ]
-  }
-]"""
-
-    message = client.messages.create(
-        model="claude-sonnet-4-5-20250929",
-        max_tokens=4096,
-        system="You are an expert certified personal trainer and strength coach. Generate structured workout plans as JSON only. No explanations, no markdown fences — just the JSON array.",
-        messages=[{"role": "user", "content": prompt}],
-    )
-
-    response_text = message.content[0].text.strip()
-
-    # Strip markdown code fences if present
-    response_text = re.sub(r"^```(?:json)?\s*", "", response_text)
-    response_text = re.sub(r"\s*```$", "", response_text)
-
-    plan_data = json.loads(response_text)
-
-    if not isinstance(plan_data, list):
-        raise ValueError("AI response was not a JSON array")
-
-    return plan_data
+    messages = [{"role": "user", "content": prompt}]
+    expected = min(int(profile_data["days_per_week"]), MAX_DAYS)
+
+    text, days = _stream_plan(client, system, messages, "plan")
+    days = (days + [None] * expected)[:expected]
+
+    for _ in range(MAX_REPAIR_ROUNDS):
+        missing = [position for position, day in enumerate(days) if day is None]
+        if not missing:
+            break
+        logger.info("AI plan missing or malformed days %s, asking for those again", missing)
+        metrics.incr("ai_plan_repairs")
+        indexes = ", ".join(str(position) for position in missing)
+        if text:
+            messages = messages + [{"role": "assistant", "content": text}]
+        messages = messages + [{"role": "user", "content": (
+            f"The days with day_index {indexes} were missing or not valid JSON. "
+            f"Return ONLY a JSON array containing those {len(missing)} day(s), in the same format."
+        )}]
+        text, repaired = _stream_plan(client, system, messages, "plan_repair")
+        repaired = [day for day in repaired if day is not None]
+        for position, day in zip(missing, repaired):
+            days[position] = {**day, "day_index": position}
+
+    missing = [position for position, day in enumerate(days) if day is None]
+    if missing:
+        raise ValueError(f"AI plan is missing days {missing}")
+    return days
+
+
+def _stream_plan(client, system, messages, call):
+    """Stream one plan response through the incremental parser. Returns (text, days).
+
+    A response that isn't a JSON array is abandoned as soon as that's clear
+    (PlanStructureError), without waiting for the rest of it.
+    """
+    started = time.monotonic()
+    first_token = None
+    parser = PlanStreamParser()
+    chunks = []
+    with external_call("anthropic", call), \
+            client.messages.stream(model=MODEL, max_tokens=4096, system=system, messages=messages) as stream:
+        for chunk in stream.text_stream:
+            if first_token is None:
+                first_token = time.monotonic() - started
+            chunks.append(chunk)
+            parser.feed(chunk)
+        usage = stream.get_final_message().usage
+    _report_usage(call, started, usage, ttft=first_token)
+    return "".join(chunks).strip(), parser.finish()
 
 
 def save_plan_to_db(user_id, week_number, plan_data):
     """Save a generated plan to the database."""
-    plan = WorkoutPlan(user_id=user_id, week_number=week_number)
-    db.session.add(plan)
-    db.session.flush()  # Get plan.id
-
-    for day_data in plan_data:
-        day = WorkoutDay(
-            plan_id=plan.id,
-            day_index=day_data["day_index"],
-            label=day_data["label"],
-        )
-        db.session.add(day)
-        db.session.flush()
-
-        for i, ex_data in enumerate(day_data.get("exercises", [])):
-            exercise = Exercise(
-                day_id=day.id,
-                order=i,
-                name=ex_data["name"],
-                sets=int(ex_data["sets"]),
-                reps=int(ex_data["reps"]),
-                weight_kg=float(ex_data["weight_kg"]),
-                is_compound=bool(ex_data.get("is_compound", False)),
-                notes=ex_data.get("notes", ""),
-                muscle_group=ex_data.get("muscle_group", ""),
-            )
-            db.session.add(exercise)
-
-    db.session.commit()
+    return create_plan(user_id, week_number, plan_data)
+
+
+@job_handler("generate_plan")
+def generate_plan_job(user_id, profile_data, week_number=None, previous_plan=None):
+    """Background job: generate a plan with Claude and save it for the user.
+
+    ``week_number=None`` starts over (onboarding, profile edits): a week-1
+    design saved after the user's latest week, so the history never forks.
+    From-scratch designs are first looked up in the plan cache and stored
+    there afterwards. If the API call fails, the rule-based generator builds
+    the plan instead.
+    """
+    design_week = week_number or 1
+    use_cache = plan_cache.cacheable(profile_data, previous_plan)
+    plan_data = plan_cache.lookup(profile_data, design_week) if use_cache else None
+    source = "cache"
+    if plan_data is None:
+        try:
+            plan_data = generate_plan_with_ai(profile_data, week_number=design_week, previous_plan=previous_plan)
+            source = "ai"
+        except Exception:
+            logger.warning("AI plan generation failed for user %s, using rule-based plan", user_id, exc_info=True)
+            plan_data = local_plan(profile_data, design_week, previous_plan)
+            source = "rules"
+        if use_cache and source == "ai":
+            plan_cache.store(profile_data, design_week, plan_data)
+    if not _is_latest_request(user_id, profile_data, week_number):
+        # The profile changed while this ran; the newer job saves the plan
+        return {"superseded": True}
+    plan = save_plan_to_db(user_id, week_number, plan_data)
+    return {"plan_id": plan.id, "week_number": plan.week_number, "source": source}
+
+
+def _same_request(job, profile_data, week_number):
+    payload = json.loads(job.payload or "{}")
+    # Compare after a JSON round trip, the form the job's handler receives
+    return [payload.get("profile_data"), payload.get("week_number")] == json.loads(
+        json.dumps([profile_data, week_number])
+    )
+
+
+def _is_latest_request(user_id, profile_data, week_number):
+    job = latest_job(user_id, "generate_plan")
+    return job is None or _same_request(job, profile_data, week_number)
+
+
+def queue_plan_generation(user_id, profile_data, week_number=None, previous_plan=None):
+    """Enqueue plan generation for a user.
+
+    A generation already in flight for the same profile and week is reused.
+    One for different inputs is superseded: cancelled if it hasn't started,
+    otherwise left to finish without saving its plan (see
+    ``generate_plan_job``).
+    """
+    job = latest_job(user_id, "generate_plan")
+    if job and job.status in ACTIVE_STATUSES:
+        if _same_request(job, profile_data, week_number):
+            return job
+        cancel(job.id)
+    return enqueue(
+        "generate_plan",
+        user_id=user_id,
+        profile_data=profile_data,
+        week_number=week_number,
+        previous_plan=previous_plan,
+    )
 
 
 def plan_to_dict(plan):
@@ -174,6 +320,7 @@ def plan_to_dict(plan):
                     "reps": ex.reps,
                     "weight_kg": ex.weight_kg,
                     "is_compound": ex.is_compound,
+                    "muscle_group": ex.muscle_group or "",
                     "notes": ex.notes or "",
                 }
                 for ex in day.exercises
@@ -184,27 +331,11 @@ def plan_to_dict(plan):
 
 
 def plan_to_dict_with_logs(plan, user_id):
-    """Convert a WorkoutPlan to a dict that includes actual logged performance and user notes."""
-    exercise_ids = []
-    exercise_names = []
-    for day in plan.days:
-        for ex in day.exercises:
-            exercise_ids.append(ex.id)
-            name_key = ex.name.lower().strip()
-            if name_key not in exercise_names:
-                exercise_names.append(name_key)
-
-    logs = WorkoutLog.query.filter(
-        WorkoutLog.exercise_id.in_(exercise_ids),
-        WorkoutLog.user_id == user_id,
-    ).all()
-    log_map = {log.exercise_id: log for log in logs}
-
-    user_notes = ExerciseNote.query.filter(
-        ExerciseNote.user_id == user_id,
-        ExerciseNote.exercise_name.in_(exercise_names),
-    ).all()
-    notes_map = {n.exercise_name: n.note for n in user_notes}
+    """Convert a WorkoutPlan to a dict that includes actual logged performance and user notes.
+
+    Load the plan with ``plans.get_latest_plan`` so walking days/exercises doesn't lazy-load.
+    """
+    log_map, notes_map = load_logs_and_notes(user_id, plan_exercises(plan))
 
     result = []
     for day in plan.days:
@@ -220,6 +351,7 @@ def plan_to_dict_with_logs(plan, user_id):
                 "prescribed_reps": ex.reps,
                 "prescribed_weight_kg": ex.weight_kg,
                 "is_compound": ex.is_compound,
+                "muscle_group": ex.muscle_group or "",
                 "notes": ex.notes or "",
             }
             log = log_map.get(ex.id)
@@ -234,58 +366,138 @@ def plan_to_dict_with_logs(plan, user_id):
     return result
 
 
-def chat_with_ai(message, plan, profile):
-    """Send a chat message to Claude with the user's plan context. Returns reply text and optionally a modified plan."""
-    api_key = os.environ.get("ANTHROPIC_API_KEY")
-    if not api_key:
-        raise ValueError("ANTHROPIC_API_KEY environment variable is not set.")
+PLAN_JSON_OPEN = "<plan_json>"
+
 
-    client = anthropic.Anthropic(api_key=api_key)
+CHAT_SYSTEM_PROMPT = """You are ForgeFit AI, a knowledgeable personal trainer assistant. The user has an active workout plan, shown below with their profile.
 
+Instructions:
+- Answer fitness questions helpfully and concisely.
+- If the user asks to MODIFY their plan (e.g. "make squats heavier", "swap bench for incline press", "add more arm work"), return the FULL modified plan as a JSON array at the end of your reply, wrapped in <plan_json>...</plan_json> tags.
+- The JSON must follow the exact same format as the current plan shown below.
+- If the user is just chatting or asking questions (not requesting changes), do NOT include plan JSON.
+- Keep responses concise (2-4 sentences max for conversational replies)."""
+
+
+def _chat_system_blocks(plan, profile):
+    """System prompt blocks for chat: fixed instructions, then the user's profile and plan.
+
+    A single cache breakpoint ends the second block, so the whole prefix is
+    cached as one: the instructions alone are too short to be cached, and
+    the plan JSON takes the prefix past MIN_CACHEABLE_TOKENS for a typical
+    plan. It only changes when the plan does.
+    """
     plan_dict = plan_to_dict(plan) if plan else []
     plan_type_desc = PLAN_TYPE_LABELS.get(profile.plan_type, profile.plan_type) if profile else "Unknown"
     goal_desc = GOAL_LABELS.get(profile.goal, profile.goal) if profile else "Unknown"
 
-    system_prompt = f"""You are ForgeFit AI, a knowledgeable personal trainer assistant. The user has an active workout plan.
-
-User profile:
+    context = f"""User profile:
 - Height: {profile.height_cm}cm, Weight: {profile.weight_kg}kg
 - Goal: {goal_desc}
 - Plan type: {plan_type_desc}
 - 1RM - Squat: {profile.squat_1rm}kg, Bench: {profile.bench_1rm}kg, Deadlift: {profile.deadlift_1rm}kg, OHP: {profile.ohp_1rm}kg
 
 Current plan (Week {plan.week_number}):
-{json.dumps(plan_dict, indent=2)}
+{json.dumps(plan_dict, indent=2)}"""
 
-Instructions:
-- Answer fitness questions helpfully and concisely.
-- If the user asks to MODIFY their plan (e.g. "make squats heavier", "swap bench for incline press", "add more arm work"), return the FULL modified plan as a JSON array at the end of your reply, wrapped in <plan_json>...</plan_json> tags.
-- The JSON must follow the exact same format as the current plan shown above.
-- If the user is just chatting or asking questions (not requesting changes), do NOT include plan JSON.
-- Keep responses concise (2-4 sentences max for conversational replies)."""
-
-    response = client.messages.create(
-        model="claude-sonnet-4-5-20250929",
-        max_tokens=4096,
-        system=system_prompt,
-        messages=[{"role": "user", "content": message}],
-    )
+    return [
+        {"type": "text", "text": CHAT_SYSTEM_PROMPT},
+        {"type": "text", "text": context, "cache_control": CACHE_CONTROL},
+    ]
 
-    reply_text = response.content[0].text.strip()
 
-    # Check if reply contains a modified plan
+def _split_plan_json(reply_text):
+    """Separate the visible reply from an optional <plan_json> block. Returns (reply, plan_data)."""
+    reply_text = reply_text.strip()
     plan_data = None
-    import re as _re
-    match = _re.search(r"<plan_json>(.*?)</plan_json>", reply_text, _re.DOTALL)
+    match = re.search(r"<plan_json>(.*?)</plan_json>", reply_text, re.DOTALL)
     if match:
         try:
             plan_json_str = match.group(1).strip()
-            plan_json_str = _re.sub(r"^```(?:json)?\s*", "", plan_json_str)
-            plan_json_str = _re.sub(r"\s*```$", "", plan_json_str)
+            plan_json_str = re.sub(r"^```(?:json)?\s*", "", plan_json_str)
+            plan_json_str = re.sub(r"\s*```$", "", plan_json_str)
             plan_data = json.loads(plan_json_str)
         except (json.JSONDecodeError, ValueError):
             plan_data = None
         # Remove the plan JSON from the visible reply
         reply_text = reply_text[:match.start()].strip()
-
     return reply_text, plan_data
+
+
+class _VisibleText:
+    """Passes streamed text through until a <plan_json> tag starts, then holds the rest back.
+
+    A chunk ending in what could be the start of the tag (e.g. "<plan") is
+    held until the next chunk shows whether it is.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.sent = 0
+        self.hidden = False
+
+    def feed(self, chunk):
+        self.text += chunk
+        if self.hidden:
+            return ""
+        start = self.text.find(PLAN_JSON_OPEN, self.sent)
+        if start != -1:
+            self.hidden = True
+            return self._release(start)
+        for k in range(min(len(PLAN_JSON_OPEN) - 1, len(self.text) - self.sent), 0, -1):
+            if PLAN_JSON_OPEN.startswith(self.text[-k:]):
+                return self._release(len(self.text) - k)
+        return self._release(len(self.text))
+
+    def finish(self):
+        return "" if self.hidden else self._release(len(self.text))
+
+    def _release(self, end):
+        out = self.text[self.sent:end]
+        self.sent = end
+        return out
+
+
+def stream_chat_with_ai(message, plan, profile):
+    """Stream a chat reply from Claude with the user's plan context.
+
+    The prompt is built before this returns, so the caller may release its
+    database session while the reply streams. Returns a generator of
+    ``("text", chunk)`` events for the visible reply, followed by one
+    ``("done", (reply_text, plan_data))``. A <plan_json> block is never
+    streamed; it is parsed once the reply is complete.
+    """
+    client = get_client()
+    system = _chat_system_blocks(plan, profile)
+
+    def events():
+        started = time.monotonic()
+        first_token = None
+        visible = _VisibleText()
+        with external_call("anthropic", "chat"), client.messages.stream(
+            model=MODEL,
+            max_tokens=4096,
+            system=system,
+            messages=[{"role": "user", "content": message}],
+        ) as stream:
+            for text in stream.text_stream:
+                if first_token is None:
+                    first_token = time.monotonic() - started
+                chunk = visible.feed(text)
+                if chunk:
+                    yield "text", chunk
+            usage = stream.get_final_message().usage
+        tail = visible.finish()
+        if tail:
+            yield "text", tail
+        _report_usage("chat", started, usage, ttft=first_token)
+        yield "done", _split_plan_json(visible.text)
+
+    return events()
+
+
+def chat_with_ai(message, plan, profile):
+    """Send a chat message to Claude with the user's plan context. Returns reply text and optionally a modified plan."""
+    for kind, value in stream_chat_with_ai(message, plan, profile):
+        if kind == "done":
+            return value
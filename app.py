@@ -24,20 +24,63 @@ def create_app():
             Path(__file__).parent / "forgefit.db"
         )
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    # "thread" runs background jobs in-process; "worker" leaves them for `flask worker`
+    app.config["JOB_BACKEND"] = os.environ.get("JOB_BACKEND", "thread")
+    app.config["JOB_THREADS"] = int(os.environ.get("JOB_THREADS", 4))
+    app.config["JOB_TIMEOUT"] = int(os.environ.get("JOB_TIMEOUT", 300))
+    # Open Food Facts upstream and product cache (TTLs in seconds)
+    app.config["OPEN_FOOD_FACTS_URL"] = os.environ.get("OPEN_FOOD_FACTS_URL", "https://world.openfoodfacts.org")
+    # Per-worker cap on in-flight Open Food Facts requests, and how long a call may wait for a slot
+    app.config["OPEN_FOOD_FACTS_MAX_CONCURRENCY"] = int(os.environ.get("OPEN_FOOD_FACTS_MAX_CONCURRENCY", 8))
+    app.config["OPEN_FOOD_FACTS_QUEUE_TIMEOUT"] = float(os.environ.get("OPEN_FOOD_FACTS_QUEUE_TIMEOUT", 2.0))
+    app.config["PRODUCT_CACHE_SIZE"] = int(os.environ.get("PRODUCT_CACHE_SIZE", 2048))
+    app.config["PRODUCT_CACHE_TTL"] = int(os.environ.get("PRODUCT_CACHE_TTL", 86400))
+    app.config["PRODUCT_CACHE_NEGATIVE_TTL"] = int(os.environ.get("PRODUCT_CACHE_NEGATIVE_TTL", 3600))
+    app.config["PRODUCT_CACHE_STALE_TTL"] = int(os.environ.get("PRODUCT_CACHE_STALE_TTL", 7 * 86400))
+    # Reuse of AI-designed plans across similar profiles; PLAN_CACHE=0 turns it off
+    app.config["PLAN_CACHE_ENABLED"] = os.environ.get("PLAN_CACHE", "1") != "0"
+    app.config["PLAN_CACHE_TTL"] = int(os.environ.get("PLAN_CACHE_TTL", 30 * 86400))
+    app.config["PLAN_CACHE_MAX_ENTRIES"] = int(os.environ.get("PLAN_CACHE_MAX_ENTRIES", 5000))
+    # Logged-in user/profile snapshot: USER_CACHE_URL (redis://...) shares it between workers and is
+    # required for more than one; the in-process cache is for a single process and on by default on SQLite
+    app.config["USER_CACHE_TTL"] = int(os.environ.get("USER_CACHE_TTL", 30))
+    app.config["USER_CACHE_SIZE"] = int(os.environ.get("USER_CACHE_SIZE", 4096))
+    app.config["USER_CACHE_URL"] = os.environ.get("USER_CACHE_URL", "")
+    sqlite = app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite")
+    app.config["USER_CACHE_LOCAL"] = os.environ.get("USER_CACHE_LOCAL", "1" if sqlite else "0") != "0"
+    # Rendered plan PDFs, keyed by content hash; least recently used are evicted past the size budget
+    app.config["PDF_CACHE_DIR"] = os.environ.get("PDF_CACHE_DIR") or os.path.join(app.instance_path, "pdf_cache")
+    app.config["PDF_CACHE_MAX_BYTES"] = int(os.environ.get("PDF_CACHE_MAX_BYTES", 200 * 1024 * 1024))
+    # Account exports prepared by background jobs, deleted after ACCOUNT_EXPORT_MAX_AGE seconds
+    app.config["ACCOUNT_EXPORT_DIR"] = os.environ.get("ACCOUNT_EXPORT_DIR") or os.path.join(app.instance_path, "exports")
+    app.config["ACCOUNT_EXPORT_MAX_AGE"] = int(os.environ.get("ACCOUNT_EXPORT_MAX_AGE", 86400))
+    # Apply pending schema migrations at boot: on by default only for SQLite; elsewhere run
+    # `flask migrate` once on deploy (or set AUTO_MIGRATE=1) rather than from every worker
+    app.config["AUTO_MIGRATE"] = os.environ.get("AUTO_MIGRATE", "1" if sqlite else "0") != "0"
+    # Requests slower than this are logged with their slowest queries;
+    # /metrics is off (404) until METRICS_TOKEN is set
+    app.config["SLOW_REQUEST_SECONDS"] = float(os.environ.get("SLOW_REQUEST_SECONDS", 1.0))
+    app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN", "")
 
     db.init_app(app)
     login_manager.init_app(app)
     login_manager.login_view = "auth.login"
 
-    from models import User
+    import instrumentation
+    instrumentation.init_app(app)
+
+    import user_cache
 
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return user_cache.load_user(int(user_id))
 
     from routes import register_blueprints
     register_blueprints(app)
 
+    from commands import register_commands
+    register_commands(app)
+
     @app.route("/")
     def index():
         if current_user.is_authenticated:
@@ -47,33 +90,24 @@ def create_app():
         return render_template("index.html")
 
     with app.app_context():
-        db.create_all()
-        _migrate_db()
+        _check_schema(app)
 
     return app
 
 
-def _migrate_db():
-    """Add new columns to existing tables without dropping data."""
-    from sqlalchemy import text
-    migrations = [
-        "ALTER TABLE profile ADD COLUMN gym_equipment VARCHAR(100) DEFAULT ''",
-        "ALTER TABLE exercise ADD COLUMN muscle_group VARCHAR(30) DEFAULT ''",
-        # Feature 1: macro goals
-        "ALTER TABLE profile ADD COLUMN age INTEGER",
-        "ALTER TABLE profile ADD COLUMN sex VARCHAR(10)",
-        "ALTER TABLE profile ADD COLUMN activity_level VARCHAR(20) DEFAULT 'moderate'",
-        "ALTER TABLE profile ADD COLUMN calorie_target FLOAT DEFAULT 0",
-        "ALTER TABLE profile ADD COLUMN protein_target_g FLOAT DEFAULT 0",
-        "ALTER TABLE profile ADD COLUMN carbs_target_g FLOAT DEFAULT 0",
-        "ALTER TABLE profile ADD COLUMN fat_target_g FLOAT DEFAULT 0",
-        # Feature 2: meal type on food log
-        "ALTER TABLE food_log ADD COLUMN meal_type VARCHAR(20) DEFAULT 'general'",
-    ]
-    for sql in migrations:
-        try:
-            with db.engine.connect() as conn:
-                conn.execute(text(sql))
-                conn.commit()
-        except Exception:
-            pass  # Column already exists
+def _check_schema(app):
+    """Compare the database's schema version with the code's: one query when they match.
+
+    Tables are only created by ``migrations.upgrade``; a new database is at
+    version 0, so it is built here on first boot when AUTO_MIGRATE is on
+(the default for SQLite).
+    """
+    import migrations
+
+    current, latest = migrations.check(db.engine)
+    if current >= latest:
+        return
+    if app.config["AUTO_MIGRATE"]:
+        migrations.upgrade(db.engine)
+    else:
+        app.logger.warning("Database schema is at version %d, expected %d; run `flask migrate`", current, latest)
@@ -0,0 +1,105 @@
+"""Benchmark: cold start of the app factory, with a budget.
+
+Runs ``create_app()`` in fresh interpreters under ``python -X importtime``
+against an already-migrated scratch SQLite database (or DATABASE_URL) and
+reports the median wall time, the slowest imports and the SQL run at boot.
+Exits non-zero when boot is over budget, issues more than
+``--max-statements`` statements, or imports one of the SDKs that should
+only load on first use, so it can guard startup in CI.
+
+    python -m benchmarks.boot --runs 5 --budget-ms 1500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY_MODULES = ("anthropic", "requests", "fpdf")
+
+# Executed in the child interpreter; prints one JSON line
+BOOT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+statements = []
+event.listen(Engine, "before_cursor_execute", lambda conn, cursor, sql, *args: statements.append(sql))
+from app import create_app
+create_app()
+print(json.dumps({
+    "ms": (time.perf_counter() - start) * 1000,
+    "statements": statements,
+    "lazy_loaded": [m for m in %r if m in sys.modules],
+}))
+"""
+
+
+def _parse_importtime(stderr):
+    """(total self time in ms, [(cumulative ms, top-level module)]) from -X importtime output."""
+    total_us = 0
+    top_level = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        total_us += int(self_us)
+        if not name.startswith("  "):  # Indentation marks nested imports
+            top_level.append((int(cumulative_us) / 1000, name.strip()))
+    return total_us / 1000, sorted(top_level, reverse=True)
+
+
+def _boot(env):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", BOOT_SCRIPT % (LAZY_MODULES,)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["import_ms"], result["imports"] = _parse_importtime(proc.stderr)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1500.0, help="Maximum median create_app() time.")
+    parser.add_argument("--max-statements", type=int, default=1, help="Maximum SQL statements at boot.")
+    parser.add_argument("--top", type=int, default=10, help="Slowest top-level imports to show.")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if not env.get("DATABASE_URL"):
+        env["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    # Build the schema first so the timed runs see an up-to-date database
+    subprocess.run([sys.executable, "-m", "flask", "--app", "app:create_app", "migrate"], cwd=ROOT, env=env, check=True)
+
+    runs = [_boot(env) for _ in range(args.runs)]
+    wall = statistics.median(r["ms"] for r in runs)
+    imports = statistics.median(r["import_ms"] for r in runs)
+    last = runs[-1]
+
+    print(f"create_app(): median {wall:.0f} ms over {args.runs} runs (imports {imports:.0f} ms)")
+    print("slowest top-level imports:")
+    for ms, name in last["imports"][:args.top]:
+        print(f"  {ms:>8.1f} ms  {name}")
+    print(f"SQL at boot: {len(last['statements'])} statement(s)")
+    for sql in last["statements"]:
+        print(f"  {' '.join(sql.split())[:100]}")
+
+    failures = []
+    if wall > args.budget_ms:
+        failures.append(f"boot took {wall:.0f} ms, budget is {args.budget_ms:.0f} ms")
+    if len(last["statements"]) > args.max_statements:
+        failures.append(f"boot ran {len(last['statements'])} statements, limit is {args.max_statements}")
+    if last["lazy_loaded"]:
+        failures.append(f"imported at boot: {', '.join(last['lazy_loaded'])}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
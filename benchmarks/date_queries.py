@@ -0,0 +1,106 @@
+"""Benchmark: daily food-log lookups as the table grows.
+
+Compares the old ``date(logged_at) == day`` filter (with and without the
+``(user_id, logged_at)`` index) against the half-open range filter from
+``dates.on_day`` on a scratch SQLite database (or DATABASE_URL).
+
+    python -m benchmarks.date_queries --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+DAYS = 365
+INDEX = "ix_food_log_user_logged_at"
+
+
+def _seed(db, FoodLog, total, already, users):
+    """Append rows until the table holds ``total``; logs are spread over users and a year."""
+    rng = random.Random(already)
+    now = datetime.utcnow()
+    batch = []
+    for _ in range(total - already):
+        batch.append({
+            "user_id": rng.randint(1, users),
+            "food_name": "Oats",
+            "serving_g": 80.0,
+            "calories": 300.0,
+            "protein_g": 10.0,
+            "carbs_g": 50.0,
+            "fat_g": 5.0,
+            "meal_type": "breakfast",
+            "logged_at": now - timedelta(minutes=rng.randint(0, DAYS * 24 * 60)),
+        })
+        if len(batch) >= 20000:
+            db.session.execute(FoodLog.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(FoodLog.__table__.insert(), batch)
+    db.session.commit()
+
+
+def _time(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--users", type=int, default=100, help="Rows are spread across this many users.")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    if not os.environ.get("DATABASE_URL"):
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+    from app import create_app, db
+    from dates import on_day
+    from models import FoodLog
+
+    app = create_app()
+    with app.app_context():
+        db.session.query(FoodLog).delete()
+        db.session.commit()
+        today = date.today()
+
+        def by_function():
+            return FoodLog.query.filter(
+                FoodLog.user_id == 42,
+                db.func.date(FoodLog.logged_at) == today,
+            ).all()
+
+        def by_range():
+            return FoodLog.query.filter(
+                FoodLog.user_id == 42,
+                on_day(FoodLog.logged_at, today),
+            ).all()
+
+        print(f"{'rows':>10}  {'no index ms':>12}  {'date(col) ms':>13}  {'range ms':>9}  {'speedup':>8}")
+        rows = 0
+        for size in sorted(args.sizes):
+            _seed(db, FoodLog, size, rows, args.users)
+            rows = size
+            assert len(by_function()) == len(by_range())
+            indexed_fn = _time(by_function, args.repeat)
+            indexed_range = _time(by_range, args.repeat)
+
+            db.session.execute(db.text(f"DROP INDEX {INDEX}"))
+            db.session.commit()
+            unindexed = _time(by_function, args.repeat)
+            db.session.execute(db.text(f"CREATE INDEX {INDEX} ON food_log (user_id, logged_at)"))
+            db.session.commit()
+
+            print(
+                f"{size:>10}  {unindexed:>12.3f}  {indexed_fn:>13.3f}  {indexed_range:>9.3f}"
+                f"  {unindexed / indexed_range:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
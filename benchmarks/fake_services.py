@@ -0,0 +1,155 @@
+"""Local stand-ins for the Anthropic Messages API and Open Food Facts.
+
+Both run on one threaded HTTP server so load tests never leave the machine
+or spend tokens. Every response waits ``latency_ms`` (plus up to
+``jitter_ms``) and fails with ``failure_rate`` probability: 529 overloaded
+for Anthropic, which the SDK retries, and 503 for Open Food Facts.
+
+Point the app at it with ``ANTHROPIC_BASE_URL`` and ``OPEN_FOOD_FACTS_URL``.
+Plan requests get a valid plan with the number of days asked for (or just
+the days a repair request names); anything else gets a short chat reply.
+Streaming requests are answered with the same server-sent events the real
+API sends.
+"""
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CHAT_REPLY = "Good question. Keep your rest periods around two minutes and focus on controlled reps."
+EXERCISE_NAMES = ["Back Squat", "Bench Press", "Deadlift", "Overhead Press", "Barbell Row", "Lat Pulldown"]
+
+
+def _plan_days(indexes):
+    return [
+        {
+            "day_index": i,
+            "label": f"Day {i + 1}",
+            "exercises": [
+                {"name": name, "sets": 4, "reps": 8, "weight_kg": 60.0, "is_compound": n < 3,
+                 "muscle_group": "full_body", "notes": ""}
+                for n, name in enumerate(EXERCISE_NAMES)
+            ],
+        }
+        for i in indexes
+    ]
+
+
+def _reply_text(body):
+    system = " ".join(block.get("text", "") for block in body.get("system") or [] if isinstance(block, dict))
+    last = body["messages"][-1]["content"]
+    last = last if isinstance(last, str) else " ".join(b.get("text", "") for b in last)
+    if "workout plans as JSON" not in system:
+        return CHAT_REPLY
+    repair = re.search(r"day_index ([\d, ]+) were missing", last)
+    if repair:
+        return json.dumps(_plan_days(int(i) for i in repair.group(1).split(",")))
+    days = re.search(r"Generate a (\d+)-day", last)
+    return json.dumps(_plan_days(range(int(days.group(1)) if days else 3)))
+
+
+class FakeServices:
+    def __init__(self, latency_ms=0, jitter_ms=0, failure_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.requests = {"anthropic": 0, "openfoodfacts": 0, "failures": 0}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _delay_and_fail(self, service):
+        with self._lock:
+            self.requests[service] += 1
+            delay = self.latency_ms + self._rng.uniform(0, self.jitter_ms)
+            fail = self._rng.random() < self.failure_rate
+            if fail:
+                self.requests["failures"] += 1
+        time.sleep(delay / 1000)
+        return fail
+
+    def start(self, host="127.0.0.1", port=0):
+        """Serve in a background thread. Returns the base URL."""
+        self._server = ThreadingHTTPServer((host, port), _handler(self))
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="fake-services", daemon=True).start()
+        return f"http://{host}:{self._server.server_port}"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def _handler(services):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _json(self, status, payload):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if services._delay_and_fail("openfoodfacts"):
+                return self._json(503, {"error": "unavailable"})
+            nutriments = {"energy-kcal_100g": 250, "proteins_100g": 10, "carbohydrates_100g": 30, "fat_100g": 8}
+            if url.path == "/cgi/search.pl":
+                q = parse_qs(url.query).get("search_terms", [""])[0]
+                products = [{"product_name": f"{q.title()} {i + 1}", "nutriments": nutriments} for i in range(6)]
+                return self._json(200, {"products": products})
+            match = re.match(r"^/api/v0/product/(\w+)\.json$", url.path)
+            if match:
+                product = {"product_name": f"Product {match.group(1)}", "nutriments": nutriments}
+                return self._json(200, {"status": 1, "product": product})
+            self._json(404, {"error": "not found"})
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            if urlparse(self.path).path != "/v1/messages":
+                return self._json(404, {"type": "error", "error": {"type": "not_found_error", "message": "not found"}})
+            if services._delay_and_fail("anthropic"):
+                return self._json(529, {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}})
+
+            text = _reply_text(body)
+            # Only prompts with a cache breakpoint can be served from the cache
+            cached = any(isinstance(block, dict) and block.get("cache_control") for block in body.get("system") or [])
+            usage = {"input_tokens": 200 if cached else 1200, "output_tokens": max(1, len(text) // 4),
+                     "cache_read_input_tokens": 1000 if cached else 0, "cache_creation_input_tokens": 0}
+            message = {"id": "msg_fake", "type": "message", "role": "assistant", "model": body.get("model"),
+                       "stop_reason": "end_turn", "stop_sequence": None}
+            if not body.get("stream"):
+                return self._json(200, {**message, "content": [{"type": "text", "text": text}], "usage": usage})
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+
+            def event(kind, payload):
+                self.wfile.write(f"event: {kind}\ndata: {json.dumps({'type': kind, **payload})}\n\n".encode())
+                self.wfile.flush()
+
+            event("message_start", {"message": {**message, "content": [], "stop_reason": None,
+                                                 "usage": {**usage, "output_tokens": 1}}})
+            event("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}})
+            for start in range(0, len(text), 40):
+                event("content_block_delta", {"index": 0, "delta": {"type": "text_delta", "text": text[start:start + 40]}})
+            event("content_block_stop", {"index": 0})
+            event("message_delta", {"delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                    "usage": {"output_tokens": usage["output_tokens"]}})
+            event("message_stop", {})
+
+    return Handler
@@ -0,0 +1,238 @@
+"""Load test: realistic user journeys against a live app with faked upstreams.
+
+Boots ``create_app()`` on a local threaded server against a scratch SQLite
+database (or DATABASE_URL, e.g. Postgres), with Anthropic and Open Food
+Facts replaced by ``benchmarks.fake_services``. Each virtual user signs up,
+onboards (waiting for the plan job), works through a session logging every
+set through /workout/sync, searches for and adds food, opens the progress
+page and chats with the coach.
+
+Prints JSON with p50/p95/p99 latency, error count and throughput per
+endpoint, suitable for diffing between commits:
+
+    python -m benchmarks.load --users 20 --iterations 2 --latency-ms 300 --failure-rate 0.02 > after.json
+"""
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from benchmarks.fake_services import FakeServices
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FOODS = ["oats", "chicken breast", "rice", "banana", "greek yogurt", "salmon", "eggs", "peanut butter"]
+PLAN_TIMEOUT = 120
+
+
+def percentile(sorted_samples, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_samples:
+        return None
+    rank = max(1, -(-len(sorted_samples) * p // 100))
+    return sorted_samples[int(rank) - 1]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, name, ms, ok):
+        with self._lock:
+            self.samples[name].append(ms)
+            if not ok:
+                self.errors[name] += 1
+
+    def summary(self, wall_seconds):
+        result = {}
+        for name in sorted(self.samples):
+            samples = sorted(self.samples[name])
+            result[name] = {
+                "count": len(samples),
+                "errors": self.errors[name],
+                "rps": round(len(samples) / wall_seconds, 2),
+                "mean_ms": round(statistics.fmean(samples), 1),
+                "p50_ms": round(percentile(samples, 50), 1),
+                "p95_ms": round(percentile(samples, 95), 1),
+                "p99_ms": round(percentile(samples, 99), 1),
+            }
+        return result
+
+
+class VirtualUser:
+    def __init__(self, base_url, recorder, rng):
+        import requests
+
+        self.http = requests.Session()
+        self.base_url = base_url
+        self.recorder = recorder
+        self.rng = rng
+
+    def call(self, name, method, path, expect=(200,), **kwargs):
+        start = time.perf_counter()
+        try:
+            resp = self.http.request(method, self.base_url + path, allow_redirects=False, timeout=60, **kwargs)
+        except Exception:
+            self.recorder.add(name, (time.perf_counter() - start) * 1000, ok=False)
+            return None
+        self.recorder.add(name, (time.perf_counter() - start) * 1000, ok=resp.status_code in expect)
+        return resp
+
+    def onboard(self):
+        email = f"load-{uuid.uuid4().hex[:12]}@example.com"
+        self.call("POST /auth/signup", "POST", "/auth/signup", expect=(302,),
+                  data={"email": email, "password": "secret123", "confirm_password": "secret123"})
+        bodyweight = self.rng.choice([60, 70, 80, 90, 100])
+        self.call("POST /profile/onboarding", "POST", "/profile/onboarding", expect=(302,), data={
+            "height_cm": 175, "weight_kg": bodyweight, "goal": self.rng.choice(["muscle", "strength", "general"]),
+            "plan_type": self.rng.choice(["full_body", "upper_lower", "push_pull_legs"]),
+            "days_per_week": self.rng.choice([3, 4, 5]),
+            "squat_1rm": bodyweight * self.rng.choice([1.0, 1.5, 2.0]), "bench_1rm": bodyweight,
+            "deadlift_1rm": bodyweight * 2, "ohp_1rm": bodyweight * 0.6,
+            "age": 30, "sex": "male", "activity_level": "moderate",
+        })
+        # Wait for the background plan job, timing it as a journey step
+        start = time.perf_counter()
+        while time.perf_counter() - start < PLAN_TIMEOUT:
+            resp = self.http.get(self.base_url + "/workout/plan", allow_redirects=False, timeout=60)
+            if resp.status_code == 200 and "/workout/session/" in resp.text:
+                self.recorder.add("job generate_plan", (time.perf_counter() - start) * 1000, ok=True)
+                return True
+            if "generation failed" in resp.text:
+                break
+            time.sleep(0.2)
+        self.recorder.add("job generate_plan", (time.perf_counter() - start) * 1000, ok=False)
+        return False
+
+    def workout_session(self):
+        resp = self.call("GET /workout/plan", "GET", "/workout/plan")
+        match = resp is not None and re.search(r"/workout/session/(\d+)", resp.text)
+        if not match:
+            return
+        resp = self.call("GET /workout/session/<id>", "GET", f"/workout/session/{match.group(1)}")
+        if resp is None:
+            return []
+        exercises = json.loads(re.search(r"var EXERCISES = (.*);", resp.text).group(1))
+        # Queued ops carry the account id, as offline_queue.js stamps them
+        user_id = int(re.search(r'data-user-id="(\d+)"', resp.text).group(1))
+        for ex in exercises:
+            for set_index in range(ex["sets"]):
+                op = {"key": uuid.uuid4().hex, "type": "set", "user_id": user_id, "exercise_id": ex["id"],
+                      "set_index": set_index, "reps": ex["reps"], "weight_kg": ex["weight_kg"]}
+                self.call("POST /workout/sync", "POST", "/workout/sync", json={"ops": [op]})
+        return exercises
+
+    def food(self):
+        resp = self.call("GET /food/search", "GET", "/food/search", params={"q": self.rng.choice(FOODS)})
+        results = resp.json() if resp is not None and resp.status_code == 200 else []
+        if results:
+            item = results[0]
+            self.call("POST /food/add", "POST", "/food/add", json={
+                "food_name": item["name"], "serving_g": 150, "cal_100g": item["cal_100g"],
+                "protein_100g": item["protein_100g"], "carbs_100g": item["carbs_100g"],
+                "fat_100g": item["fat_100g"], "meal_type": "lunch",
+            })
+        self.call("GET /food/", "GET", "/food/")
+
+    def progress(self, exercises):
+        self.call("GET /workout/progress", "GET", "/workout/progress")
+        if exercises:
+            self.call("GET /workout/progress/data", "GET", "/workout/progress/data",
+                      params={"exercise": exercises[0]["name"]})
+
+    def chat(self):
+        self.call("POST /api/chat", "POST", "/api/chat", json={"message": "How long should I rest between sets?"})
+
+    def run(self, iterations):
+        if not self.onboard():
+            return
+        for _ in range(iterations):
+            exercises = self.workout_session()
+            self.food()
+            self.progress(exercises)
+            self.chat()
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10, help="Concurrent virtual users.")
+    parser.add_argument("--iterations", type=int, default=2, help="Sessions per user after onboarding.")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="Fake upstream latency.")
+    parser.add_argument("--jitter-ms", type=float, default=100.0, help="Extra random upstream latency, up to this.")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of upstream calls that fail.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout.")
+    args = parser.parse_args()
+
+    services = FakeServices(args.latency_ms, args.jitter_ms, args.failure_rate, seed=args.seed)
+    fake_url = services.start()
+    os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "load.db"))
+    os.environ.update({
+        "ANTHROPIC_API_KEY": "load-test",
+        "ANTHROPIC_BASE_URL": fake_url,
+        "OPEN_FOOD_FACTS_URL": fake_url,
+        "JOB_BACKEND": "thread",
+        "PDF_CACHE_DIR": tempfile.mkdtemp(),
+    })
+
+    import logging
+    from werkzeug.serving import make_server
+
+    from app import create_app
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    app = create_app()
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="load-app", daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    recorder = Recorder()
+    users = [VirtualUser(base_url, recorder, random.Random(args.seed + i)) for i in range(args.users)]
+    threads = [threading.Thread(target=user.run, args=(args.iterations,)) for user in users]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    server.shutdown()
+    services.stop()
+
+    endpoints = recorder.summary(wall)
+    report = {
+        "revision": _git_revision(),
+        "database": app.config["SQLALCHEMY_DATABASE_URI"].split(":", 1)[0],
+        "config": vars(args),
+        "wall_seconds": round(wall, 2),
+        "requests": sum(e["count"] for e in endpoints.values()),
+        "errors": sum(e["errors"] for e in endpoints.values()),
+        "upstream": services.requests,
+        "endpoints": endpoints,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Benchmark: saving and replacing plans, per-day ORM flushes vs plan_writer.
+
+Plans of 5-7 days x 8 exercises are written with the old approach (one
+flush per day, one ORM add per exercise, days deleted one by one) and with
+``plan_writer``'s bulk inserts, on a scratch SQLite database (or
+DATABASE_URL). Reports statements per operation and mean wall time.
+
+    python -m benchmarks.plan_writes --days 5 6 7 --exercises 8
+"""
+import argparse
+import itertools
+import os
+import tempfile
+import time
+
+
+def _plan(days, exercises):
+    return [
+        {
+            "day_index": d,
+            "label": f"Day {d + 1}",
+            "exercises": [
+                {
+                    "name": f"Exercise {d}-{e}",
+                    "sets": 4,
+                    "reps": 8,
+                    "weight_kg": 60.0,
+                    "is_compound": e < 2,
+                    "muscle_group": "chest",
+                    "notes": "",
+                }
+                for e in range(exercises)
+            ],
+        }
+        for d in range(days)
+    ]
+
+
+def _legacy_save(db, models, user_id, week_number, plan_data):
+    """save_plan_to_db before plan_writer: a flush per day and an add per exercise."""
+    plan = models.WorkoutPlan(user_id=user_id, week_number=week_number)
+    db.session.add(plan)
+    db.session.flush()
+    _legacy_add_days(db, models, plan, plan_data)
+    db.session.commit()
+    return plan
+
+
+def _legacy_add_days(db, models, plan, plan_data):
+    for day_data in plan_data:
+        day = models.WorkoutDay(plan_id=plan.id, day_index=day_data["day_index"], label=day_data["label"])
+        db.session.add(day)
+        db.session.flush()
+        for i, ex_data in enumerate(day_data["exercises"]):
+            db.session.add(models.Exercise(
+                day_id=day.id,
+                order=i,
+                name=ex_data["name"],
+                sets=int(ex_data["sets"]),
+                reps=int(ex_data["reps"]),
+                weight_kg=float(ex_data["weight_kg"]),
+                is_compound=bool(ex_data.get("is_compound", False)),
+                notes=ex_data.get("notes", ""),
+                muscle_group=ex_data.get("muscle_group", ""),
+            ))
+
+
+def _legacy_replace(db, models, plan, plan_data):
+    """The chat route before plan_writer: ORM-delete each day, then re-add."""
+    for day in plan.days:
+        db.session.delete(day)
+    db.session.flush()
+    _legacy_add_days(db, models, plan, plan_data)
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, nargs="+", default=[5, 6, 7])
+    parser.add_argument("--exercises", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    if not os.environ.get("DATABASE_URL"):
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+    from sqlalchemy import event
+
+    import models
+    from app import create_app, db
+    from plan_writer import create_plan, replace_plan_days
+    from plans import get_latest_plan
+
+    app = create_app()
+    with app.app_context():
+        user = models.User(email="bench@example.com", password_hash="x")
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+        statements = [0]
+
+        @event.listens_for(db.engine, "before_cursor_execute")
+        def count(*_):
+            statements[0] += 1
+
+        def measure(fn):
+            statements[0] = 0
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                fn()
+            elapsed = (time.perf_counter() - start) / args.repeat * 1000
+            return statements[0] / args.repeat, elapsed
+
+        weeks = itertools.count(1)  # (user_id, week_number) is unique
+        print(f"{'plan':>6}  {'operation':>9}  {'old stmts':>9}  {'new stmts':>9}  {'old ms':>7}  {'new ms':>7}  {'speedup':>7}")
+        for days in args.days:
+            plan_data = _plan(days, args.exercises)
+            size = f"{days}x{args.exercises}"
+
+            old = measure(lambda: _legacy_save(db, models, user_id, next(weeks), plan_data))
+            new = measure(lambda: create_plan(user_id, next(weeks), plan_data))
+            print(f"{size:>6}  {'save':>9}  {old[0]:>9.0f}  {new[0]:>9.0f}  {old[1]:>7.2f}  {new[1]:>7.2f}  {old[1] / new[1]:>6.1f}x")
+
+            # Replacement works on a freshly loaded plan, as the chat route does
+            old = measure(lambda: _legacy_replace(db, models, get_latest_plan(user_id), plan_data))
+            new = measure(lambda: replace_plan_days(get_latest_plan(user_id), plan_data))
+            print(f"{size:>6}  {'replace':>9}  {old[0]:>9.0f}  {new[0]:>9.0f}  {old[1]:>7.2f}  {new[1]:>7.2f}  {old[1] / new[1]:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Benchmark: how much of the chat and plan prompts the API serves from its prompt cache.
+
+For rule-engine plans of a few sizes, counts the tokens in the stable
+system prefix of the chat and plan prompts (the token-counting endpoint),
+then sends a few chat messages through ``ai_engine.chat_with_ai`` and
+reports the ``ai_cache_read_tokens`` / ``ai_cache_write_tokens`` counters
+the app records for every call. A prefix under
+``ai_engine.MIN_CACHEABLE_TOKENS`` is never cached.
+
+Uses ANTHROPIC_API_KEY and spends tokens; ANTHROPIC_BASE_URL can point it at
+``benchmarks.fake_services`` instead, which has no token counting.
+
+    python -m benchmarks.prompt_cache --days 3 5 --messages 3
+"""
+import argparse
+import os
+import tempfile
+
+MESSAGES = [
+    "How long should I rest between sets of squats?",
+    "Is it fine to train on two days in a row?",
+    "What should I eat before a morning session?",
+    "How do I know when to add weight?",
+]
+
+
+def _profile_data(days):
+    return {
+        "height_cm": 180, "weight_kg": 80, "goal": "muscle", "plan_type": "upper_lower",
+        "days_per_week": days, "squat_1rm": 140, "bench_1rm": 100, "deadlift_1rm": 180, "ohp_1rm": 60,
+        "gym_equipment": "", "exercise_notes": {},
+    }
+
+
+def _prefix_tokens(client, system):
+    """Input tokens of a system prompt with a one-word message, or None without token counting."""
+    import anthropic
+
+    from ai_engine import MODEL
+
+    try:
+        counted = client.messages.count_tokens(model=MODEL, system=system, messages=[{"role": "user", "content": "Hi"}])
+    except anthropic.APIError:
+        return None
+    return counted.input_tokens
+
+
+def _show(tokens, minimum):
+    if tokens is None:
+        return "n/a"
+    return f"{tokens}{'' if tokens >= minimum else '*'}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, nargs="+", default=[3, 5])
+    parser.add_argument("--messages", type=int, default=3)
+    args = parser.parse_args()
+
+    if not os.environ.get("DATABASE_URL"):
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+    import metrics
+    import models
+    from ai_engine import (
+        MIN_CACHEABLE_TOKENS, PLAN_SYSTEM_PROMPT, _chat_system_blocks, _plan_profile_block, chat_with_ai, get_client,
+    )
+    from app import create_app, db
+    from plan_writer import create_plan
+    from plans import get_latest_plan
+    from progression import local_plan
+
+    app = create_app()
+    client = get_client()
+    with app.app_context():
+        print(f"{'plan':>6}  {'chat prefix':>11}  {'plan prefix':>11}  {'input':>7}  {'cache read':>10}  {'cache write':>11}")
+        for days in args.days:
+            profile_data = _profile_data(days)
+            user = models.User(email=f"cache-{days}@example.com", password_hash="x")
+            db.session.add(user)
+            db.session.flush()
+            profile_fields = {k: v for k, v in profile_data.items() if k != "exercise_notes"}
+            profile = models.Profile(user_id=user.id, **profile_fields)
+            db.session.add(profile)
+            db.session.commit()
+            create_plan(user.id, 1, local_plan(profile_data, 1))
+            plan = get_latest_plan(user.id)
+
+            chat_prefix = _prefix_tokens(client, _chat_system_blocks(plan, profile))
+            plan_prefix = _prefix_tokens(client, [
+                {"type": "text", "text": PLAN_SYSTEM_PROMPT},
+                {"type": "text", "text": _plan_profile_block(profile_data)},
+            ])
+
+            metrics.reset()
+            for i in range(args.messages):
+                chat_with_ai(MESSAGES[i % len(MESSAGES)], plan, profile)
+            # Streamed chat replies are recorded under call="chat"
+            totals = [metrics.get_counter(name, call="chat")
+                      for name in ("ai_input_tokens", "ai_cache_read_tokens", "ai_cache_write_tokens")]
+            size = f"{days}-day"
+            print(f"{size:>6}  {_show(chat_prefix, MIN_CACHEABLE_TOKENS):>11}  {_show(plan_prefix, MIN_CACHEABLE_TOKENS):>11}  "
+                  f"{totals[0]:>7}  {totals[1]:>10}  {totals[2]:>11}")
+        print(f"* under {MIN_CACHEABLE_TOKENS} tokens: too short to be cached")
+
+
+if __name__ == "__main__":
+    main()
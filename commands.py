@@ -0,0 +1,106 @@
+import click
+from flask.cli import with_appcontext
+
+
+def register_commands(app):
+    app.cli.add_command(worker_command)
+    app.cli.add_command(import_foods_command)
+    app.cli.add_command(rebuild_progress_command)
+    app.cli.add_command(rebuild_nutrition_command)
+    app.cli.add_command(migrate_command)
+    app.cli.add_command(export_account_command)
+
+
+@click.command("worker")
+@click.option("--once", is_flag=True, help="Exit once the queue is empty.")
+@click.option("--poll", default=1.0, show_default=True, help="Seconds to wait between polls when idle.")
+@with_appcontext
+def worker_command(once, poll):
+    """Run queued background jobs (plan generation)."""
+    from jobs import run_worker
+
+    run_worker(poll_interval=poll, once=once)
+
+
+@click.command("import-foods")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--chunk-size", default=5000, show_default=True, help="Rows per INSERT batch.")
+@with_appcontext
+def import_foods_command(path, chunk_size):
+    """Load an Open Food Facts CSV/TSV or JSONL dump (optionally .gz) into the local food table."""
+    from food_index import import_dump
+
+    total = import_dump(path, chunk_size=chunk_size, progress=lambda n: click.echo(f"  {n} products..."))
+    click.echo(f"Imported {total} products and rebuilt the search index.")
+
+
+@click.command("rebuild-progress")
+@click.option("--user-id", type=int, help="Only rebuild this user's stats.")
+@with_appcontext
+def rebuild_progress_command(user_id):
+    """Recompute the per-day progress rollup (e1RM, volume, PRs) from logged sets."""
+    from models import User
+    from progress import rebuild_daily_stats
+
+    user_ids = [user_id] if user_id else [uid for (uid,) in User.query.with_entities(User.id).order_by(User.id)]
+    for uid in user_ids:
+        days = rebuild_daily_stats(uid)
+        if days:
+            click.echo(f"  user {uid}: {days} exercise-days")
+    click.echo(f"Rebuilt progress stats for {len(user_ids)} users.")
+
+
+@click.command("rebuild-nutrition")
+@click.option("--user-id", type=int, help="Only rebuild this user's ledger.")
+@with_appcontext
+def rebuild_nutrition_command(user_id):
+    """Recompute the per-day nutrition ledger from the food and water logs."""
+    from models import User
+    from nutrition import rebuild_ledger
+
+    user_ids = [user_id] if user_id else [uid for (uid,) in User.query.with_entities(User.id).order_by(User.id)]
+    for uid in user_ids:
+        days = rebuild_ledger(uid)
+        if days:
+            click.echo(f"  user {uid}: {days} days")
+    click.echo(f"Rebuilt the nutrition ledger for {len(user_ids)} users.")
+
+
+@click.command("migrate")
+@click.option("--status", is_flag=True, help="Show the current and latest schema versions without migrating.")
+@click.option("--target", type=int, help="Stop at this schema version.")
+@with_appcontext
+def migrate_command(status, target):
+    """Create missing tables and apply pending schema migrations."""
+    import migrations
+    from app import db
+
+    if status:
+        current, latest = migrations.check(db.engine)
+        click.echo(f"Schema version {current} (latest {latest}).")
+        return
+    applied = migrations.upgrade(db.engine, target=target)
+    if applied:
+        click.echo(f"Applied migrations {', '.join(str(v) for v in applied)}; schema version {applied[-1]}.")
+    else:
+        click.echo("Schema is up to date.")
+
+
+@click.command("export-account")
+@click.argument("email")
+@click.option("--format", "fmt", type=click.Choice(["zip", "ndjson"]), default="zip", show_default=True)
+@click.option("--output", "-o", type=click.Path(dir_okay=False, writable=True), help="Defaults to the download file name.")
+@with_appcontext
+def export_account_command(email, fmt, output):
+    """Write a user's full data export (for support requests)."""
+    from account_export import download_name, export_chunks
+    from models import User
+
+    user = User.query.filter_by(email=email.strip().lower()).first()
+    if user is None:
+        raise click.ClickException(f"No user with email {email}")
+    output = output or download_name(fmt)
+    with open(output, "wb") as f:
+        for chunk in export_chunks(user.id, fmt):
+            f.write(chunk)
+    click.echo(f"Wrote {output}.")
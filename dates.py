@@ -0,0 +1,32 @@
+"""Calendar-day helpers for per-user time-series queries.
+
+Filter with ``logged_at >= start AND logged_at < end`` instead of
+``date(logged_at) == day``: wrapping the column in a function hides it from
+the ``(user_id, logged_at)`` indexes and forces a scan of every row.
+"""
+from datetime import datetime, time, timedelta
+
+from app import db
+
+
+def day_bounds(day):
+    """Half-open ``[start, end)`` timestamps covering one calendar day."""
+    return range_bounds(day, day)
+
+
+def range_bounds(first_day, last_day):
+    """Half-open ``[start, end)`` timestamps covering ``first_day``..``last_day`` inclusive."""
+    start = datetime.combine(first_day, time.min)
+    end = datetime.combine(last_day + timedelta(days=1), time.min)
+    return start, end
+
+
+def on_day(column, day):
+    """SQL filter matching rows whose ``column`` falls on ``day``."""
+    return between_days(column, day, day)
+
+
+def between_days(column, first_day, last_day):
+    """SQL filter matching rows whose ``column`` falls within the inclusive day range."""
+    start, end = range_bounds(first_day, last_day)
+    return db.and_(column >= start, column < end)
@@ -0,0 +1,217 @@
+"""Two-level cache for Open Food Facts search and barcode lookups.
+
+Lookups go through an in-process LRU, then the shared ``product_cache_entry``
+table, and only then upstream. Entries have a fresh TTL and a longer stale
+window: a stale hit is returned immediately while a background thread
+revalidates it. "Not found" answers are cached too, with a shorter TTL.
+Concurrent misses for the same key share one upstream call (``SingleFlight``).
+
+The upstream source is pluggable: ``ProductCache(source=...)`` takes any
+object with ``search(q)`` and ``barcode(code)``. The app's instance lives in
+``app.extensions["product_cache"]`` and can be replaced in tests.
+"""
+import json
+import logging
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+import metrics
+from app import db
+from models import ProductCacheEntry
+from openfoodfacts import OpenFoodFactsSource
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(q):
+    return re.sub(r"\s+", " ", q.strip().lower())
+
+
+class LRUCache:
+    """Small thread-safe LRU of key -> (value, fresh_until, stale_until)."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SingleFlight:
+    """Run at most one call per key at a time; concurrent callers wait for and share its result."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event(), "value": None, "error": None}
+        if not leader:
+            metrics.incr("product_cache_coalesced")
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["value"]
+        try:
+            call["value"] = fn()
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+        return call["value"]
+
+
+class ProductCache:
+    def __init__(self, source=None, memory_size=1024, ttl=86400, negative_ttl=3600, stale_ttl=7 * 86400):
+        self.source = source or OpenFoodFactsSource()
+        self.memory = LRUCache(memory_size)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self._flight = SingleFlight()
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+
+    def search(self, q):
+        """Cached product search. Returns a (possibly empty) list of results."""
+        q = normalize_query(q)
+        return self._get("search:" + q, lambda: self.source.search(q)) or []
+
+    def barcode(self, code):
+        """Cached barcode lookup. Returns a result dict, or None if the product doesn't exist."""
+        code = code.strip()
+        return self._get("barcode:" + code, lambda: self.source.barcode(code))
+
+    def _get(self, key, loader):
+        now = datetime.utcnow()
+        entry = self.memory.get(key)
+        if entry is None:
+            entry = self._load_from_db(key)
+            if entry is not None:
+                self.memory.set(key, entry)
+
+        if entry is not None:
+            value, fresh_until, stale_until = entry
+            if now < fresh_until:
+                return value
+            if now < stale_until:
+                self._revalidate_in_background(key, loader)
+                return value
+
+        try:
+            value = self._flight.do(key, lambda: self._fetch(key, loader))
+        except Exception:
+            if entry is not None:
+                # Upstream is down — an expired answer beats no answer
+                logger.warning("Open Food Facts lookup failed for %s, serving expired entry", key)
+                return entry[0]
+            raise
+        return value
+
+    def _fetch(self, key, loader):
+        entry = self.memory.get(key)
+        if entry is not None and datetime.utcnow() < entry[1]:
+            return entry[0]  # A flight that finished just before this one started already stored it
+        value = loader()
+        self._store(key, value)
+        return value
+
+    def _load_from_db(self, key):
+        row = ProductCacheEntry.query.filter_by(key=key).first()
+        if row is None:
+            return None
+        value = json.loads(row.payload) if row.found else None
+        return value, row.fresh_until, row.stale_until
+
+    def _store(self, key, value):
+        now = datetime.utcnow()
+        found = bool(value)
+        fresh_until = now + timedelta(seconds=self.ttl if found else self.negative_ttl)
+        stale_until = fresh_until + timedelta(seconds=self.stale_ttl)
+        self.memory.set(key, (value, fresh_until, stale_until))
+
+        fields = {
+            "found": found,
+            "payload": json.dumps(value) if found else None,
+            "fetched_at": now,
+            "fresh_until": fresh_until,
+            "stale_until": stale_until,
+        }
+        try:
+            row = ProductCacheEntry.query.filter_by(key=key).first()
+            if row:
+                for attr, val in fields.items():
+                    setattr(row, attr, val)
+            else:
+                db.session.add(ProductCacheEntry(key=key, **fields))
+            db.session.commit()
+        except IntegrityError:
+            # Another worker inserted the same key first; its copy is just as good
+            db.session.rollback()
+
+    def _revalidate_in_background(self, key, loader):
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        app = current_app._get_current_object()
+
+        def refresh():
+            try:
+                with app.app_context():
+                    try:
+                        self._flight.do(key, lambda: self._fetch(key, loader))
+                    except Exception:
+                        logger.warning("Background refresh failed for %s", key, exc_info=True)
+                    finally:
+                        db.session.remove()
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name="product-cache-refresh", daemon=True).start()
+
+
+def get_product_cache():
+    """The app-wide ProductCache, created on first use from config."""
+    cache = current_app.extensions.get("product_cache")
+    if cache is None:
+        config = current_app.config
+        cache = ProductCache(
+            memory_size=config["PRODUCT_CACHE_SIZE"],
+            ttl=config["PRODUCT_CACHE_TTL"],
+            negative_ttl=config["PRODUCT_CACHE_NEGATIVE_TTL"],
+            stale_ttl=config["PRODUCT_CACHE_STALE_TTL"],
+        )
+        current_app.extensions["product_cache"] = cache
+    return cache
@@ -0,0 +1,203 @@
+"""Offline food database: dump importer and full-text product search.
+
+``import_dump`` streams an Open Food Facts CSV/TSV or JSONL dump (optionally
+gzipped) into the ``food_product`` table in fixed-size chunks, so memory use
+does not depend on the size of the dump. The search index is SQLite FTS5
+locally and ``tsvector`` + trigram GIN indexes on Postgres.
+"""
+import csv
+import gzip
+import json
+import logging
+import re
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from models import FoodProduct
+from openfoodfacts import extract_nutriments
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "food_product_fts"
+# A one-word query is only prefix-matched from this length on: "c" or "ch"
+# match a large share of the table, and every match is ranked
+MIN_PREFIX = 3
+
+
+def _open(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def _iter_records(path):
+    """Yield raw product dicts from a JSONL or CSV/TSV dump, one at a time."""
+    name = path[:-3] if path.endswith(".gz") else path
+    with _open(path) as f:
+        if name.endswith((".jsonl", ".ndjson", ".json")):
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        else:
+            # Product descriptions in the official dump exceed csv's default field limit
+            csv.field_size_limit(2**31 - 1)
+            header = f.readline()
+            delimiter = "\t" if "\t" in header else ","
+            fields = next(csv.reader([header], delimiter=delimiter))
+            for row in csv.DictReader(f, fieldnames=fields, delimiter=delimiter):
+                yield row
+
+
+def _to_row(record):
+    """Map a dump record to a food_product row, or None if it's unusable."""
+    code = str(record.get("code") or "").strip()
+    name = str(record.get("product_name") or "").strip()
+    if not code or not name:
+        return None
+    # JSONL keeps nutriments nested; the CSV flattens them into columns
+    nutriments = record.get("nutriments") if isinstance(record.get("nutriments"), dict) else record
+    try:
+        values = extract_nutriments(nutriments)
+    except (TypeError, ValueError):
+        return None
+    if not values["cal_100g"]:
+        return None
+    brand = str(record.get("brands") or "").split(",")[0].strip()
+    return {"code": code[:64], "name": name[:200], "brand": brand[:200], **values}
+
+
+def _upsert(rows):
+    insert = pg_insert if db.engine.dialect.name == "postgresql" else sqlite_insert
+    stmt = insert(FoodProduct)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["code"],
+        set_={col: stmt.excluded[col] for col in ("name", "brand", "cal_100g", "protein_100g", "carbs_100g", "fat_100g")},
+    )
+    db.session.execute(stmt, rows)
+
+
+def import_dump(path, chunk_size=5000, progress=None):
+    """Stream a dump into food_product and rebuild the search index. Returns rows written."""
+    total = 0
+    chunk = {}
+    for record in _iter_records(path):
+        row = _to_row(record)
+        if row is None:
+            continue
+        chunk[row["code"]] = row  # later duplicates in a chunk win
+        if len(chunk) >= chunk_size:
+            _upsert(list(chunk.values()))
+            db.session.commit()
+            total += len(chunk)
+            chunk = {}
+            if progress:
+                progress(total)
+    if chunk:
+        _upsert(list(chunk.values()))
+        db.session.commit()
+        total += len(chunk)
+        if progress:
+            progress(total)
+
+    build_search_index()
+    return total
+
+
+def build_search_index():
+    """Create (or rebuild) the full-text index over food_product names."""
+    if db.engine.dialect.name == "postgresql":
+        statements = [
+            "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+            "CREATE INDEX IF NOT EXISTS ix_food_product_name_tsv "
+            "ON food_product USING gin (to_tsvector('simple', name || ' ' || coalesce(brand, '')))",
+            "CREATE INDEX IF NOT EXISTS ix_food_product_name_trgm "
+            "ON food_product USING gin (name gin_trgm_ops)",
+        ]
+    else:
+        statements = [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "name, brand, content='food_product', content_rowid='id', prefix='2 3 4', "
+            "tokenize='unicode61 remove_diacritics 2')",
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES('rebuild')",
+        ]
+    for sql in statements:
+        db.session.execute(text(sql))
+    db.session.commit()
+
+
+def _tokens(q):
+    return re.findall(r"\w+", q.lower())
+
+
+def _match_expression(tokens):
+    """FTS5 query: every token as a prefix, except a lone token shorter than MIN_PREFIX, which must match whole."""
+    if len(tokens) == 1 and len(tokens[0]) < MIN_PREFIX:
+        return f'"{tokens[0]}"'
+    return " ".join(f'"{t}"*' for t in tokens)
+
+
+def _product_dict(p):
+    name = f"{p.name} ({p.brand})" if p.brand else p.name
+    return {
+        "name": name,
+        "cal_100g": p.cal_100g,
+        "protein_100g": p.protein_100g,
+        "carbs_100g": p.carbs_100g,
+        "fat_100g": p.fat_100g,
+        "custom": False,
+    }
+
+
+def search_local(q, limit=6):
+    """Prefix full-text search over the local product table. Returns result dicts."""
+    tokens = _tokens(q)
+    if not tokens:
+        return []
+
+    if db.engine.dialect.name == "postgresql":
+        tsquery = " & ".join(f"{t}:*" for t in tokens)
+        document = db.func.to_tsvector("simple", FoodProduct.name + " " + db.func.coalesce(FoodProduct.brand, ""))
+        query = db.func.to_tsquery("simple", tsquery)
+        products = FoodProduct.query.filter(document.op("@@")(query)).order_by(
+            db.func.ts_rank(document, query).desc()
+        ).limit(limit).all()
+        if not products:
+            # Typos: fall back to trigram similarity
+            products = FoodProduct.query.filter(FoodProduct.name.op("%")(q)).order_by(
+                db.func.similarity(FoodProduct.name, q).desc()
+            ).limit(limit).all()
+        return [_product_dict(p) for p in products]
+
+    try:
+        # Rank every match, keeping the best ``limit``; capping the candidates
+        # first would rank an arbitrary, rowid-ordered subset of them
+        ids = [row[0] for row in db.session.execute(
+            text(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match ORDER BY rank LIMIT :limit"),
+            {"match": _match_expression(tokens), "limit": limit},
+        )]
+    except OperationalError:
+        # No dump imported yet, so there's no FTS table
+        db.session.rollback()
+        return []
+    if not ids:
+        return []
+    by_id = {p.id: p for p in FoodProduct.query.filter(FoodProduct.id.in_(ids))}
+    return [_product_dict(by_id[i]) for i in ids if i in by_id]
+
+
+def lookup_local_barcode(code):
+    """Find a product in the local table by barcode, or None."""
+    product = FoodProduct.query.filter_by(code=code.strip()).first()
+    if product is None:
+        return None
+    result = _product_dict(product)
+    result.pop("custom")
+    return result
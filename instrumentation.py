@@ -0,0 +1,127 @@
+"""Per-request instrumentation: SQL, external calls and latency.
+
+``init_app`` hooks SQLAlchemy's cursor events and Flask's request cycle so
+every request records, in ``metrics``:
+
+- ``http_request_seconds`` by blueprint, method and status class;
+- ``http_request_sql_queries`` and ``http_request_sql_seconds`` by blueprint;
+- ``external_call_seconds`` (and ``external_call_errors``) by service and
+  operation, for code wrapped in ``external_call``.
+
+Responses carry a ``Server-Timing`` header splitting the time into SQL,
+external calls and the rest. Requests slower than ``SLOW_REQUEST_SECONDS``
+are logged with their slowest SQL statements and external calls. Streamed
+responses are measured up to the point the stream starts.
+"""
+import logging
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+import metrics
+from app import db
+
+logger = logging.getLogger(__name__)
+
+MAX_CAPTURED_STATEMENTS = 50
+SLOW_LOG_STATEMENTS = 5
+COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 20, 30, 50, 100)
+
+
+def _state():
+    return g.get("_instrumentation") if has_request_context() else None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["_query_start"].pop()
+    state = _state()
+    if state is None:
+        return
+    state["queries"] += 1
+    state["sql_seconds"] += elapsed
+    statements = state["statements"]
+    if len(statements) < MAX_CAPTURED_STATEMENTS:
+        statements.append((elapsed, statement))
+    else:
+        # Once the buffer is full, keep the slowest statements seen
+        fastest = min(range(len(statements)), key=lambda i: statements[i][0])
+        if elapsed > statements[fastest][0]:
+            statements[fastest] = (elapsed, statement)
+
+
+@contextmanager
+def external_call(service, operation):
+    """Time a call to an outside service, e.g. ``with external_call("anthropic", "chat"):``."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        metrics.incr("external_call_errors", service=service, operation=operation)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.observe("external_call_seconds", elapsed, service=service, operation=operation)
+        state = _state()
+        if state is not None:
+            state["external"].append((elapsed, f"{service} {operation}"))
+
+
+def _before_request():
+    g._instrumentation = {
+        "start": time.perf_counter(),
+        "queries": 0,
+        "sql_seconds": 0.0,
+        "statements": [],
+        "external": [],
+    }
+
+
+def _after_request(response):
+    state = g.pop("_instrumentation", None)
+    if state is None:
+        return response
+    elapsed = time.perf_counter() - state["start"]
+    external_seconds = sum(seconds for seconds, _ in state["external"])
+    blueprint = request.blueprint or request.endpoint or "unmatched"
+
+    metrics.observe("http_request_seconds", elapsed, blueprint=blueprint, method=request.method,
+                    status=f"{response.status_code // 100}xx")
+    metrics.observe("http_request_sql_queries", state["queries"], buckets=COUNT_BUCKETS, blueprint=blueprint)
+    metrics.observe("http_request_sql_seconds", state["sql_seconds"], blueprint=blueprint)
+
+    response.headers["Server-Timing"] = ", ".join([
+        f"db;desc=\"{state['queries']} queries\";dur={state['sql_seconds'] * 1000:.1f}",
+        f"ext;dur={external_seconds * 1000:.1f}",
+        f"total;dur={elapsed * 1000:.1f}",
+    ])
+
+    if elapsed >= current_app.config["SLOW_REQUEST_SECONDS"]:
+        _log_slow_request(response, elapsed, state)
+    return response
+
+
+def _log_slow_request(response, elapsed, state):
+    slowest = sorted(state["statements"], key=lambda s: s[0], reverse=True)[:SLOW_LOG_STATEMENTS]
+    lines = [
+        f"Slow request {request.method} {request.path} -> {response.status_code} in {elapsed:.2f}s: "
+        f"{state['queries']} queries ({state['sql_seconds']:.2f}s), "
+        f"{len(state['external'])} external calls ({sum(s for s, _ in state['external']):.2f}s)"
+    ]
+    lines += [f"  {seconds * 1000:8.1f} ms  {name}" for seconds, name in state["external"]]
+    lines += [f"  {seconds * 1000:8.1f} ms  {' '.join(sql.split())[:500]}" for seconds, sql in slowest]
+    logger.warning("\n".join(lines))
+
+
+def init_app(app):
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
@@ -0,0 +1,192 @@
+"""Persisted background jobs.
+
+Slow work (AI plan generation) is queued as a row in the ``job`` table and run
+outside the request. Two backends share the same table:
+
+- ``thread`` (default): jobs run on a small in-process thread pool, so a
+  single ``flask run`` / gunicorn deployment works without extra services.
+- ``worker``: requests only enqueue; a separate ``flask worker`` process
+  drains the table. Works on SQLite and Postgres, no Redis needed.
+"""
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import update
+
+from app import db
+from models import Job
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+HANDLERS = {}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def job_handler(kind):
+    """Register a function as the handler for jobs of the given kind."""
+    def decorator(func):
+        HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def enqueue(kind, user_id=None, **payload):
+    """Persist a job and, on the thread backend, start running it."""
+    if kind not in HANDLERS:
+        raise ValueError(f"No handler registered for job kind '{kind}'")
+
+    job = Job(kind=kind, user_id=user_id, payload=json.dumps(payload))
+    db.session.add(job)
+    db.session.commit()
+
+    if current_app.config.get("JOB_BACKEND", "thread") == "thread":
+        app = current_app._get_current_object()
+        _get_executor(app).submit(_run_in_app_context, app, job.id)
+
+    return job
+
+
+def _get_executor(app):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=app.config.get("JOB_THREADS", 4),
+                thread_name_prefix="forgefit-job",
+            )
+    return _executor
+
+
+def _run_in_app_context(app, job_id):
+    with app.app_context():
+        try:
+            run_job(job_id)
+        finally:
+            db.session.remove()
+
+
+def _claim(job_id):
+    """Atomically move a queued job to running. Returns True if we got it."""
+    result = db.session.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status == "queued")
+        .values(status="running", started_at=datetime.utcnow(), attempts=Job.attempts + 1)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def cancel(job_id):
+    """Atomically cancel a job that hasn't started. Returns False if it is already running or over."""
+    result = db.session.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status == "queued")
+        .values(status="cancelled", finished_at=datetime.utcnow())
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def run_job(job_id):
+    """Claim and execute a single job. No-op if someone else already claimed it."""
+    if _claim(job_id):
+        _execute(job_id)
+
+
+def _execute(job_id):
+    """Run the handler for an already-claimed job, recording its result or error."""
+    job = db.session.get(Job, job_id)
+    handler = HANDLERS.get(job.kind)
+    try:
+        if handler is None:
+            raise ValueError(f"No handler registered for job kind '{job.kind}'")
+        result = handler(user_id=job.user_id, **json.loads(job.payload or "{}"))
+        job = db.session.get(Job, job_id)
+        job.status = "done"
+        job.result = json.dumps(result) if result is not None else None
+    except Exception as e:
+        logger.exception("Job %s (%s) failed", job_id, job.kind)
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        job.status = "failed"
+        job.error = str(e)[:500]
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+
+def claim_next():
+    """Return the id of the oldest queued job this process managed to claim, or None."""
+    while True:
+        job_id = db.session.query(Job.id).filter(
+            Job.status == "queued"
+        ).order_by(Job.created_at, Job.id).limit(1).scalar()
+        if job_id is None:
+            return None
+        if _claim(job_id):
+            return job_id
+        # Another worker took it first — try the next one
+
+
+def requeue_stale_jobs():
+    """Put jobs that have been 'running' longer than JOB_TIMEOUT back on the queue."""
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config.get("JOB_TIMEOUT", 300))
+    result = db.session.execute(
+        update(Job)
+        .where(Job.status == "running", Job.started_at < cutoff)
+        .values(status="queued")
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def run_worker(poll_interval=1.0, once=False):
+    """Drain the job table forever (or until empty when ``once`` is set)."""
+    requeued = requeue_stale_jobs()
+    if requeued:
+        logger.info("Requeued %d stale jobs", requeued)
+
+    while True:
+        job_id = claim_next()
+        if job_id is None:
+            if once:
+                return
+            db.session.remove()
+            time.sleep(poll_interval)
+            continue
+
+        _execute(job_id)
+        db.session.remove()
+
+
+def latest_job(user_id, kind):
+    """Most recent job of a kind for a user, with abandoned jobs marked as failed."""
+    job = Job.query.filter_by(user_id=user_id, kind=kind).order_by(Job.id.desc()).first()
+    if job and job.status in ACTIVE_STATUSES:
+        timeout = current_app.config.get("JOB_TIMEOUT", 300)
+        if job.created_at < datetime.utcnow() - timedelta(seconds=timeout):
+            job.status = "failed"
+            job.error = "Timed out"
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+    return job
+
+
+def job_to_dict(job):
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "error": job.error,
+        "result": json.loads(job.result) if job.result else None,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
@@ -0,0 +1,135 @@
+"""In-process metrics: latency histograms and counters.
+
+Values are kept per process in memory and keyed by name plus labels, e.g.
+``observe("ai_chat_ttft_seconds", 0.8, model="...")``. ``snapshot()``
+returns everything as plain dicts for logging or an export endpoint;
+``to_prometheus()`` renders it in the Prometheus text exposition format.
+
+Nothing is shared between processes: each gunicorn worker (and ``flask
+worker``) counts only what it handled, and ``/metrics`` shows the counters
+of the worker that served the scrape. Sum across workers by scraping each
+one, or run a single worker when the numbers must be complete.
+"""
+import bisect
+import threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+
+
+class Histogram:
+    """Cumulative-bucket histogram with count and sum (Prometheus-style)."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (None if empty)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def to_dict(self):
+        cumulative, seen = {}, 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            cumulative["+Inf" if bound == float("inf") else str(bound)] = seen
+        return {"count": self.count, "sum": round(self.sum, 6), "buckets": cumulative}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def observe(name, value, buckets=DEFAULT_BUCKETS, **labels):
+    """Record one observation (usually seconds) in the histogram ``name``."""
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = Histogram(buckets)
+        hist.observe(value)
+
+
+def incr(name, amount=1, **labels):
+    """Add ``amount`` to the counter ``name``."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def get_histogram(name, **labels):
+    return _histograms.get(_key(name, labels))
+
+
+def get_counter(name, **labels):
+    return _counters.get(_key(name, labels), 0)
+
+
+def snapshot():
+    """All metrics as ``{"histograms": [...], "counters": [...]}``."""
+    with _lock:
+        return {
+            "histograms": [
+                {"name": name, "labels": dict(labels), **hist.to_dict()}
+                for (name, labels), hist in sorted(_histograms.items())
+            ],
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(_counters.items())
+            ],
+        }
+
+
+def _labels(labels, **extra):
+    items = list(labels.items()) + list(extra.items())
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+def to_prometheus(prefix="forgefit_"):
+    """All metrics in the Prometheus text format (version 0.0.4)."""
+    data = snapshot()
+    lines = []
+    typed = set()
+    for counter in data["counters"]:
+        name = prefix + counter["name"]
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_labels(counter['labels'])} {counter['value']}")
+    for hist in data["histograms"]:
+        name = prefix + hist["name"]
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} histogram")
+        for bound, count in hist["buckets"].items():
+            lines.append(f"{name}_bucket{_labels(hist['labels'], le=bound)} {count}")
+        lines.append(f"{name}_sum{_labels(hist['labels'])} {hist['sum']}")
+        lines.append(f"{name}_count{_labels(hist['labels'])} {hist['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
@@ -0,0 +1,121 @@
+"""Versioned schema migrations.
+
+Each ``vNNN_<name>.py`` module in this package defines ``upgrade(conn)`` and
+is applied once, in version order, inside its own transaction. The highest
+version applied is kept in the one-row ``schema_version`` table, so an
+up-to-date database costs app boot a single SELECT (see ``check``).
+
+``upgrade`` first creates any missing tables from the models, so a new
+database is built in one go; booting the app never does. A new model
+therefore needs a migration too (``Model.__table__.create(conn,
+checkfirst=True)``), or existing databases would never get its table.
+Because databases created before versioning already have some of these
+changes, migrations use ``add_column``/``create_index``, which skip what is
+already there instead of relying on a failed statement.
+
+Every step takes a lock first (an advisory lock on Postgres, the database
+write lock on SQLite) and re-reads the version under it, so processes that
+migrate at the same time apply each script once.
+
+    flask migrate        # apply pending migrations
+    flask migrate --status
+"""
+import importlib
+import logging
+import pkgutil
+import re
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+logger = logging.getLogger(__name__)
+
+VERSION_TABLE = "schema_version"
+_MODULE_NAME = re.compile(r"^v(\d+)_\w+$")
+LOCK_KEY = 7310411  # pg_advisory_xact_lock key held while migrating
+
+
+def available():
+    """All migrations as (version, module name), in the order they apply."""
+    found = []
+    for module in pkgutil.iter_modules(__path__):
+        match = _MODULE_NAME.match(module.name)
+        if match:
+            found.append((int(match.group(1)), module.name))
+    return sorted(found)
+
+
+def latest_version():
+    found = available()
+    return found[-1][0] if found else 0
+
+
+def current_version(engine):
+    """The schema version recorded in the database (one query); 0 if it has never been migrated."""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text(f"SELECT version FROM {VERSION_TABLE}")).scalar() or 0
+    except (OperationalError, ProgrammingError):
+        # Only a database without the table is unmigrated; anything else (auth, network) is raised
+        if inspect(engine).has_table(VERSION_TABLE):
+            raise
+        return 0
+
+
+def check(engine):
+    """Boot-time check: (current, latest) versions."""
+    return current_version(engine), latest_version()
+
+
+def upgrade(engine, target=None):
+    """Create missing tables, then apply pending migrations up to ``target`` (default: all).
+
+    Returns the versions applied.
+    """
+    from app import db
+    import models  # Registers every table on db.metadata
+
+    with engine.begin() as conn:
+        _lock(conn)
+        db.metadata.create_all(conn)
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (version INTEGER NOT NULL)"))
+        if conn.execute(text(f"SELECT COUNT(*) FROM {VERSION_TABLE}")).scalar() == 0:
+            conn.execute(text(f"INSERT INTO {VERSION_TABLE} (version) VALUES (0)"))
+
+    applied = []
+    for version, name in available():
+        if target is not None and version > target:
+            break
+        with engine.begin() as conn:
+            _lock(conn)
+            # Another process may have applied it while we waited for the lock
+            if version <= conn.execute(text(f"SELECT version FROM {VERSION_TABLE}")).scalar():
+                continue
+            module = importlib.import_module(f"{__name__}.{name}")
+            logger.info("Applying migration %s", name)
+            module.upgrade(conn)
+            conn.execute(text(f"UPDATE {VERSION_TABLE} SET version = :version"), {"version": version})
+        applied.append(version)
+    return applied
+
+
+def _lock(conn):
+    """Hold the migration lock until this transaction ends; must be its first statement."""
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": LOCK_KEY})
+    elif conn.dialect.name == "sqlite":
+        # pysqlite only begins a transaction at the first write; take the write lock now instead
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def add_column(conn, table, column, ddl):
+    """ALTER TABLE ... ADD COLUMN unless the column already exists."""
+    if column in {c["name"] for c in inspect(conn).get_columns(table)}:
+        return
+    quoted = conn.dialect.identifier_preparer.quote(table)
+    conn.execute(text(f"ALTER TABLE {quoted} ADD COLUMN {column} {ddl}"))
+
+
+def create_index(conn, name, table, columns):
+    quoted = conn.dialect.identifier_preparer.quote(table)
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {quoted} ({', '.join(columns)})"))
@@ -0,0 +1,21 @@
+"""Columns and indexes added before migrations were versioned."""
+from migrations import add_column, create_index
+
+
+def upgrade(conn):
+    add_column(conn, "profile", "gym_equipment", "VARCHAR(100) DEFAULT ''")
+    add_column(conn, "exercise", "muscle_group", "VARCHAR(30) DEFAULT ''")
+    # Macro goals
+    add_column(conn, "profile", "age", "INTEGER")
+    add_column(conn, "profile", "sex", "VARCHAR(10)")
+    add_column(conn, "profile", "activity_level", "VARCHAR(20) DEFAULT 'moderate'")
+    add_column(conn, "profile", "calorie_target", "FLOAT DEFAULT 0")
+    add_column(conn, "profile", "protein_target_g", "FLOAT DEFAULT 0")
+    add_column(conn, "profile", "carbs_target_g", "FLOAT DEFAULT 0")
+    add_column(conn, "profile", "fat_target_g", "FLOAT DEFAULT 0")
+    # Meal type on food log
+    add_column(conn, "food_log", "meal_type", "VARCHAR(20) DEFAULT 'general'")
+    # Per-user time-series indexes (range scans on logged_at)
+    create_index(conn, "ix_food_log_user_logged_at", "food_log", ["user_id", "logged_at"])
+    create_index(conn, "ix_water_log_user_logged_at", "water_log", ["user_id", "logged_at"])
+    create_index(conn, "ix_workout_log_user_logged_at", "workout_log", ["user_id", "logged_at"])
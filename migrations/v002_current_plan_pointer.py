@@ -0,0 +1,13 @@
+"""User.current_plan_id, backfilled with each user's highest week, and the plan lookup index."""
+from sqlalchemy import text
+
+from migrations import add_column, create_index
+
+
+def upgrade(conn):
+    create_index(conn, "ix_workout_plan_user_week", "workout_plan", ["user_id", "week_number"])
+    add_column(conn, "user", "current_plan_id", "INTEGER")
+    conn.execute(text(
+        'UPDATE "user" SET current_plan_id = (SELECT id FROM workout_plan WHERE workout_plan.user_id = "user".id '
+        "ORDER BY week_number DESC, id DESC LIMIT 1) WHERE current_plan_id IS NULL"
+    ))
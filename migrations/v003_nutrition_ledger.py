@@ -0,0 +1,16 @@
+"""The per-day nutrition ledger, backfilled from every user's food and water logs."""
+from sqlalchemy import text
+
+from models import NutritionDay
+
+
+def upgrade(conn):
+    NutritionDay.__table__.create(conn, checkfirst=True)
+    conn.execute(text("DELETE FROM nutrition_day"))
+    conn.execute(text(
+        "INSERT INTO nutrition_day (user_id, day, calories, protein_g, carbs_g, fat_g, water_ml) "
+        "SELECT user_id, date(logged_at), SUM(calories), SUM(protein_g), SUM(carbs_g), SUM(fat_g), SUM(water_ml) "
+        "FROM (SELECT user_id, logged_at, calories, protein_g, carbs_g, fat_g, 0 AS water_ml FROM food_log "
+        "UNION ALL SELECT user_id, logged_at, 0, 0, 0, 0, amount_ml FROM water_log) AS logs "
+        "GROUP BY user_id, date(logged_at)"
+    ))
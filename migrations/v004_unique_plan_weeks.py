@@ -0,0 +1,23 @@
+"""Make (user_id, week_number) unique on workout_plan.
+
+Concurrent next-week requests could save the same week twice. Users with
+duplicates have their weeks renumbered 1..n in (week_number, id) order
+first, which keeps the history's order and the current plan pointer.
+"""
+from sqlalchemy import text
+
+
+def upgrade(conn):
+    affected = conn.execute(text(
+        "SELECT DISTINCT user_id FROM workout_plan GROUP BY user_id, week_number HAVING COUNT(*) > 1"
+    )).scalars().all()
+    for user_id in affected:
+        plan_ids = conn.execute(text(
+            "SELECT id FROM workout_plan WHERE user_id = :user_id ORDER BY week_number, id"
+        ), {"user_id": user_id}).scalars().all()
+        conn.execute(text("UPDATE workout_plan SET week_number = :week WHERE id = :id"),
+                     [{"week": week, "id": plan_id} for week, plan_id in enumerate(plan_ids, start=1)])
+    conn.execute(text("DROP INDEX IF EXISTS ix_workout_plan_user_week"))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_workout_plan_user_week ON workout_plan (user_id, week_number)"
+    ))
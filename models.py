@@ -11,13 +11,18 @@ class User(UserMixin, db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # The plan the user is on, set by plan_writer.create_plan. Not a foreign
+    # key, so user and workout_plan don't depend on each other for inserts/deletes.
+    current_plan_id = db.Column(db.Integer, nullable=True)
 
     profile = db.relationship("Profile", backref="user", uselist=False, cascade="all, delete-orphan")
-    plans = db.relationship("WorkoutPlan", backref="user", cascade="all, delete-orphan", order_by="WorkoutPlan.week_number.desc()")
+    # A query, not a list: users accumulate a plan a week
+    plans = db.relationship("WorkoutPlan", backref="user", cascade="all, delete-orphan", lazy="dynamic", order_by="WorkoutPlan.week_number.desc()")
     food_logs = db.relationship("FoodLog", backref="user", cascade="all, delete-orphan")
     exercise_notes = db.relationship("ExerciseNote", backref="user", cascade="all, delete-orphan")
     custom_foods = db.relationship("CustomFood", backref="user", cascade="all, delete-orphan")
     water_logs = db.relationship("WaterLog", backref="user", cascade="all, delete-orphan")
+    jobs = db.relationship("Job", backref="user", cascade="all, delete-orphan")
 
     def set_password(self, password):
         self.password_hash = generate_password_hash(password, method="pbkdf2:sha256")
@@ -54,6 +59,7 @@ class WorkoutPlan(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     week_number = db.Column(db.Integer, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.Index("uq_workout_plan_user_week", "user_id", "week_number", unique=True),)
 
     days = db.relationship("WorkoutDay", backref="plan", cascade="all, delete-orphan", order_by="WorkoutDay.day_index")
 
@@ -80,6 +86,7 @@ class Exercise(db.Model):
     muscle_group = db.Column(db.String(30), default="")
 
     logs = db.relationship("WorkoutLog", backref="exercise", cascade="all, delete-orphan")
+    set_logs = db.relationship("WorkoutSet", backref="exercise", cascade="all, delete-orphan", order_by="WorkoutSet.set_index")
 
 
 class WorkoutLog(db.Model):
@@ -89,6 +96,53 @@ class WorkoutLog(db.Model):
     actual_reps = db.Column(db.Integer, nullable=False)
     actual_weight_kg = db.Column(db.Float, nullable=False)
     logged_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.Index("ix_workout_log_user_logged_at", "user_id", "logged_at"),)
+
+
+class WorkoutSet(db.Model):
+    """One logged set. WorkoutLog keeps the per-exercise summary (top set)."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    exercise_id = db.Column(db.Integer, db.ForeignKey("exercise.id"), nullable=False)
+    set_index = db.Column(db.Integer, nullable=False)  # 0-based
+    reps = db.Column(db.Integer, nullable=False)
+    weight_kg = db.Column(db.Float, nullable=False)
+    rpe = db.Column(db.Float, nullable=True)
+    logged_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "exercise_id", "set_index", name="uq_workout_set_user_exercise_set"),
+        db.Index("ix_workout_set_user_logged_at", "user_id", "logged_at"),
+    )
+
+
+class ExerciseDailyStat(db.Model):
+    """Per-user, per-exercise, per-day rollup of logged sets for progress charts.
+
+    Maintained incrementally by ``progress.refresh_daily_stats`` on every log
+    write; ``flask rebuild-progress`` recomputes it from scratch.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    exercise_name = db.Column(db.String(200), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    e1rm_kg = db.Column(db.Float, nullable=False)
+    volume_kg = db.Column(db.Float, nullable=False)
+    top_weight_kg = db.Column(db.Float, nullable=False)
+    top_reps = db.Column(db.Integer, nullable=False)
+    set_count = db.Column(db.Integer, nullable=False)
+    is_pr = db.Column(db.Boolean, default=False, nullable=False)
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "exercise_name", "day", name="uq_exercise_daily_stat_user_name_day"),
+    )
+
+
+class SyncReceipt(db.Model):
+    """Idempotency keys of offline writes already applied by /workout/sync."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    idempotency_key = db.Column(db.String(64), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.UniqueConstraint("user_id", "idempotency_key", name="uq_sync_receipt_user_key"),)
 
 
 class ExerciseNote(db.Model):
@@ -111,6 +165,7 @@ class FoodLog(db.Model):
     fat_g = db.Column(db.Float, nullable=False)
     meal_type = db.Column(db.String(20), default="general")  # breakfast, lunch, dinner, snacks, general
     logged_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.Index("ix_food_log_user_logged_at", "user_id", "logged_at"),)
 
 
 class CustomFood(db.Model):
@@ -128,3 +183,75 @@ class WaterLog(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     amount_ml = db.Column(db.Integer, nullable=False)
     logged_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.Index("ix_water_log_user_logged_at", "user_id", "logged_at"),)
+
+
+class NutritionDay(db.Model):
+    """Per-user, per-day calorie, macro and water totals for the food dashboard.
+
+    Updated with delta increments by ``nutrition.record_food`` and
+    ``nutrition.record_water`` in the same transaction as every food or water
+    write; ``flask rebuild-nutrition`` recomputes it from the logs.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    calories = db.Column(db.Float, nullable=False, default=0.0)
+    protein_g = db.Column(db.Float, nullable=False, default=0.0)
+    carbs_g = db.Column(db.Float, nullable=False, default=0.0)
+    fat_g = db.Column(db.Float, nullable=False, default=0.0)
+    water_ml = db.Column(db.Integer, nullable=False, default=0)
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "day", name="uq_nutrition_day_user_day"),
+    )
+
+
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
+    kind = db.Column(db.String(50), nullable=False)           # e.g. 'generate_plan'
+    status = db.Column(db.String(20), nullable=False, default="queued")  # queued, running, done, failed, cancelled
+    payload = db.Column(db.Text, nullable=False, default="{}")  # JSON kwargs for the handler
+    result = db.Column(db.Text, nullable=True)                  # JSON returned by the handler
+    error = db.Column(db.String(500), nullable=True)
+    attempts = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    __table_args__ = (
+        db.Index("ix_job_status_created", "status", "created_at"),
+        db.Index("ix_job_user_kind", "user_id", "kind"),
+    )
+
+
+class ProductCacheEntry(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(255), unique=True, nullable=False)  # 'search:<query>' or 'barcode:<code>'
+    found = db.Column(db.Boolean, nullable=False, default=True)    # False = cached "not found"
+    payload = db.Column(db.Text, nullable=True)                     # JSON result
+    fetched_at = db.Column(db.DateTime, default=datetime.utcnow)
+    fresh_until = db.Column(db.DateTime, nullable=False)
+    stale_until = db.Column(db.DateTime, nullable=False)            # serve while revalidating until then
+
+
+class PlanTemplate(db.Model):
+    """An AI-designed plan stored for reuse by users with a similar profile (see plan_cache)."""
+    id = db.Column(db.Integer, primary_key=True)
+    fingerprint = db.Column(db.String(64), unique=True, nullable=False)
+    plan = db.Column(db.Text, nullable=False)          # JSON day/exercise structure
+    one_rms = db.Column(db.Text, nullable=False)       # JSON 1RMs/bodyweight the weights were designed for
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    hits = db.Column(db.Integer, default=0, nullable=False)
+
+
+class FoodProduct(db.Model):
+    """Local copy of Open Food Facts products, loaded by `flask import-foods`."""
+    id = db.Column(db.Integer, primary_key=True)
+    code = db.Column(db.String(64), unique=True, nullable=False)  # barcode
+    name = db.Column(db.String(200), nullable=False)
+    brand = db.Column(db.String(200), default="")
+    cal_100g = db.Column(db.Float, nullable=False)
+    protein_100g = db.Column(db.Float, nullable=False, default=0)
+    carbs_100g = db.Column(db.Float, nullable=False, default=0)
+    fat_100g = db.Column(db.Float, nullable=False, default=0)
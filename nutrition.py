@@ -0,0 +1,154 @@
+"""Per-day nutrition totals for the food dashboard and the summary API.
+
+``nutrition_day`` holds one row per user and day with calorie, macro and
+water totals. Every food or water write adjusts it by a delta in the same
+transaction (``record_food``, ``record_water``), so reading any range is
+one indexed query over at most one row per day. ``rebuild_ledger``
+recomputes it from the raw logs (``flask rebuild-nutrition``).
+"""
+from datetime import date, timedelta
+
+from sqlalchemy import delete, insert, literal, select, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app import db
+from models import FoodLog, NutritionDay, WaterLog
+
+MAX_SUMMARY_DAYS = 366
+FOOD_FIELDS = ("calories", "protein_g", "carbs_g", "fat_g")
+LEDGER_FIELDS = FOOD_FIELDS + ("water_ml",)
+
+
+def _empty_day(day):
+    return {
+        "date": day.isoformat(),
+        "calories": 0.0,
+        "protein_g": 0.0,
+        "carbs_g": 0.0,
+        "fat_g": 0.0,
+        "water_ml": 0,
+    }
+
+
+def _add_to_day(user_id, day, delta):
+    """Upsert ``delta`` onto the user's ledger row for ``day``; returns the row's new totals."""
+    dialect_insert = pg_insert if db.engine.dialect.name == "postgresql" else sqlite_insert
+    columns = NutritionDay.__table__.c
+    stmt = dialect_insert(NutritionDay).values(
+        user_id=user_id, day=day, **{field: delta.get(field, 0) for field in LEDGER_FIELDS}
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "day"],
+        set_={field: columns[field] + stmt.excluded[field] for field in delta},
+    ).returning(*(columns[field] for field in LEDGER_FIELDS))
+    return dict(zip(LEDGER_FIELDS, db.session.execute(stmt).one()))
+
+
+def record_food(user_id, entries, sign=1):
+    """Add FoodLog entries to the ledger (``sign=-1`` to remove them). Does not commit.
+
+    Entries need ``logged_at`` set; they are grouped by day, so copying a
+    whole day costs one statement.
+    """
+    by_day = {}
+    for entry in entries:
+        delta = by_day.setdefault(entry.logged_at.date(), dict.fromkeys(FOOD_FIELDS, 0.0))
+        for field in FOOD_FIELDS:
+            delta[field] += sign * (getattr(entry, field) or 0)
+    for day, delta in by_day.items():
+        _add_to_day(user_id, day, delta)
+
+
+def record_water(user_id, log):
+    """Add a WaterLog row to the ledger; returns the day's new water total. Does not commit."""
+    return _add_to_day(user_id, log.logged_at.date(), {"water_ml": log.amount_ml})["water_ml"]
+
+
+def daily_totals(user_id, first_day, last_day):
+    """Calorie, macro and water totals for each day in an inclusive range.
+
+    Reads the ledger in one query; days with nothing logged are filled with
+    zeros.
+    """
+    rows = NutritionDay.query.filter(
+        NutritionDay.user_id == user_id,
+        NutritionDay.day.between(first_day, last_day),
+    )
+    by_day = {row.day: row for row in rows}
+
+    result = []
+    day = first_day
+    while day <= last_day:
+        entry = _empty_day(day)
+        row = by_day.get(day)
+        if row:
+            entry.update({field: round(getattr(row, field) or 0, 1) for field in FOOD_FIELDS})
+            entry["water_ml"] = int(row.water_ml or 0)
+        result.append(entry)
+        day += timedelta(days=1)
+    return result
+
+
+def sum_days(days):
+    """Collapse a list of daily_totals entries into one totals dict."""
+    return {
+        "calories": round(sum(d["calories"] for d in days), 1),
+        "protein_g": round(sum(d["protein_g"] for d in days), 1),
+        "carbs_g": round(sum(d["carbs_g"] for d in days), 1),
+        "fat_g": round(sum(d["fat_g"] for d in days), 1),
+        "water_ml": sum(d["water_ml"] for d in days),
+    }
+
+
+def _totals_from_logs(user_id):
+    """Per-day sums of the raw food and water logs, as ledger rows."""
+    food = select(
+        db.func.date(FoodLog.logged_at).label("day"),
+        FoodLog.calories.label("calories"),
+        FoodLog.protein_g.label("protein_g"),
+        FoodLog.carbs_g.label("carbs_g"),
+        FoodLog.fat_g.label("fat_g"),
+        literal(0).label("water_ml"),
+    ).where(FoodLog.user_id == user_id)
+    water = select(
+        db.func.date(WaterLog.logged_at).label("day"),
+        literal(0.0),
+        literal(0.0),
+        literal(0.0),
+        literal(0.0),
+        WaterLog.amount_ml,
+    ).where(WaterLog.user_id == user_id)
+    rows = union_all(food, water).subquery()
+    query = select(
+        rows.c.day,
+        db.func.sum(rows.c.calories),
+        db.func.sum(rows.c.protein_g),
+        db.func.sum(rows.c.carbs_g),
+        db.func.sum(rows.c.fat_g),
+        db.func.sum(rows.c.water_ml),
+    ).group_by(rows.c.day)
+
+    # date() comes back as a string on SQLite and a date on Postgres
+    return [
+        {
+            "user_id": user_id,
+            "day": date.fromisoformat(day) if isinstance(day, str) else day,
+            "calories": calories or 0.0,
+            "protein_g": protein_g or 0.0,
+            "carbs_g": carbs_g or 0.0,
+            "fat_g": fat_g or 0.0,
+            "water_ml": int(water_ml or 0),
+        }
+        for day, calories, protein_g, carbs_g, fat_g, water_ml in db.session.execute(query)
+    ]
+
+
+def rebuild_ledger(user_id):
+    """Recompute a user's ledger from the food and water logs. Commits; returns the number of days."""
+    db.session.execute(delete(NutritionDay).where(NutritionDay.user_id == user_id))
+    rows = _totals_from_logs(user_id)
+    if rows:
+        db.session.execute(insert(NutritionDay), rows)
+    db.session.commit()
+    return len(rows)
@@ -0,0 +1,122 @@
+"""Thin client for the Open Food Facts API.
+
+The base URL comes from ``OPEN_FOOD_FACTS_URL`` so tests and load tests can
+point the app at a local fake server. ``requests`` is imported on first
+use so it stays off the app's boot path.
+
+All calls share one keep-alive ``requests.Session``. At most
+``OPEN_FOOD_FACTS_MAX_CONCURRENCY`` requests per host are in flight from
+each worker; a call that can't get a slot within
+``OPEN_FOOD_FACTS_QUEUE_TIMEOUT`` seconds raises ``UpstreamBusy`` instead
+of queueing behind a slow upstream.
+"""
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote, urlsplit
+
+from flask import current_app
+
+import metrics
+from instrumentation import external_call
+
+SEARCH_PATH = (
+    "/cgi/search.pl"
+    "?search_terms={q}&action=process&json=1"
+    "&fields=product_name,nutriments&page_size=6"
+)
+BARCODE_PATH = "/api/v0/product/{barcode}.json"
+HEADERS = {"User-Agent": "ForgeFit/1.0"}
+
+
+def extract_nutriments(n):
+    return {
+        "cal_100g": round(float(n.get("energy-kcal_100g") or n.get("energy-kcal", 0) or 0), 1),
+        "protein_100g": round(float(n.get("proteins_100g") or 0), 1),
+        "carbs_100g": round(float(n.get("carbohydrates_100g") or 0), 1),
+        "fat_100g": round(float(n.get("fat_100g") or 0), 1),
+    }
+
+
+class UpstreamBusy(Exception):
+    """Every outbound slot for the host stayed taken for the whole queue timeout."""
+
+
+_session = None
+_host_slots = {}
+_lock = threading.Lock()
+
+
+def _base_url():
+    return current_app.config["OPEN_FOOD_FACTS_URL"].rstrip("/")
+
+
+def _get_session():
+    global _session
+    with _lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            size = current_app.config["OPEN_FOOD_FACTS_MAX_CONCURRENCY"]
+            _session = requests.Session()
+            _session.headers.update(HEADERS)
+            _session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=size))
+            _session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=size))
+        return _session
+
+
+@contextmanager
+def _host_slot(url):
+    host = urlsplit(url).netloc
+    with _lock:
+        slots = _host_slots.get(host)
+        if slots is None:
+            slots = _host_slots[host] = threading.BoundedSemaphore(
+                current_app.config["OPEN_FOOD_FACTS_MAX_CONCURRENCY"]
+            )
+    if not slots.acquire(timeout=current_app.config["OPEN_FOOD_FACTS_QUEUE_TIMEOUT"]):
+        metrics.incr("external_call_rejected", service="openfoodfacts", host=host)
+        raise UpstreamBusy(f"Too many concurrent requests to {host}")
+    try:
+        yield
+    finally:
+        slots.release()
+
+
+def _get(operation, url, timeout):
+    with _host_slot(url), external_call("openfoodfacts", operation):
+        resp = _get_session().get(url, timeout=timeout)
+        resp.raise_for_status()  # Inside the block so HTTP errors count in external_call_errors
+    return resp.json()
+
+
+def search_products(q):
+    """Search products by name. Returns a list of result dicts; raises on HTTP/network errors."""
+    data = _get("search", _base_url() + SEARCH_PATH.format(q=quote(q)), timeout=3)
+    results = []
+    for product in data.get("products", []):
+        name = (product.get("product_name") or "").strip()
+        if not name:
+            continue
+        results.append({"name": name, "custom": False, **extract_nutriments(product.get("nutriments", {}))})
+    return results
+
+
+def lookup_barcode(barcode):
+    """Look up a product by barcode. Returns a result dict, or None if it doesn't exist."""
+    data = _get("barcode", _base_url() + BARCODE_PATH.format(barcode=barcode), timeout=5)
+    product = data.get("product")
+    if not product or data.get("status") != 1:
+        return None
+    name = (product.get("product_name") or "").strip() or "Unknown product"
+    return {"name": name, **extract_nutriments(product.get("nutriments", {}))}
+
+
+class OpenFoodFactsSource:
+    """Upstream used by the product cache. Swap for a fake in tests."""
+
+    def search(self, q):
+        return search_products(q)
+
+    def barcode(self, barcode):
+        return lookup_barcode(barcode)
@@ -0,0 +1,249 @@
+"""Workout plan PDFs, cached on disk by content hash.
+
+A PDF is identified by a hash of exactly what it shows (plus
+``RENDER_VERSION``), so re-downloading an unchanged week, from any device,
+serves the same file. The hash doubles as the ETag, and a chat edit to the
+plan changes it. Files live in ``PDF_CACHE_DIR``; once the directory grows
+past ``PDF_CACHE_MAX_BYTES`` the least recently served files are deleted.
+
+Multi-week exports, which add what was actually logged and the user's
+exercise notes, are rendered by the ``export_pdf`` background job.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+from flask import current_app
+from sqlalchemy.orm import selectinload
+
+from app import db
+from jobs import job_handler
+from models import User, WorkoutDay, WorkoutPlan, WorkoutSet
+from plans import load_logs_and_notes, plan_exercises
+
+RENDER_VERSION = 1  # Bump when the layout changes so cached files are re-rendered
+MAX_HISTORY_WEEKS = 52
+
+
+def _cache_dir():
+    path = current_app.config["PDF_CACHE_DIR"]
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def content_key(kind, data):
+    """Hash of everything a PDF shows; used as the file name and the ETag."""
+    canonical = json.dumps({"version": RENDER_VERSION, "kind": kind, "data": data}, sort_keys=True)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def cached_path(key):
+    """Path of a cached PDF, marked as recently used, or None."""
+    path = os.path.join(_cache_dir(), key + ".pdf")
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def _store(key, pdf_bytes):
+    directory = _cache_dir()
+    # Write then rename, so a concurrent reader never sees half a file
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(pdf_bytes)
+    path = os.path.join(directory, key + ".pdf")
+    os.replace(tmp, path)
+    _evict(directory, keep=path)
+    return path
+
+
+def _evict(directory, keep):
+    """Delete the least recently used PDFs until the cache fits its size budget."""
+    files = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith(".pdf"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue  # Evicted by another worker while we scanned
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in files)
+    budget = current_app.config["PDF_CACHE_MAX_BYTES"]
+    for _, size, path in sorted(files):
+        if total <= budget:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def _latin1(text):
+    # The core PDF fonts only cover Latin-1; AI-written notes often contain dashes and degree signs
+    text = str(text).replace("—", "-").replace("–", "-").replace("’", "'")
+    return text.encode("latin-1", "replace").decode("latin-1")
+
+
+def _week_data(plan):
+    """What the single-week PDF shows, as plain data."""
+    return {
+        "week_number": plan.week_number,
+        "days": [
+            {
+                "label": day.label,
+                "exercises": [[ex.name, ex.sets, ex.reps, ex.weight_kg] for ex in day.exercises],
+            }
+            for day in plan.days
+        ],
+    }
+
+
+def _render_week(data):
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+
+    pdf.set_font("Helvetica", "B", 20)
+    pdf.cell(0, 15, f"ForgeFit - Week {data['week_number']}", ln=True, align="C")
+    pdf.ln(5)
+
+    for day in data["days"]:
+        pdf.set_font("Helvetica", "B", 14)
+        pdf.set_fill_color(240, 240, 240)
+        pdf.cell(0, 10, _latin1(day["label"]), ln=True, fill=True)
+        pdf.ln(2)
+
+        pdf.set_font("Helvetica", "B", 10)
+        pdf.cell(80, 8, "Exercise", border=1)
+        pdf.cell(25, 8, "Sets", border=1, align="C")
+        pdf.cell(25, 8, "Reps", border=1, align="C")
+        pdf.cell(35, 8, "Weight (kg)", border=1, align="C")
+        pdf.ln()
+
+        pdf.set_font("Helvetica", "", 10)
+        for name, sets, reps, weight_kg in day["exercises"]:
+            pdf.cell(80, 8, _latin1(name[:35]), border=1)
+            pdf.cell(25, 8, str(sets), border=1, align="C")
+            pdf.cell(25, 8, str(reps), border=1, align="C")
+            pdf.cell(35, 8, str(weight_kg), border=1, align="C")
+            pdf.ln()
+
+        pdf.ln(5)
+
+    return bytes(pdf.output())
+
+
+def week_pdf(plan):
+    """(key, path) of the PDF for a plan loaded with ``plans.get_latest_plan``, rendering it if needed."""
+    data = _week_data(plan)
+    key = content_key("week", data)
+    path = cached_path(key)
+    if path is None:
+        path = _store(key, _render_week(data))
+    return key, path
+
+
+def _history_data(user_id, weeks):
+    """The user's last ``weeks`` plans, oldest first, with logged sets and notes (7 queries)."""
+    plans = (
+        db.session.get(User, user_id).plans
+        .options(selectinload(WorkoutPlan.days).selectinload(WorkoutDay.exercises))
+        .limit(weeks)
+        .all()
+    )
+    plans.reverse()
+    exercises = [ex for plan in plans for ex in plan_exercises(plan)]
+    log_map, notes_map = load_logs_and_notes(user_id, exercises)
+
+    sets_by_exercise = {}
+    if exercises:
+        rows = WorkoutSet.query.filter(
+            WorkoutSet.user_id == user_id,
+            WorkoutSet.exercise_id.in_([ex.id for ex in exercises]),
+        ).order_by(WorkoutSet.exercise_id, WorkoutSet.set_index).all()
+        for s in rows:
+            sets_by_exercise.setdefault(s.exercise_id, []).append(f"{s.weight_kg:g}x{s.reps}")
+
+    def logged(ex):
+        if ex.id in sets_by_exercise:
+            return ", ".join(sets_by_exercise[ex.id])
+        log = log_map.get(ex.id)
+        return f"{log.actual_weight_kg:g}x{log.actual_reps}" if log else ""
+
+    return [
+        {
+            "week_number": plan.week_number,
+            "days": [
+                {
+                    "label": day.label,
+                    "exercises": [
+                        [ex.name, f"{ex.sets}x{ex.reps} @ {ex.weight_kg:g}", logged(ex),
+                         notes_map.get(ex.name.lower().strip(), "")]
+                        for ex in day.exercises
+                    ],
+                }
+                for day in plan.days
+            ],
+        }
+        for plan in plans
+    ]
+
+
+def _render_history(weeks_data):
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+
+    for week in weeks_data:
+        pdf.add_page()
+        pdf.set_font("Helvetica", "B", 20)
+        pdf.cell(0, 15, f"ForgeFit - Week {week['week_number']}", ln=True, align="C")
+        pdf.ln(3)
+
+        for day in week["days"]:
+            pdf.set_font("Helvetica", "B", 13)
+            pdf.set_fill_color(240, 240, 240)
+            pdf.cell(0, 9, _latin1(day["label"]), ln=True, fill=True)
+            pdf.ln(1)
+
+            pdf.set_font("Helvetica", "B", 9)
+            pdf.cell(70, 7, "Exercise", border=1)
+            pdf.cell(45, 7, "Prescribed", border=1, align="C")
+            pdf.cell(75, 7, "Logged (kg x reps)", border=1, align="C")
+            pdf.ln()
+
+            pdf.set_font("Helvetica", "", 9)
+            for name, prescribed, logged, note in day["exercises"]:
+                pdf.cell(70, 7, _latin1(name[:38]), border=1)
+                pdf.cell(45, 7, prescribed, border=1, align="C")
+                pdf.cell(75, 7, _latin1(logged[:48]) or "-", border=1, align="C")
+                pdf.ln()
+                if note:
+                    pdf.set_font("Helvetica", "I", 8)
+                    pdf.multi_cell(0, 5, _latin1(f"Note: {note}"))
+                    pdf.set_font("Helvetica", "", 9)
+            pdf.ln(3)
+
+    return bytes(pdf.output())
+
+
+@job_handler("export_pdf")
+def export_history_job(user_id, weeks):
+    """Background job: render a multi-week PDF with logs and notes into the cache."""
+    weeks_data = _history_data(user_id, min(int(weeks), MAX_HISTORY_WEEKS))
+    if not weeks_data:
+        raise ValueError("No plans to export")
+    key = content_key("history", weeks_data)
+    if cached_path(key) is None:
+        _store(key, _render_history(weeks_data))
+    first, last = weeks_data[0]["week_number"], weeks_data[-1]["week_number"]
+    return {"key": key, "filename": f"forgefit_weeks_{first}-{last}.pdf"}
@@ -0,0 +1,145 @@
+"""Reuse AI-designed plans across users with near-identical profiles.
+
+A fresh plan depends on plan type, goal, days per week, equipment and how
+strong the user is relative to their bodyweight. ``fingerprint`` reduces a
+profile to exactly that, with each 1RM/bodyweight ratio bucketed, so users
+who would get essentially the same plan share one key. On a hit the cached
+plan's weights are rescaled from the 1RMs it was designed for to the
+user's own.
+
+Entries live in the ``plan_template`` table so every web and worker process
+shares them. They expire after ``PLAN_CACHE_TTL`` seconds, and the least
+recently used are evicted past ``PLAN_CACHE_MAX_ENTRIES``.
+"""
+import hashlib
+import json
+import re
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+
+import metrics
+from app import db
+from models import PlanTemplate
+from progression import EXERCISES, round_weight
+
+LIFTS = ("squat_1rm", "bench_1rm", "deadlift_1rm", "ohp_1rm")
+RATIO_BUCKET = 0.25  # 1RM / bodyweight, e.g. 1.5x and 1.6x bodyweight share a bucket
+
+# Exercises the progression library doesn't know scale with a related lift
+MUSCLE_GROUP_LIFTS = {
+    "legs": "squat_1rm",
+    "glutes": "deadlift_1rm",
+    "back": "deadlift_1rm",
+    "chest": "bench_1rm",
+    "arms": "bench_1rm",
+    "core": "bench_1rm",
+    "shoulders": "ohp_1rm",
+    "full_body": "deadlift_1rm",
+}
+
+
+def _enabled():
+    return current_app.config["PLAN_CACHE_ENABLED"]
+
+
+def cacheable(profile_data, previous_plan=None):
+    """Only from-scratch designs are shared; progressions and noted exercises are personal."""
+    return _enabled() and not previous_plan and not profile_data.get("exercise_notes")
+
+
+def fingerprint(profile_data, week_number=1):
+    """Stable key for the inputs that shape a from-scratch plan."""
+    bodyweight = float(profile_data["weight_kg"]) or 1.0
+    equipment = re.sub(r"\s+", " ", (profile_data.get("gym_equipment") or "").strip().lower())
+    canonical = {
+        "plan_type": profile_data["plan_type"],
+        "goal": profile_data["goal"],
+        "days": int(profile_data["days_per_week"]),
+        "equipment": equipment,
+        "ratios": [round(float(profile_data[lift]) / bodyweight / RATIO_BUCKET) for lift in LIFTS],
+    }
+    if profile_data["plan_type"] == "menstrual_cycle":
+        # Intensity depends on the cycle week
+        canonical["cycle_week"] = (week_number - 1) % 4
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode()).hexdigest()
+
+
+def _basis(ex):
+    known = EXERCISES.get(ex.get("name"))
+    if known:
+        return known[1]
+    return MUSCLE_GROUP_LIFTS.get(ex.get("muscle_group"), "weight_kg")
+
+
+def rescale(plan_data, source, profile_data):
+    """Copy of a plan with weights scaled from the ``source`` 1RMs to the user's."""
+    scaled = []
+    for day in plan_data:
+        exercises = []
+        for ex in day["exercises"]:
+            ex = dict(ex)
+            basis = _basis(ex)
+            if basis and source.get(basis):
+                ex["weight_kg"] = round_weight(float(ex["weight_kg"]) * float(profile_data[basis]) / source[basis])
+            exercises.append(ex)
+        scaled.append({**day, "exercises": exercises})
+    return scaled
+
+
+def lookup(profile_data, week_number=1):
+    """A cached plan rescaled for this profile, or None."""
+    key = fingerprint(profile_data, week_number)
+    entry = PlanTemplate.query.filter_by(fingerprint=key).first()
+    ttl = timedelta(seconds=current_app.config["PLAN_CACHE_TTL"])
+    if entry is None or entry.created_at < datetime.utcnow() - ttl:
+        metrics.incr("plan_cache_requests", result="miss")
+        return None
+
+    entry.hits += 1
+    entry.last_used_at = datetime.utcnow()
+    db.session.commit()
+    metrics.incr("plan_cache_requests", result="hit")
+    return rescale(json.loads(entry.plan), json.loads(entry.one_rms), profile_data)
+
+
+def store(profile_data, week_number, plan_data):
+    """Save a freshly designed plan under its profile's fingerprint and evict old entries."""
+    key = fingerprint(profile_data, week_number)
+    now = datetime.utcnow()
+    source = {lift: float(profile_data[lift]) for lift in LIFTS + ("weight_kg",)}
+    try:
+        entry = PlanTemplate.query.filter_by(fingerprint=key).first()
+        if entry is None:
+            entry = PlanTemplate(fingerprint=key)
+            db.session.add(entry)
+        entry.plan = json.dumps(plan_data)
+        entry.one_rms = json.dumps(source)
+        entry.created_at = now
+        entry.last_used_at = now
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent job stored the same fingerprint; either copy will do
+        db.session.rollback()
+    _evict(now)
+
+
+def _evict(now):
+    config = current_app.config
+    db.session.execute(delete(PlanTemplate).where(
+        PlanTemplate.created_at < now - timedelta(seconds=config["PLAN_CACHE_TTL"])
+    ))
+    overflow = select(PlanTemplate.id).order_by(PlanTemplate.last_used_at.desc()).offset(
+        config["PLAN_CACHE_MAX_ENTRIES"]
+    )
+    db.session.execute(delete(PlanTemplate).where(PlanTemplate.id.in_(overflow)))
+    db.session.commit()
+
+
+def hit_rate():
+    """Share of cache lookups in this process that were hits, or None before the first."""
+    hits = metrics.get_counter("plan_cache_requests", result="hit")
+    total = hits + metrics.get_counter("plan_cache_requests", result="miss")
+    return hits / total if total else None
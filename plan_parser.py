@@ -0,0 +1,135 @@
+"""Incremental parsing and repair of AI plan JSON.
+
+The model streams a JSON array of days. ``PlanStreamParser`` tracks the
+array's structure character by character and validates each day the moment
+its closing brace arrives, so a response that isn't a plan at all is
+rejected after a few hundred characters instead of after the whole paid-for
+generation, and one malformed day doesn't throw away the others.
+
+Common defects are repaired on the way: code fences and prose around the
+array, trailing commas, numbers sent as strings (see
+``plan_writer.validate_day``) and a final day cut off mid-exercise, which
+keeps its complete exercises. Days that still can't be used come back as
+``None`` so the caller can ask for just those again.
+"""
+import json
+import re
+
+from plan_writer import InvalidPlan, validate_day
+
+MAX_PREAMBLE = 500  # characters of prose/fences tolerated before the opening "["
+
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+class PlanStructureError(ValueError):
+    """The response isn't a JSON array of days."""
+
+
+def _parse_day(text, position):
+    """A validated day from one array element's text, or None if it's unusable."""
+    try:
+        return validate_day(json.loads(_TRAILING_COMMA.sub(r"\1", text)), position)
+    except (ValueError, InvalidPlan):
+        return None
+
+
+class PlanStreamParser:
+    """Feed streamed text with ``feed``; call ``finish`` at the end of the stream.
+
+    Depth 1 is a day object, 2 its exercise list, 3 an exercise object.
+    """
+
+    def __init__(self):
+        self.days = []          # validated day dict, or None where a day was broken
+        self._element = []      # characters of the array element being read
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._started = False
+        self._finished = False
+        self._preamble = 0
+        self._bracket = False   # the last non-space preamble character was "["
+        self._last_exercise_end = None  # where a truncated day could be cut
+
+    def feed(self, chunk):
+        """Consume more text. Raises PlanStructureError as soon as the shape is wrong."""
+        for ch in chunk:
+            if self._finished:
+                return
+            if not self._started:
+                self._read_preamble(ch)
+                continue
+            self._consume(ch)
+
+    def _read_preamble(self, ch):
+        """Skip prose and fences; the array starts at a "[" followed by "{" or "]"."""
+        if self._bracket and not ch.isspace():
+            self._bracket = False
+            if ch in "{]":
+                self._started = True
+                self._consume(ch)
+                return
+        if ch == "[":
+            self._bracket = True  # Could be "[1]" or "[see below]" in prose; decided by what follows
+        self._preamble += 1
+        if self._preamble > MAX_PREAMBLE:
+            raise PlanStructureError("No JSON array of days in the response")
+
+    def _consume(self, ch):
+        if self._in_string:
+            self._element.append(ch)
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+            return
+
+        if self._depth == 0:
+            if ch == "]":
+                self._finished = True
+            elif ch == "{":
+                self._depth = 1
+                self._element = [ch]
+                self._last_exercise_end = None
+            elif not ch.isspace() and ch != ",":
+                raise PlanStructureError("Plan days must be JSON objects")
+            return
+
+        self._element.append(ch)
+        if ch == '"':
+            self._in_string = True
+        elif ch in "{[":
+            self._depth += 1
+        elif ch in "}]":
+            self._depth -= 1
+            if self._depth == 2 and ch == "}":
+                self._last_exercise_end = len(self._element)
+            elif self._depth == 0:
+                self._complete("".join(self._element))
+
+    def _complete(self, text):
+        self.days.append(_parse_day(text, len(self.days)))
+        self._element = []
+
+    def finish(self):
+        """The parsed days, repairing a final day that was cut off."""
+        if self._depth > 0 and self._last_exercise_end:
+            # Keep the exercises that arrived whole and close the day
+            text = "".join(self._element[:self._last_exercise_end]) + "]}"
+            self.days.append(_parse_day(text, len(self.days)))
+        elif self._depth > 0:
+            self.days.append(None)
+        self._depth = 0
+        self._element = []
+        self._finished = True
+        return self.days
+
+
+def parse_plan(text):
+    """Parse a complete response. Returns a list of days, None for each broken one."""
+    parser = PlanStreamParser()
+    parser.feed(text)
+    return parser.finish()
@@ -0,0 +1,242 @@
+"""Writing workout plans.
+
+Plans come from the AI, the rule engine, the plan cache and chat edits, all
+as the same list-of-days JSON. ``validate_plan`` checks and normalises that
+once; ``create_plan`` and ``replace_plan_days`` then write every day and
+exercise with a fixed number of statements (one multi-row INSERT ...
+RETURNING for the days, one executemany for the exercises), however big
+the plan is.
+"""
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+import user_cache
+from app import db
+from models import Exercise, User, WorkoutDay, WorkoutLog, WorkoutPlan, WorkoutSet
+from progress import refresh_daily_stats_by_name
+
+MAX_DAYS = 7
+MAX_EXERCISES_PER_DAY = 15
+
+
+class InvalidPlan(ValueError):
+    """The plan JSON doesn't have the expected day/exercise structure."""
+
+
+class WeekExists(ValueError):
+    """The user already has a plan for that week, e.g. from a concurrent double submit."""
+
+
+def _text(value, limit):
+    return str(value or "").strip()[:limit]  # column lengths
+
+
+def _exercise(raw, where):
+    if not isinstance(raw, dict):
+        raise InvalidPlan(f"{where} must be an object")
+    try:
+        ex = {
+            "name": _text(raw["name"], 80),
+            "sets": int(raw["sets"]),
+            "reps": int(raw["reps"]),
+            "weight_kg": float(raw["weight_kg"]),
+            "is_compound": bool(raw.get("is_compound", False)),
+            "notes": _text(raw.get("notes"), 200),
+            "muscle_group": _text(raw.get("muscle_group"), 30),
+        }
+    except KeyError as e:
+        raise InvalidPlan(f"{where} is missing {e.args[0]!r}")
+    except (TypeError, ValueError):
+        raise InvalidPlan(f"{where} has a non-numeric sets, reps or weight_kg")
+    if not ex["name"]:
+        raise InvalidPlan(f"{where} has no name")
+    if ex["sets"] < 1 or ex["reps"] < 0 or ex["weight_kg"] < 0:
+        raise InvalidPlan(f"{where} has out-of-range sets, reps or weight_kg")
+    return ex
+
+
+def validate_day(raw_day, position):
+    """Check and normalise one day of a plan; ``position`` is its place in the plan."""
+    where = f"Day {position + 1}"
+    if not isinstance(raw_day, dict):
+        raise InvalidPlan(f"{where} must be an object")
+    label = _text(raw_day.get("label"), 50)
+    if not label:
+        raise InvalidPlan(f"{where} has no label")
+    raw_exercises = raw_day.get("exercises")
+    if not isinstance(raw_exercises, list) or not raw_exercises:
+        raise InvalidPlan(f"{where} has no exercises")
+    if len(raw_exercises) > MAX_EXERCISES_PER_DAY:
+        raise InvalidPlan(f"{where} has more than {MAX_EXERCISES_PER_DAY} exercises")
+    try:
+        day_index = int(raw_day.get("day_index", position))
+    except (TypeError, ValueError):
+        day_index = position
+    return {
+        "day_index": day_index,
+        "label": label,
+        "exercises": [_exercise(ex, f"{where}, exercise {i + 1}") for i, ex in enumerate(raw_exercises)],
+    }
+
+
+def validate_plan(plan_data):
+    """Check a plan's structure and return a normalised copy.
+
+    Numbers sent as strings are converted, text is trimmed to the column
+    sizes and day indexes are made unique. Raises InvalidPlan describing the
+    first problem found.
+    """
+    if not isinstance(plan_data, list) or not plan_data:
+        raise InvalidPlan("Plan must be a non-empty list of days")
+    if len(plan_data) > MAX_DAYS:
+        raise InvalidPlan(f"Plan has more than {MAX_DAYS} days")
+
+    days = [validate_day(raw_day, position) for position, raw_day in enumerate(plan_data)]
+
+    if len({d["day_index"] for d in days}) != len(days):
+        # Duplicate indexes would make the day order ambiguous
+        for position, day in enumerate(days):
+            day["day_index"] = position
+    return days
+
+
+def _insert_days(plan_id, days):
+    """Insert validated days and their exercises: two statements in total. Returns the new day ids."""
+    # RETURNING order isn't guaranteed for a multi-row insert (and asking for it
+    # makes SQLite fall back to one INSERT per row), so match ids by day_index
+    day_ids = dict(db.session.execute(
+        insert(WorkoutDay).returning(WorkoutDay.day_index, WorkoutDay.id),
+        [{"plan_id": plan_id, "day_index": d["day_index"], "label": d["label"]} for d in days],
+    ).all())
+
+    exercise_rows = [
+        {"day_id": day_ids[day["day_index"]], "order": order, **ex}
+        for day in days
+        for order, ex in enumerate(day["exercises"])
+    ]
+    if exercise_rows:
+        db.session.execute(insert(Exercise), exercise_rows)
+    return list(day_ids.values())
+
+
+def next_week_number(user_id):
+    """The week after the user's highest, read from the plans themselves (1 query)."""
+    latest = db.session.scalar(select(db.func.max(WorkoutPlan.week_number)).where(WorkoutPlan.user_id == user_id))
+    return (latest or 0) + 1
+
+
+def create_plan(user_id, week_number, plan_data):
+    """Validate and save a new plan for a user and make it their current plan.
+
+    ``week_number=None`` appends the plan after the user's latest week. The
+    user row is locked (on Postgres) while the week is chosen and written,
+    and (user_id, week_number) is unique, so two workers can't both save the
+    same week: the second raises WeekExists. Commits and returns the plan.
+    """
+    days = validate_plan(plan_data)
+    try:
+        db.session.execute(select(User.id).where(User.id == user_id).with_for_update())
+        if week_number is None:
+            week_number = next_week_number(user_id)
+        plan = WorkoutPlan(user_id=user_id, week_number=week_number)
+        db.session.add(plan)
+        db.session.flush()  # Get plan.id
+        _insert_days(plan.id, days)
+        db.session.execute(update(User).where(User.id == user_id).values(current_plan_id=plan.id))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise WeekExists(f"Week {week_number} already exists")
+    user_cache.invalidate(user_id)  # The cached current_plan_id is now out of date
+    return plan
+
+
+def _plan_exercises(day_ids):
+    """(id, name) of the exercises on these days, in plan order."""
+    return db.session.execute(
+        select(Exercise.id, Exercise.name).join(WorkoutDay)
+        .where(WorkoutDay.id.in_(day_ids))
+        .order_by(WorkoutDay.day_index, Exercise.order)
+    ).all()
+
+
+def _logged_ranges(user_id, exercise_ids):
+    """Exercise id -> (first, last) logged_at over its sets and summary log, for exercises with any."""
+    ranges = {}
+    for model in (WorkoutSet, WorkoutLog):
+        rows = db.session.execute(
+            select(model.exercise_id, db.func.min(model.logged_at), db.func.max(model.logged_at))
+            .where(model.user_id == user_id, model.exercise_id.in_(exercise_ids))
+            .group_by(model.exercise_id)
+        )
+        for exercise_id, first, last in rows:
+            if exercise_id in ranges:
+                first, last = min(first, ranges[exercise_id][0]), max(last, ranges[exercise_id][1])
+            ranges[exercise_id] = (first, last)
+    return ranges
+
+
+def _move_logs(moves):
+    """Re-point sets and summary logs from old exercise ids to new ones (``old_id``/``new_id`` dicts)."""
+    for model in (WorkoutSet, WorkoutLog):
+        table = model.__table__
+        db.session.execute(
+            update(table).where(table.c.exercise_id == bindparam("old_id")).values(exercise_id=bindparam("new_id")),
+            moves,
+        )
+
+
+def replace_plan_days(plan, plan_data):
+    """Swap a plan's days and exercises for a modified version in one transaction.
+
+    Exercises that survive the edit, matched by name, keep their logged
+    sets: they are moved onto the new Exercise rows. Logs of exercises that
+    were removed are deleted with them, and the progress rollup is
+    recomputed for every exercise whose logs moved or went, in the same
+    transaction. Raises InvalidPlan before touching anything if the new plan
+    is malformed.
+    """
+    days = validate_plan(plan_data)
+
+    old_day_ids = list(db.session.scalars(select(WorkoutDay.id).where(WorkoutDay.plan_id == plan.id)))
+    old_exercises = _plan_exercises(old_day_ids)
+    old_ids = [exercise_id for exercise_id, _ in old_exercises]
+    # Loaded days/exercises are expired by the commit, so skip syncing the session
+    no_sync = {"synchronize_session": False}
+    try:
+        logged = _logged_ranges(plan.user_id, old_ids)
+        new_day_ids = _insert_days(plan.id, days)
+
+        # Rollup rows are keyed by exact name: refresh the old names and any new spelling of a moved one
+        names = {name for exercise_id, name in old_exercises if exercise_id in logged}
+        if logged:
+            # Pair logged exercises with new ones of the same name, in plan order
+            unclaimed = {}
+            for exercise_id, name in _plan_exercises(new_day_ids):
+                unclaimed.setdefault(name.lower().strip(), []).append((exercise_id, name))
+            moves = []
+            for exercise_id, name in old_exercises:
+                matches = unclaimed.get(name.lower().strip())
+                if exercise_id in logged and matches:
+                    new_id, new_name = matches.pop(0)
+                    moves.append({"old_id": exercise_id, "new_id": new_id})
+                    names.add(new_name)
+            if moves:
+                _move_logs(moves)
+
+        # Children first: there are no ON DELETE CASCADEs in the schema
+        db.session.execute(delete(WorkoutSet).where(WorkoutSet.exercise_id.in_(old_ids)), execution_options=no_sync)
+        db.session.execute(delete(WorkoutLog).where(WorkoutLog.exercise_id.in_(old_ids)), execution_options=no_sync)
+        db.session.execute(delete(Exercise).where(Exercise.id.in_(old_ids)), execution_options=no_sync)
+        db.session.execute(delete(WorkoutDay).where(WorkoutDay.id.in_(old_day_ids)), execution_options=no_sync)
+
+        if logged:
+            # Legacy summaries count the exercise's prescribed sets, so moved logs are refreshed too
+            first = min(first for first, _ in logged.values()).date()
+            last = max(last for _, last in logged.values()).date()
+            refresh_daily_stats_by_name(plan.user_id, names, first, last)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return plan
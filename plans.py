@@ -0,0 +1,89 @@
+"""Loading workout plans for display.
+
+Plan pages walk ``plan.days`` and then ``day.exercises``; with the default
+lazy relationships that is one query per day plus one per exercise list.
+Everything here loads with ``selectinload`` instead, so the number of queries
+is fixed no matter how many days or exercises a plan has.
+"""
+from sqlalchemy.orm import joinedload, selectinload
+
+from app import db
+from models import User, WorkoutPlan, WorkoutDay, WorkoutLog, WorkoutSet, ExerciseNote
+
+
+def _with_days_and_exercises():
+    return selectinload(WorkoutPlan.days).selectinload(WorkoutDay.exercises)
+
+
+def get_latest_plan(user_id):
+    """The user's current plan with days and exercises loaded (3 queries), or None.
+
+    Every route finds the plan through here. It follows ``User.current_plan_id``,
+    so the cost doesn't grow with the number of weeks a user has. In a request
+    the user row was already loaded by the login manager, so reading the
+    pointer costs no extra query.
+    """
+    user = db.session.get(User, user_id)
+    plan_id = user.current_plan_id if user else None
+    if plan_id is None:
+        return None
+    return WorkoutPlan.query.options(_with_days_and_exercises()).filter_by(id=plan_id).first()
+
+
+def get_day(day_id):
+    """A workout day with its plan and exercises loaded (2 queries), or None."""
+    return WorkoutDay.query.options(
+        joinedload(WorkoutDay.plan),
+        selectinload(WorkoutDay.exercises),
+    ).filter_by(id=day_id).first()
+
+
+def load_logs_and_notes(user_id, exercises):
+    """Logged performance and personal notes for a set of exercises (2 queries).
+
+    Returns ``(log_map, notes_map)``: ``log_map`` maps exercise id to its
+    WorkoutLog, ``notes_map`` maps normalised exercise name to the note text.
+    """
+    exercise_ids = [ex.id for ex in exercises]
+    if not exercise_ids:
+        return {}, {}
+
+    logs = WorkoutLog.query.filter(
+        WorkoutLog.exercise_id.in_(exercise_ids),
+        WorkoutLog.user_id == user_id,
+    ).all()
+    log_map = {log.exercise_id: log for log in logs}
+
+    return log_map, load_notes(user_id, exercises)
+
+
+def load_notes(user_id, exercises):
+    """Personal notes for a set of exercises (1 query): normalised name -> note text."""
+    exercise_names = list({ex.name.lower().strip() for ex in exercises})
+    if not exercise_names:
+        return {}
+    user_notes = db.session.query(ExerciseNote.exercise_name, ExerciseNote.note).filter(
+        ExerciseNote.user_id == user_id,
+        ExerciseNote.exercise_name.in_(exercise_names),
+    ).all()
+    return {name: note for name, note in user_notes}
+
+
+def load_sets(user_id, exercises):
+    """Logged sets for a set of exercises (1 query): exercise id -> {set_index: WorkoutSet}."""
+    exercise_ids = [ex.id for ex in exercises]
+    if not exercise_ids:
+        return {}
+    sets = WorkoutSet.query.filter(
+        WorkoutSet.exercise_id.in_(exercise_ids),
+        WorkoutSet.user_id == user_id,
+    )
+    set_map = {}
+    for s in sets:
+        set_map.setdefault(s.exercise_id, {})[s.set_index] = s
+    return set_map
+
+
+def plan_exercises(plan):
+    """All exercises of an eagerly loaded plan, in day order."""
+    return [ex for day in plan.days for ex in day.exercises]
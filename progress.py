@@ -0,0 +1,233 @@
+"""Progress analytics: per-day e1RM, volume and PR rollups.
+
+``exercise_daily_stat`` holds one row per user, exercise name and day, so
+the progress page and API read a few hundred small rows instead of every
+set ever logged. ``record_sets`` keeps it current by recomputing only the
+days and exercise names a write touched; ``rebuild_daily_stats`` recomputes
+everything (``flask rebuild-progress``).
+
+Rows are keyed by exercise name rather than id because every weekly plan
+creates new Exercise rows for the same movements.
+"""
+import math
+
+from sqlalchemy import delete, insert, update
+
+from app import db
+from dates import between_days
+from models import Exercise, ExerciseDailyStat, WorkoutLog, WorkoutSet
+
+MAX_POINTS = 200
+
+
+def estimate_1rm(weight_kg, reps):
+    """Epley estimated one-rep max; a single is its own 1RM."""
+    if reps <= 0:
+        return 0.0
+    if reps == 1:
+        return weight_kg
+    return weight_kg * (1 + reps / 30)
+
+
+def top_set(sets):
+    """Heaviest ``(reps, weight)`` set, most reps breaking ties."""
+    return max(sets, key=lambda s: (s[1], s[0]))
+
+
+def _summarise(sets):
+    top_reps, top_weight = top_set(sets)
+    return {
+        "e1rm_kg": round(max(estimate_1rm(weight, reps) for reps, weight in sets), 1),
+        "volume_kg": round(sum(reps * weight for reps, weight in sets), 1),
+        "top_weight_kg": top_weight,
+        "top_reps": top_reps,
+        "set_count": len(sets),
+    }
+
+
+def _load_sets(user_id, names=None, first_day=None, last_day=None):
+    """Logged sets grouped by (exercise name, day) -> [(reps, weight), ...].
+
+    Logs written before per-set logging only have a WorkoutLog summary row;
+    those count as the prescribed number of sets at the logged reps/weight.
+    """
+    def scoped(query, column):
+        if names is not None:
+            query = query.filter(Exercise.name.in_(names))
+        if first_day is not None:
+            query = query.filter(between_days(column, first_day, last_day))
+        return query
+
+    grouped = {}
+    sets = scoped(
+        db.session.query(Exercise.name, WorkoutSet.logged_at, WorkoutSet.reps, WorkoutSet.weight_kg)
+        .join(Exercise, WorkoutSet.exercise_id == Exercise.id)
+        .filter(WorkoutSet.user_id == user_id),
+        WorkoutSet.logged_at,
+    )
+    for name, logged_at, reps, weight in sets:
+        grouped.setdefault((name, logged_at.date()), []).append((reps, weight))
+
+    has_sets = db.session.query(WorkoutSet.id).filter(
+        WorkoutSet.exercise_id == WorkoutLog.exercise_id,
+        WorkoutSet.user_id == user_id,
+    ).exists()
+    legacy = scoped(
+        db.session.query(Exercise.name, Exercise.sets, WorkoutLog.logged_at, WorkoutLog.actual_reps, WorkoutLog.actual_weight_kg)
+        .join(Exercise, WorkoutLog.exercise_id == Exercise.id)
+        .filter(WorkoutLog.user_id == user_id, ~has_sets),
+        WorkoutLog.logged_at,
+    )
+    for name, set_count, logged_at, reps, weight in legacy:
+        grouped.setdefault((name, logged_at.date()), []).extend([(reps, weight)] * max(set_count, 1))
+
+    return grouped
+
+
+def logged_range(user_id, exercise_ids):
+    """``(first, last)`` logged_at of the user's sets for these exercises, or None."""
+    first, last = db.session.query(
+        db.func.min(WorkoutSet.logged_at), db.func.max(WorkoutSet.logged_at)
+    ).filter(
+        WorkoutSet.user_id == user_id,
+        WorkoutSet.exercise_id.in_(exercise_ids),
+    ).one()
+    return (first, last) if first is not None else None
+
+
+def refresh_daily_stats(user_id, exercise_ids, first_day, last_day):
+    """Recompute the rollup for these exercises' names over an inclusive day range.
+
+    Call after writing sets, with a range covering both where the sets were
+    and where they are now. Does not commit.
+    """
+    names = [name for (name,) in db.session.query(Exercise.name).filter(
+        Exercise.id.in_(exercise_ids)
+    ).distinct()]
+    refresh_daily_stats_by_name(user_id, names, first_day, last_day)
+
+
+def refresh_daily_stats_by_name(user_id, names, first_day, last_day):
+    """``refresh_daily_stats`` for exercise names, e.g. after their Exercise rows were deleted."""
+    if not names:
+        return
+    grouped = _load_sets(user_id, names, first_day, last_day)
+
+    db.session.execute(delete(ExerciseDailyStat).where(
+        ExerciseDailyStat.user_id == user_id,
+        ExerciseDailyStat.exercise_name.in_(names),
+        ExerciseDailyStat.day.between(first_day, last_day),
+    ))
+    _insert_rows(user_id, grouped)
+    _refresh_pr_flags(user_id, names, first_day)
+
+
+def rebuild_daily_stats(user_id):
+    """Recompute a user's whole rollup from logged sets. Commits."""
+    db.session.execute(delete(ExerciseDailyStat).where(ExerciseDailyStat.user_id == user_id))
+    grouped = _load_sets(user_id)
+    _insert_rows(user_id, grouped)
+    _refresh_pr_flags(user_id, list({name for name, _ in grouped}), None)
+    db.session.commit()
+    return len(grouped)
+
+
+def _insert_rows(user_id, grouped):
+    rows = [
+        {"user_id": user_id, "exercise_name": name, "day": day, "is_pr": False, **_summarise(sets)}
+        for (name, day), sets in grouped.items()
+    ]
+    if rows:
+        db.session.execute(insert(ExerciseDailyStat), rows)
+
+
+def _refresh_pr_flags(user_id, names, since):
+    """Flag days whose e1RM beats every earlier day, from ``since`` onwards."""
+    if not names:
+        return
+    best = {}
+    if since is not None:
+        best = dict(db.session.query(
+            ExerciseDailyStat.exercise_name, db.func.max(ExerciseDailyStat.e1rm_kg)
+        ).filter(
+            ExerciseDailyStat.user_id == user_id,
+            ExerciseDailyStat.exercise_name.in_(names),
+            ExerciseDailyStat.day < since,
+        ).group_by(ExerciseDailyStat.exercise_name))
+
+    query = db.session.query(
+        ExerciseDailyStat.id, ExerciseDailyStat.exercise_name, ExerciseDailyStat.e1rm_kg, ExerciseDailyStat.is_pr
+    ).filter(
+        ExerciseDailyStat.user_id == user_id,
+        ExerciseDailyStat.exercise_name.in_(names),
+    )
+    if since is not None:
+        query = query.filter(ExerciseDailyStat.day >= since)
+
+    changes = []
+    for row_id, name, e1rm, is_pr in query.order_by(ExerciseDailyStat.day):
+        pr = e1rm > best.get(name, 0)
+        if pr:
+            best[name] = e1rm
+        if pr != is_pr:
+            changes.append({"id": row_id, "is_pr": pr})
+    if changes:
+        db.session.execute(update(ExerciseDailyStat), changes)
+
+
+def exercise_names(user_id):
+    """Names of every exercise the user has logged, in order of first log."""
+    return [name for (name,) in db.session.query(ExerciseDailyStat.exercise_name).filter(
+        ExerciseDailyStat.user_id == user_id,
+    ).group_by(ExerciseDailyStat.exercise_name).order_by(db.func.min(ExerciseDailyStat.day))]
+
+
+def _point(row):
+    return {
+        "date": row.day.isoformat(),
+        "e1rm_kg": row.e1rm_kg,
+        "volume_kg": row.volume_kg,
+        "top_weight_kg": row.top_weight_kg,
+        "top_reps": row.top_reps,
+        "set_count": row.set_count,
+        "is_pr": row.is_pr,
+    }
+
+
+def _merge(bucket):
+    """Collapse consecutive daily points into one: best lifts, summed work."""
+    top = max(bucket, key=lambda p: (p["top_weight_kg"], p["top_reps"]))
+    return {
+        "date": bucket[0]["date"],
+        "e1rm_kg": max(p["e1rm_kg"] for p in bucket),
+        "volume_kg": round(sum(p["volume_kg"] for p in bucket), 1),
+        "top_weight_kg": top["top_weight_kg"],
+        "top_reps": top["top_reps"],
+        "set_count": sum(p["set_count"] for p in bucket),
+        "is_pr": any(p["is_pr"] for p in bucket),
+    }
+
+
+def series(user_id, exercise_name, first_day=None, last_day=None, max_points=MAX_POINTS):
+    """Daily points for one exercise, downsampled to at most ``max_points``.
+
+    Returns ``(points, bucket_days)``. When the range spans more than
+    ``max_points`` days, points are merged into fixed-width buckets of
+    ``bucket_days`` days, each dated by its first day.
+    """
+    query = ExerciseDailyStat.query.filter_by(user_id=user_id, exercise_name=exercise_name)
+    if first_day is not None:
+        query = query.filter(ExerciseDailyStat.day >= first_day)
+    if last_day is not None:
+        query = query.filter(ExerciseDailyStat.day <= last_day)
+    rows = query.order_by(ExerciseDailyStat.day).all()
+    if len(rows) <= max_points:
+        return [_point(row) for row in rows], 1
+
+    start = first_day or rows[0].day
+    end = last_day or rows[-1].day
+    bucket_days = math.ceil(((end - start).days + 1) / max_points)
+    buckets = {}
+    for row in rows:
+        buckets.setdefault((row.day - start).days // bucket_days, []).append(_point(row))
+    return [_merge(buckets[k]) for k in sorted(buckets)], bucket_days
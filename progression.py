@@ -0,0 +1,198 @@
+"""Rule-based plan generation: weekly progression and 1RM-percentage templates.
+
+``progress_plan`` applies the progressive-overload rules from the AI prompt
+to last week's plan (the output of ``plan_to_dict_with_logs``);
+``template_plan`` builds a week from scratch for each plan type from the
+user's 1RMs. Both return the same day/exercise structure as
+``generate_plan_with_ai`` and run in milliseconds, so they are the default
+for routine weeks and the fallback whenever the API fails.
+"""
+
+WEIGHT_STEP = 2.5
+ACCESSORY_REP_CAP = 15  # past this, accessories add weight instead of reps
+
+# Compound lifts: (sets, reps, fraction of 1RM); accessories: (sets, reps)
+GOAL_SCHEMES = {
+    "strength": {"compound": (5, 5, 0.80), "accessory": (3, 8)},
+    "muscle": {"compound": (4, 8, 0.70), "accessory": (3, 12)},
+    "general": {"compound": (3, 10, 0.65), "accessory": (3, 12)},
+}
+
+# Menstrual-cycle weeks 1-4: follicular, follicular, ovulation, luteal (deload).
+# (intensity multiplier, change in sets per exercise)
+CYCLE_PHASES = [(1.0, 0), (1.0, 0), (0.93, 0), (0.85, -1)]
+
+# name: (muscle_group, 1RM it scales from, fraction of that 1RM, is_compound, setup notes)
+# Compound weights are fraction * 1RM * the goal's percentage; accessory
+# weights are fraction * 1RM. A basis of None means bodyweight (0 kg).
+EXERCISES = {
+    "Back Squat": ("legs", "squat_1rm", 1.0, True, ""),
+    "Front Squat": ("legs", "squat_1rm", 0.8, True, ""),
+    "Bench Press": ("chest", "bench_1rm", 1.0, True, ""),
+    "Incline Bench Press": ("chest", "bench_1rm", 0.8, True, "Set bench to roughly 30° incline"),
+    "Deadlift": ("back", "deadlift_1rm", 1.0, True, ""),
+    "Romanian Deadlift": ("legs", "deadlift_1rm", 0.65, True, ""),
+    "Overhead Press": ("shoulders", "ohp_1rm", 1.0, True, ""),
+    "Barbell Row": ("back", "bench_1rm", 0.8, True, ""),
+    "Pull-up": ("back", None, 0, True, ""),
+    "Incline Dumbbell Press": ("chest", "bench_1rm", 0.3, False, "Set bench to roughly 30° incline"),
+    "Cable Fly": ("chest", "bench_1rm", 0.15, False, "Set pulleys to shoulder height"),
+    "Chest Dip": ("chest", None, 0, False, ""),
+    "Lat Pulldown": ("back", "bench_1rm", 0.55, False, "Set the thigh pad so your knees are locked in"),
+    "Cable Row (Seated)": ("back", "bench_1rm", 0.5, False, ""),
+    "Dumbbell Row": ("back", "bench_1rm", 0.3, False, ""),
+    "Face Pull": ("shoulders", "ohp_1rm", 0.3, False, "Set the pulley to upper-chest height, rope attachment"),
+    "Lateral Raise": ("shoulders", "ohp_1rm", 0.15, False, ""),
+    "Arnold Press": ("shoulders", "ohp_1rm", 0.3, False, "Set bench upright"),
+    "Barbell Curl": ("arms", "bench_1rm", 0.3, False, ""),
+    "Hammer Curl": ("arms", "bench_1rm", 0.15, False, ""),
+    "Cable Pushdown": ("arms", "bench_1rm", 0.3, False, "Set the pulley to the top position"),
+    "Skull Crusher": ("arms", "bench_1rm", 0.25, False, ""),
+    "Leg Press": ("legs", "squat_1rm", 1.2, False, "Feet shoulder-width, mid-platform"),
+    "Leg Curl": ("legs", "squat_1rm", 0.35, False, "Align knees with the machine's pivot"),
+    "Leg Extension": ("legs", "squat_1rm", 0.4, False, "Align knees with the machine's pivot"),
+    "Bulgarian Split Squat": ("legs", "squat_1rm", 0.2, False, ""),
+    "Calf Raise": ("legs", "squat_1rm", 0.5, False, ""),
+    "Hip Thrust": ("glutes", "deadlift_1rm", 0.6, False, ""),
+    "Plank": ("core", None, 0, False, ""),
+    "Hanging Leg Raise": ("core", None, 0, False, ""),
+    "Cable Crunch": ("core", "bench_1rm", 0.3, False, "Set the pulley to the top position, rope attachment"),
+}
+
+DAYS = {
+    "push": ("Push", ["Bench Press", "Overhead Press", "Incline Dumbbell Press", "Lateral Raise", "Cable Pushdown", "Skull Crusher"]),
+    "pull": ("Pull", ["Deadlift", "Barbell Row", "Lat Pulldown", "Face Pull", "Barbell Curl", "Hammer Curl"]),
+    "legs": ("Legs", ["Back Squat", "Romanian Deadlift", "Leg Press", "Leg Curl", "Calf Raise", "Hanging Leg Raise"]),
+    "upper": ("Upper Body", ["Bench Press", "Barbell Row", "Overhead Press", "Lat Pulldown", "Barbell Curl", "Cable Pushdown"]),
+    "lower": ("Lower Body", ["Back Squat", "Romanian Deadlift", "Leg Press", "Leg Curl", "Calf Raise", "Plank"]),
+    "full_a": ("Full Body A", ["Back Squat", "Bench Press", "Barbell Row", "Lateral Raise", "Barbell Curl", "Plank"]),
+    "full_b": ("Full Body B", ["Deadlift", "Overhead Press", "Lat Pulldown", "Bulgarian Split Squat", "Cable Pushdown", "Hanging Leg Raise"]),
+    "full_c": ("Full Body C", ["Front Squat", "Incline Bench Press", "Cable Row (Seated)", "Hip Thrust", "Face Pull", "Cable Crunch"]),
+    "chest": ("Chest", ["Bench Press", "Incline Bench Press", "Incline Dumbbell Press", "Cable Fly", "Chest Dip"]),
+    "back": ("Back", ["Deadlift", "Barbell Row", "Pull-up", "Lat Pulldown", "Cable Row (Seated)"]),
+    "shoulders": ("Shoulders", ["Overhead Press", "Arnold Press", "Lateral Raise", "Face Pull", "Plank"]),
+    "arms": ("Arms", ["Barbell Curl", "Skull Crusher", "Hammer Curl", "Cable Pushdown", "Cable Crunch"]),
+}
+
+# Day rotation per plan type (see PLAN_TYPE_INSTRUCTIONS); repeated when the
+# user trains more days than the split has
+SPLITS = {
+    "push_pull_legs": ["push", "pull", "legs"],
+    "upper_lower": ["upper", "lower"],
+    "full_body": ["full_a", "full_b", "full_c"],
+    "menstrual_cycle": ["upper", "lower", "full_a", "full_b"],
+    "bro_split": ["chest", "back", "legs", "shoulders", "arms"],
+}
+
+
+def round_weight(kg):
+    """Round to the nearest plate increment, never below zero."""
+    return max(0.0, round(kg / WEIGHT_STEP) * WEIGHT_STEP)
+
+
+def _cycle_phase(week_number):
+    return CYCLE_PHASES[(week_number - 1) % len(CYCLE_PHASES)]
+
+
+def template_plan(profile_data, week_number=1):
+    """A week built from the plan type's split and the user's 1RMs."""
+    scheme = GOAL_SCHEMES.get(profile_data.get("goal"), GOAL_SCHEMES["general"])
+    split = SPLITS.get(profile_data.get("plan_type"), SPLITS["full_body"])
+    intensity, set_change = 1.0, 0
+    if profile_data.get("plan_type") == "menstrual_cycle":
+        intensity, set_change = _cycle_phase(week_number)
+
+    plan = []
+    seen_labels = {}
+    for day_index in range(int(profile_data.get("days_per_week") or 3)):
+        label, names = DAYS[split[day_index % len(split)]]
+        seen_labels[label] = seen_labels.get(label, 0) + 1
+        if seen_labels[label] > 1:
+            label = f"{label} {seen_labels[label]}"
+
+        exercises = []
+        for name in names:
+            muscle_group, basis, fraction, is_compound, notes = EXERCISES[name]
+            one_rm = float(profile_data.get(basis) or 0) if basis else 0.0
+            if is_compound:
+                sets, reps, pct = scheme["compound"]
+                weight = one_rm * fraction * pct * intensity
+            else:
+                sets, reps = scheme["accessory"]
+                weight = one_rm * fraction * intensity
+            exercises.append({
+                "name": name,
+                "sets": max(sets + set_change, 1),
+                "reps": reps,
+                "weight_kg": round_weight(weight),
+                "is_compound": is_compound,
+                "muscle_group": muscle_group,
+                "notes": notes,
+            })
+        plan.append({"day_index": day_index, "label": label, "exercises": exercises})
+    return plan
+
+
+def progress_exercise(ex):
+    """Next week's prescription for one exercise from ``plan_to_dict_with_logs``.
+
+    Compounds: hit the prescribed reps at the prescribed weight -> +2.5 kg.
+    Accessories: hit the reps -> one more rep, or +2.5 kg once at the rep cap.
+    Fell short -> same weight and reps again. Not logged -> unchanged.
+    """
+    sets = ex["prescribed_sets"]
+    reps = ex["prescribed_reps"]
+    weight = ex["prescribed_weight_kg"]
+    actual_reps = ex.get("actual_reps")
+    actual_weight = ex.get("actual_weight_kg")
+
+    if actual_reps is not None and actual_weight is not None:
+        if actual_reps >= reps and actual_weight >= weight:
+            # Progress from what was actually lifted if the user went heavier
+            weight = max(weight, actual_weight)
+            if ex.get("is_compound"):
+                weight += WEIGHT_STEP
+            elif weight == 0 or reps < ACCESSORY_REP_CAP:
+                reps += 1
+            else:
+                weight += WEIGHT_STEP
+                reps = ACCESSORY_REP_CAP - 3
+
+    return {
+        "name": ex["name"],
+        "sets": sets,
+        "reps": reps,
+        "weight_kg": round_weight(weight),
+        "is_compound": bool(ex.get("is_compound")),
+        "muscle_group": ex.get("muscle_group", ""),
+        "notes": ex.get("notes", ""),
+    }
+
+
+def progress_plan(previous_plan, plan_type=None, week_number=None):
+    """Next week from last week's plan with logs, keeping its days and exercises.
+
+    For menstrual-cycle plans, compound intensity and volume then follow the
+    cycle phase of the new week.
+    """
+    plan = []
+    for day in previous_plan:
+        exercises = [progress_exercise(ex) for ex in day["exercises"]]
+        plan.append({"day_index": day["day_index"], "label": day["label"], "exercises": exercises})
+
+    if plan_type == "menstrual_cycle" and week_number and week_number > 1:
+        prev_intensity, prev_sets = _cycle_phase(week_number - 1)
+        intensity, set_change = _cycle_phase(week_number)
+        for day in plan:
+            for ex in day["exercises"]:
+                ex["sets"] = max(ex["sets"] + set_change - prev_sets, 1)
+                if ex["is_compound"]:
+                    ex["weight_kg"] = round_weight(ex["weight_kg"] * intensity / prev_intensity)
+    return plan
+
+
+def local_plan(profile_data, week_number, previous_plan=None):
+    """Progress last week if there is one, otherwise build a plan from the template."""
+    if previous_plan:
+        return progress_plan(previous_plan, profile_data.get("plan_type"), week_number)
+    return template_plan(profile_data, week_number)
@@ -3,6 +3,9 @@ from .profile import profile_bp
 from .workout import workout_bp
 from .chat import chat_bp
 from .food import food_bp
+from .jobs import jobs_bp
+from .metrics import metrics_bp
+from .account import account_bp
 
 
 def register_blueprints(app):
@@ -11,3 +14,6 @@ def register_blueprints(app):
     app.register_blueprint(workout_bp)
     app.register_blueprint(chat_bp)
     app.register_blueprint(food_bp)
+    app.register_blueprint(jobs_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(account_bp)
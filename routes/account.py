@@ -0,0 +1,63 @@
+import json
+
+from flask import Blueprint, Response, abort, flash, jsonify, redirect, request, send_file, stream_with_context, url_for
+from flask_login import login_required, current_user
+
+import account_export
+from app import db
+from jobs import enqueue, job_to_dict
+from models import Job
+
+account_bp = Blueprint("account", __name__, url_prefix="/account")
+
+
+def _format():
+    fmt = request.values.get("format", "zip")
+    return fmt if fmt in account_export.FORMATS else None
+
+
+@account_bp.route("/export")
+@login_required
+def export():
+    """Stream everything the user has logged as ?format=zip (CSV per table, default) or ndjson."""
+    fmt = _format()
+    if not fmt:
+        return jsonify({"error": "format must be zip or ndjson"}), 400
+    response = Response(
+        stream_with_context(account_export.export_chunks(current_user.id, fmt)),
+        mimetype=account_export.FORMATS[fmt],
+    )
+    response.headers["Content-Disposition"] = f'attachment; filename="{account_export.download_name(fmt)}"'
+    response.cache_control.private = True
+    response.cache_control.no_store = True
+    return response
+
+
+@account_bp.route("/export", methods=["POST"])
+@login_required
+def export_in_background():
+    """Prepare the export in a background job; download it from export_download when done."""
+    fmt = _format()
+    if not fmt:
+        return jsonify({"error": "format must be zip or ndjson"}), 400
+    job = enqueue("export_account", user_id=current_user.id, fmt=fmt)
+    return jsonify(job_to_dict(job)), 202
+
+
+@account_bp.route("/export/<int:job_id>")
+@login_required
+def export_download(job_id):
+    job = db.session.get(Job, job_id)
+    if not job or job.kind != "export_account" or job.user_id != current_user.id:
+        abort(404)
+    if job.status != "done":
+        return jsonify(job_to_dict(job)), 409
+    result = json.loads(job.result)
+    path = account_export.export_path(result["file"])
+    if path is None:
+        flash("That export has expired. Please export again.", "error")
+        return redirect(url_for("profile.edit"))
+    response = send_file(path, as_attachment=True, download_name=result["filename"])
+    response.cache_control.private = True
+    response.cache_control.no_store = True
+    return response
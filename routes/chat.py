@@ -1,16 +1,71 @@
-from flask import Blueprint, request, jsonify
+import json
+
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_login import login_required, current_user
 
 from app import db
 from models import WorkoutPlan
-from ai_engine import chat_with_ai, save_plan_to_db
+from ai_engine import chat_with_ai, stream_chat_with_ai
+from plans import get_latest_plan
+from plan_writer import InvalidPlan, replace_plan_days
 
 chat_bp = Blueprint("chat", __name__, url_prefix="/api")
 
 
+def _apply_plan_update(plan, plan_data):
+    """Apply a modified plan from the AI. Returns (plan_updated, error message or None)."""
+    if not plan_data or not plan:
+        return False, None
+    try:
+        replace_plan_days(plan, plan_data)
+    except InvalidPlan as e:
+        return False, f"The suggested plan couldn't be applied: {e}"
+    return True, None
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _stream_chat(message, latest_plan, profile):
+    """Server-Sent Events: ``delta`` events with reply text, then ``done`` (or ``error``)."""
+    events = stream_chat_with_ai(message, latest_plan, profile)
+    plan_id = latest_plan.id if latest_plan else None
+    # The prompt is built; don't hold a DB connection while the model writes
+    db.session.close()
+
+    def generate():
+        try:
+            reply, plan_data = "", None
+            for kind, value in events:
+                if kind == "text":
+                    yield _sse("delta", {"text": value})
+                else:
+                    reply, plan_data = value
+
+            plan_updated, plan_error = _apply_plan_update(
+                db.session.get(WorkoutPlan, plan_id) if plan_id else None, plan_data
+            )
+            yield _sse("done", {"reply": reply, "plan_updated": plan_updated, "plan_error": plan_error})
+        except Exception as e:
+            db.session.rollback()
+            yield _sse("error", {"error": str(e)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @chat_bp.route("/chat", methods=["POST"])
 @login_required
 def chat():
+    """Chat with the AI coach.
+
+    Clients sending ``Accept: text/event-stream`` get the reply streamed as it
+    is written; others get a single JSON response once it is complete.
+    """
     data = request.get_json()
     if not data or not data.get("message"):
         return jsonify({"error": "No message provided"}), 400
@@ -19,49 +74,19 @@ def chat():
     if not message:
         return jsonify({"error": "Empty message"}), 400
 
-    latest_plan = WorkoutPlan.query.filter_by(user_id=current_user.id).order_by(
-        WorkoutPlan.week_number.desc()
-    ).first()
+    latest_plan = get_latest_plan(current_user.id)
 
     profile = current_user.profile
 
     try:
+        if "text/event-stream" in request.headers.get("Accept", ""):
+            return _stream_chat(message, latest_plan, profile)
+
         reply, plan_data = chat_with_ai(message, latest_plan, profile)
 
-        plan_updated = False
-        if plan_data and latest_plan:
-            # Delete the old plan's days/exercises and replace with modified plan
-            for day in latest_plan.days:
-                db.session.delete(day)
-            db.session.flush()
-
-            from models import WorkoutDay, Exercise
-            for day_data in plan_data:
-                day = WorkoutDay(
-                    plan_id=latest_plan.id,
-                    day_index=day_data["day_index"],
-                    label=day_data["label"],
-                )
-                db.session.add(day)
-                db.session.flush()
-
-                for i, ex_data in enumerate(day_data.get("exercises", [])):
-                    exercise = Exercise(
-                        day_id=day.id,
-                        order=i,
-                        name=ex_data["name"],
-                        sets=int(ex_data["sets"]),
-                        reps=int(ex_data["reps"]),
-                        weight_kg=float(ex_data["weight_kg"]),
-                        is_compound=bool(ex_data.get("is_compound", False)),
-                        notes=ex_data.get("notes", ""),
-                    )
-                    db.session.add(exercise)
-
-            db.session.commit()
-            plan_updated = True
-
-        return jsonify({"reply": reply, "plan_updated": plan_updated})
+        plan_updated, plan_error = _apply_plan_update(latest_plan, plan_data)
+
+        return jsonify({"reply": reply, "plan_updated": plan_updated, "plan_error": plan_error})
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -2,22 +2,19 @@ import json
 from collections import defaultdict
 from datetime import date, datetime, timedelta
 
-import requests as http_requests
 from flask import Blueprint, request, jsonify, render_template
 from flask_login import login_required, current_user
+from sqlalchemy import delete as delete_rows
 
 from app import db
+from dates import on_day
+from food_cache import get_product_cache
+from food_index import lookup_local_barcode, search_local
 from models import FoodLog, CustomFood, WaterLog
+from nutrition import MAX_SUMMARY_DAYS, daily_totals, record_food, record_water, sum_days
 
 food_bp = Blueprint("food", __name__, url_prefix="/food")
 
-OPEN_FOOD_FACTS_SEARCH = (
-    "https://world.openfoodfacts.org/cgi/search.pl"
-    "?search_terms={q}&action=process&json=1"
-    "&fields=product_name,nutriments&page_size=6"
-)
-OPEN_FOOD_FACTS_BARCODE = "https://world.openfoodfacts.org/api/v0/product/{barcode}.json"
-
 MEAL_ORDER = ["breakfast", "lunch", "dinner", "snacks", "general"]
 MEAL_LABELS = {
     "breakfast": "Breakfast",
@@ -28,22 +25,13 @@ MEAL_LABELS = {
 }
 
 
-def _extract_nutriments(n):
-    return {
-        "cal_100g": round(float(n.get("energy-kcal_100g") or n.get("energy-kcal", 0) or 0), 1),
-        "protein_100g": round(float(n.get("proteins_100g") or 0), 1),
-        "carbs_100g": round(float(n.get("carbohydrates_100g") or 0), 1),
-        "fat_100g": round(float(n.get("fat_100g") or 0), 1),
-    }
-
-
 @food_bp.route("/")
 @login_required
 def log():
     today = date.today()
     entries = FoodLog.query.filter(
         FoodLog.user_id == current_user.id,
-        db.func.date(FoodLog.logged_at) == today,
+        on_day(FoodLog.logged_at, today),
     ).order_by(FoodLog.logged_at).all()
 
     # Group by meal
@@ -52,13 +40,21 @@ def log():
         meal = e.meal_type or "general"
         entries_by_meal[meal].append(e)
 
-    # Overall totals
-    totals = {
-        "calories": round(sum(e.calories for e in entries), 1),
-        "protein_g": round(sum(e.protein_g for e in entries), 1),
-        "carbs_g": round(sum(e.carbs_g for e in entries), 1),
-        "fat_g": round(sum(e.fat_g for e in entries), 1),
-    }
+    # Today's totals and the 7-day chart are read from the nutrition_day ledger (one row per day)
+    week = daily_totals(current_user.id, today - timedelta(days=6), today)
+    today_totals = week[-1]
+    totals = {k: today_totals[k] for k in ("calories", "protein_g", "carbs_g", "fat_g")}
+    water_today = today_totals["water_ml"]
+    weekly = [
+        {
+            "date": date.fromisoformat(d["date"]).strftime("%a"),
+            "calories": d["calories"],
+            "protein": d["protein_g"],
+            "carbs": d["carbs_g"],
+            "fat": d["fat_g"],
+        }
+        for d in week
+    ]
 
     # Targets from profile
     profile = current_user.profile
@@ -71,30 +67,6 @@ def log():
             "fat_g": int(profile.fat_target_g),
         }
 
-    # Water today
-    water_today = db.session.query(
-        db.func.coalesce(db.func.sum(WaterLog.amount_ml), 0)
-    ).filter(
-        WaterLog.user_id == current_user.id,
-        db.func.date(WaterLog.logged_at) == today,
-    ).scalar() or 0
-
-    # Weekly data for chart (last 7 days)
-    weekly = []
-    for i in range(6, -1, -1):
-        day_date = today - timedelta(days=i)
-        day_entries = FoodLog.query.filter(
-            FoodLog.user_id == current_user.id,
-            db.func.date(FoodLog.logged_at) == day_date,
-        ).all()
-        weekly.append({
-            "date": day_date.strftime("%a"),
-            "calories": round(sum(e.calories for e in day_entries), 1),
-            "protein": round(sum(e.protein_g for e in day_entries), 1),
-            "carbs": round(sum(e.carbs_g for e in day_entries), 1),
-            "fat": round(sum(e.fat_g for e in day_entries), 1),
-        })
-
     # Custom foods for search
     custom_foods = CustomFood.query.filter_by(user_id=current_user.id).order_by(CustomFood.name).all()
     custom_foods_json = json.dumps([
@@ -116,6 +88,34 @@ def log():
     )
 
 
+@food_bp.route("/summary")
+@login_required
+def summary():
+    """Per-day nutrition totals for ?from=YYYY-MM-DD&to=YYYY-MM-DD (default: last 7 days)."""
+    today = date.today()
+    try:
+        last_day = date.fromisoformat(request.args["to"]) if request.args.get("to") else today
+        first_day = (
+            date.fromisoformat(request.args["from"]) if request.args.get("from")
+            else last_day - timedelta(days=6)
+        )
+    except ValueError:
+        return jsonify({"error": "Dates must be YYYY-MM-DD"}), 400
+
+    if first_day > last_day:
+        return jsonify({"error": "'from' must not be after 'to'"}), 400
+    if (last_day - first_day).days + 1 > MAX_SUMMARY_DAYS:
+        return jsonify({"error": f"Range is limited to {MAX_SUMMARY_DAYS} days"}), 400
+
+    days = daily_totals(current_user.id, first_day, last_day)
+    return jsonify({
+        "from": first_day.isoformat(),
+        "to": last_day.isoformat(),
+        "days": days,
+        "totals": sum_days(days),
+    })
+
+
 @food_bp.route("/add", methods=["POST"])
 @login_required
 def add():
@@ -150,8 +150,10 @@ def add():
         carbs_g=round(carbs_100g * factor, 1),
         fat_g=round(fat_100g * factor, 1),
         meal_type=meal_type,
+        logged_at=datetime.utcnow(),
     )
     db.session.add(entry)
+    record_food(current_user.id, [entry])
     db.session.commit()
 
     return jsonify({
@@ -175,7 +177,9 @@ def delete(entry_id):
     entry = FoodLog.query.get_or_404(entry_id)
     if entry.user_id != current_user.id:
         return jsonify({"error": "Forbidden"}), 403
-    db.session.delete(entry)
+    # Only the request that actually deletes the row takes it off the ledger
+    if db.session.execute(delete_rows(FoodLog).where(FoodLog.id == entry.id)).rowcount:
+        record_food(current_user.id, [entry], sign=-1)
     db.session.commit()
     return jsonify({"success": True})
 
@@ -205,23 +209,15 @@ def search():
             "custom": True,
         })
 
-    # Open Food Facts
-    try:
-        resp = http_requests.get(
-            OPEN_FOOD_FACTS_SEARCH.format(q=http_requests.utils.quote(q)),
-            timeout=3,
-            headers={"User-Agent": "ForgeFit/1.0"},
-        )
-        resp.raise_for_status()
-        data = resp.json()
-        for product in data.get("products", []):
-            name = product.get("product_name", "").strip()
-            if not name:
-                continue
-            n = product.get("nutriments", {})
-            results.append({"name": name, "custom": False, **_extract_nutriments(n)})
-    except Exception:
-        pass
+    # Local product index first; Open Food Facts (cached) only on a miss
+    local = search_local(q)
+    if local:
+        results.extend(local)
+    else:
+        try:
+            results.extend(get_product_cache().search(q))
+        except Exception:
+            pass
 
     return jsonify(results[:8])
 
@@ -229,24 +225,18 @@ def search():
 @food_bp.route("/barcode/<barcode>")
 @login_required
 def barcode(barcode):
+    product = lookup_local_barcode(barcode)
+    if product is not None:
+        return jsonify(product)
+
     try:
-        resp = http_requests.get(
-            OPEN_FOOD_FACTS_BARCODE.format(barcode=barcode),
-            timeout=5,
-            headers={"User-Agent": "ForgeFit/1.0"},
-        )
-        resp.raise_for_status()
-        data = resp.json()
+        product = get_product_cache().barcode(barcode)
     except Exception:
         return jsonify({"error": "Lookup failed"}), 502
 
-    product = data.get("product")
-    if not product or data.get("status") != 1:
+    if product is None:
         return jsonify({"error": "Product not found"}), 404
-
-    name = product.get("product_name", "").strip() or "Unknown product"
-    n = product.get("nutriments", {})
-    return jsonify({"name": name, **_extract_nutriments(n)})
+    return jsonify(product)
 
 
 @food_bp.route("/custom", methods=["GET"])
@@ -306,12 +296,13 @@ def copy_yesterday():
 
     yesterday_entries = FoodLog.query.filter(
         FoodLog.user_id == current_user.id,
-        db.func.date(FoodLog.logged_at) == yesterday,
+        on_day(FoodLog.logged_at, yesterday),
     ).all()
 
     if not yesterday_entries:
         return jsonify({"error": "No entries found for yesterday"}), 404
 
+    now = datetime.utcnow()
     new_entries = []
     for e in yesterday_entries:
         new = FoodLog(
@@ -323,10 +314,12 @@ def copy_yesterday():
             carbs_g=e.carbs_g,
             fat_g=e.fat_g,
             meal_type=e.meal_type or "general",
+            logged_at=now,
         )
         db.session.add(new)
         new_entries.append(new)
 
+    record_food(current_user.id, new_entries)
     db.session.commit()
 
     return jsonify({
@@ -354,16 +347,9 @@ def add_water():
     if amount_ml <= 0:
         return jsonify({"error": "Amount must be positive"}), 400
 
-    log = WaterLog(user_id=current_user.id, amount_ml=amount_ml)
+    log = WaterLog(user_id=current_user.id, amount_ml=amount_ml, logged_at=datetime.utcnow())
     db.session.add(log)
+    total = record_water(current_user.id, log)
     db.session.commit()
 
-    today = date.today()
-    total = db.session.query(
-        db.func.coalesce(db.func.sum(WaterLog.amount_ml), 0)
-    ).filter(
-        WaterLog.user_id == current_user.id,
-        db.func.date(WaterLog.logged_at) == today,
-    ).scalar() or 0
-
     return jsonify({"success": True, "total_ml": int(total)})
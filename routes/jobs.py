@@ -0,0 +1,62 @@
+import json
+import time
+
+from flask import Blueprint, Response, jsonify, abort, stream_with_context
+from flask_login import login_required, current_user
+
+from app import db
+from models import Job
+from jobs import ACTIVE_STATUSES, job_to_dict
+
+jobs_bp = Blueprint("jobs", __name__, url_prefix="/jobs")
+
+SSE_POLL_SECONDS = 1.0
+SSE_MAX_SECONDS = 120
+
+
+def _get_own_job(job_id):
+    job = db.session.get(Job, job_id)
+    if not job:
+        abort(404)
+    if job.user_id != current_user.id:
+        abort(403)
+    return job
+
+
+@jobs_bp.route("/<int:job_id>")
+@login_required
+def status(job_id):
+    return jsonify(job_to_dict(_get_own_job(job_id)))
+
+
+@jobs_bp.route("/<int:job_id>/events")
+@login_required
+def events(job_id):
+    """Server-Sent Events stream of a job's status until it finishes.
+
+    Each open stream holds a worker, so the plan page polls ``status`` instead;
+    this is for clients running behind async (gevent/eventlet) workers.
+    """
+    _get_own_job(job_id)
+
+    def generate():
+        last_status = None
+        deadline = time.monotonic() + SSE_MAX_SECONDS
+        while time.monotonic() < deadline:
+            db.session.expire_all()
+            job = db.session.get(Job, job_id)
+            if job.status != last_status:
+                last_status = job.status
+                yield f"event: status\ndata: {json.dumps(job_to_dict(job))}\n\n"
+            if job.status not in ACTIVE_STATUSES:
+                return
+            # Release the connection between polls
+            db.session.rollback()
+            time.sleep(SSE_POLL_SECONDS)
+        yield "event: timeout\ndata: {}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,22 @@
+import hmac
+
+from flask import Blueprint, Response, abort, current_app, request
+
+import metrics
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+@metrics_bp.route("/metrics")
+def export():
+    """Prometheus scrape endpoint: ``Authorization: Bearer $METRICS_TOKEN``; 404 while no token is set.
+
+    Each process serves only its own counters (see ``metrics``); behind
+    gunicorn a scrape reaches whichever worker takes the request.
+    """
+    token = current_app.config["METRICS_TOKEN"]
+    if not token:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        abort(401)
+    return Response(metrics.to_prometheus(), mimetype="text/plain; version=0.0.4")
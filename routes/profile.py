@@ -1,9 +1,10 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
 
+import user_cache
 from app import db
 from models import Profile, WorkoutPlan
-from ai_engine import generate_plan_with_ai, save_plan_to_db
+from ai_engine import queue_plan_generation
 
 profile_bp = Blueprint("profile", __name__, url_prefix="/profile")
 
@@ -85,6 +86,7 @@ def onboarding():
         # Create or update profile
         profile = current_user.profile
         if profile:
+            db.session.refresh(profile)  # Write over the row as stored, not the cached copy
             for key, val in data.items():
                 setattr(profile, key, val)
         else:
@@ -92,16 +94,11 @@ def onboarding():
             db.session.add(profile)
 
         db.session.commit()
+        user_cache.invalidate(current_user.id)
 
-        # Generate week 1 plan via Claude
-        try:
-            plan_data = generate_plan_with_ai(data, week_number=1)
-            save_plan_to_db(current_user.id, 1, plan_data)
-            flash("Your training plan has been generated!", "success")
-        except Exception as e:
-            flash(f"Plan generation failed: {e}. Please try again.", "error")
-            return redirect(url_for("profile.onboarding"))
-
+        # Design a fresh plan via Claude in the background
+        queue_plan_generation(current_user.id, data)
+        flash("Generating your training plan...", "info")
         return redirect(url_for("workout.plan"))
 
     return render_template("profile/onboarding.html")
@@ -116,6 +113,7 @@ def edit():
     if request.method == "POST":
         try:
             profile = current_user.profile
+            db.session.refresh(profile)  # Write over the row as stored, not the cached copy
             age_raw = request.form.get("age", "").strip()
             profile.height_cm = float(request.form["height_cm"])
             profile.weight_kg = float(request.form["weight_kg"])
@@ -143,6 +141,7 @@ def edit():
                 profile.fat_target_g = targets["fat_target_g"]
 
             db.session.commit()
+            user_cache.invalidate(current_user.id)
         except (KeyError, ValueError):
             flash("Please fill in all fields with valid numbers.", "error")
             return render_template("profile/onboarding.html", profile=current_user.profile, editing=True)
@@ -161,13 +160,8 @@ def edit():
             "gym_equipment": profile.gym_equipment or "",
         }
 
-        try:
-            plan_data = generate_plan_with_ai(data, week_number=1)
-            save_plan_to_db(current_user.id, 1, plan_data)
-            flash("Profile updated and plan regenerated!", "success")
-        except Exception as e:
-            flash(f"Plan generation failed: {e}", "error")
-
+        queue_plan_generation(current_user.id, data)
+        flash("Profile updated. Regenerating your plan...", "success")
         return redirect(url_for("workout.plan"))
 
     return render_template("profile/onboarding.html", profile=current_user.profile, editing=True)
@@ -1,13 +1,20 @@
 import json
-import io
-from collections import defaultdict
+from datetime import date
 
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, send_file, abort
 from flask_login import login_required, current_user
+from sqlalchemy.exc import IntegrityError
 
 from app import db
-from models import WorkoutPlan, WorkoutDay, WorkoutLog, Exercise, ExerciseNote
-from ai_engine import generate_plan_with_ai, save_plan_to_db, plan_to_dict_with_logs
+from models import Job, Exercise, ExerciseNote
+from ai_engine import queue_plan_generation, plan_to_dict_with_logs, save_plan_to_db
+import pdf_export
+from jobs import ACTIVE_STATUSES, enqueue, job_to_dict, latest_job
+from progress import MAX_POINTS, exercise_names, series
+from progression import local_plan
+from plan_writer import WeekExists, next_week_number
+from plans import get_day, get_latest_plan, load_logs_and_notes, load_notes, load_sets
+from workout_logs import InvalidSets, UnknownExercise, apply_sync_ops, parse_sets, record_sets, upsert_note
 
 workout_bp = Blueprint("workout", __name__, url_prefix="/workout")
 
@@ -18,23 +25,32 @@ def plan():
     if not current_user.profile:
         return redirect(url_for("profile.onboarding"))
 
-    latest_plan = WorkoutPlan.query.filter_by(user_id=current_user.id).order_by(
-        WorkoutPlan.week_number.desc()
-    ).first()
+    latest_plan = get_latest_plan(current_user.id)
+
+    job = latest_job(current_user.id, "generate_plan")
+    pending_job = job if job and job.status in ACTIVE_STATUSES else None
+    failed_job = None
+    if job and job.status == "failed" and (not latest_plan or job.created_at > latest_plan.created_at):
+        failed_job = job
 
     if not latest_plan:
+        if pending_job or failed_job:
+            return render_template("workout/generating.html", job=pending_job or failed_job)
         flash("No plan found. Let's generate one!", "info")
         return redirect(url_for("profile.onboarding"))
 
-    return render_template("workout/plan.html", plan=latest_plan)
+    return render_template(
+        "workout/plan.html",
+        plan=latest_plan,
+        pending_job=pending_job,
+        failed_job=failed_job,
+    )
 
 
 @workout_bp.route("/day/<int:day_index>")
 @login_required
 def day(day_index):
-    latest_plan = WorkoutPlan.query.filter_by(user_id=current_user.id).order_by(
-        WorkoutPlan.week_number.desc()
-    ).first()
+    latest_plan = get_latest_plan(current_user.id)
 
     if not latest_plan:
         return redirect(url_for("profile.onboarding"))
@@ -49,21 +65,8 @@ def day(day_index):
         flash("Day not found.", "error")
         return redirect(url_for("workout.plan"))
 
-    # Get existing logs for this day's exercises
-    exercise_ids = [ex.id for ex in workout_day.exercises]
-    logs = WorkoutLog.query.filter(
-        WorkoutLog.exercise_id.in_(exercise_ids),
-        WorkoutLog.user_id == current_user.id
-    ).all()
-    logged_map = {log.exercise_id: log for log in logs}
-
-    # Get user notes for exercises in this day
-    exercise_names = [ex.name.lower().strip() for ex in workout_day.exercises]
-    user_notes = ExerciseNote.query.filter(
-        ExerciseNote.user_id == current_user.id,
-        ExerciseNote.exercise_name.in_(exercise_names),
-    ).all()
-    notes_map = {n.exercise_name: n.note for n in user_notes}
+    # Existing logs and personal notes for this day's exercises
+    logged_map, notes_map = load_logs_and_notes(current_user.id, workout_day.exercises)
 
     return render_template(
         "workout/day.html",
@@ -92,26 +95,42 @@ def log_exercise():
     if not exercise:
         return jsonify({"error": "Exercise not found"}), 404
 
-    existing = WorkoutLog.query.filter_by(
-        exercise_id=exercise_id, user_id=current_user.id
-    ).first()
+    # The day view logs one summary result per exercise, replacing any per-set log so a
+    # correction shows; per-set logging goes through /log/batch
+    try:
+        sets = parse_sets([
+            {"exercise_id": exercise.id, "set_index": 0, "reps": actual_reps, "weight_kg": actual_weight_kg}
+        ])
+        record_sets(current_user.id, sets, replace=True)
+    except UnknownExercise as e:
+        return jsonify({"error": str(e)}), 404
+    except InvalidSets as e:
+        return jsonify({"error": str(e)}), 400
 
-    if existing:
-        existing.actual_reps = int(actual_reps)
-        existing.actual_weight_kg = float(actual_weight_kg)
-    else:
-        log = WorkoutLog(
-            exercise_id=exercise_id,
-            user_id=current_user.id,
-            actual_reps=int(actual_reps),
-            actual_weight_kg=float(actual_weight_kg),
-        )
-        db.session.add(log)
-
-    db.session.commit()
     return jsonify({"success": True})
 
 
+@workout_bp.route("/log/batch", methods=["POST"])
+@login_required
+def log_batch():
+    """Write a whole session's sets in one transaction.
+
+    Body: {"sets": [{"exercise_id", "set_index", "reps", "weight_kg", "rpe"?}, ...]}
+    """
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "No data provided"}), 400
+
+    try:
+        written = record_sets(current_user.id, parse_sets(data.get("sets")))
+    except UnknownExercise as e:
+        return jsonify({"error": str(e)}), 404
+    except InvalidSets as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({"success": True, "written": written})
+
+
 @workout_bp.route("/note", methods=["POST"])
 @login_required
 def save_note():
@@ -120,115 +139,124 @@ def save_note():
         return jsonify({"error": "No data provided"}), 400
 
     exercise_name = data.get("exercise_name", "").strip().lower()
-    note = data.get("note", "").strip()
-
     if not exercise_name:
         return jsonify({"error": "Missing exercise name"}), 400
 
-    # Upsert: update if exists, create if not
-    existing = ExerciseNote.query.filter_by(
-        user_id=current_user.id,
-        exercise_name=exercise_name,
-    ).first()
-
-    if existing:
-        existing.note = note
-        from datetime import datetime
-        existing.updated_at = datetime.utcnow()
-    elif note:  # Only create if there's actually a note
-        new_note = ExerciseNote(
-            user_id=current_user.id,
-            exercise_name=exercise_name,
-            note=note,
-        )
-        db.session.add(new_note)
-
-    db.session.commit()
+    upsert_note(current_user.id, exercise_name, data.get("note", ""))
     return jsonify({"success": True})
 
 
+@workout_bp.route("/sync", methods=["POST"])
+@login_required
+def sync():
+    """Apply writes queued offline by the session page.
+
+    Body: {"ops": [{"key": <idempotency key>, "type": "set" | "note", ...}]}.
+    Safe to retry: ops whose key was already applied are reported as duplicates.
+    """
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "No data provided"}), 400
+
+    try:
+        applied, duplicates, rejected = apply_sync_ops(current_user.id, data.get("ops"))
+    except InvalidSets as e:
+        return jsonify({"error": str(e)}), 400
+    except IntegrityError:
+        # The same batch is being applied by a concurrent retry; the next sync sees its receipts
+        db.session.rollback()
+        return jsonify({"error": "Sync conflict, retry"}), 409
+
+    return jsonify({"success": True, "applied": applied, "duplicates": duplicates, "rejected": rejected})
+
+
 @workout_bp.route("/progress")
 @login_required
 def progress():
-    logs = db.session.query(WorkoutLog, Exercise).join(
-        Exercise, WorkoutLog.exercise_id == Exercise.id
-    ).filter(
-        WorkoutLog.user_id == current_user.id
-    ).order_by(WorkoutLog.logged_at.asc()).all()
-
-    exercise_data = defaultdict(list)
-    exercise_names = []
-    for log, exercise in logs:
-        name = exercise.name
-        if name not in exercise_names:
-            exercise_names.append(name)
-        exercise_data[name].append({
-            "date": log.logged_at.strftime("%Y-%m-%d"),
-            "weight": log.actual_weight_kg,
-            "reps": log.actual_reps,
-        })
-
+    # The chart data comes from progress_data; the page only needs the names
     return render_template(
         "workout/progress.html",
-        exercise_names=exercise_names,
-        exercise_data=json.dumps(dict(exercise_data)),
+        exercise_names=exercise_names(current_user.id),
     )
 
 
+@workout_bp.route("/progress/data")
+@login_required
+def progress_data():
+    """Daily e1RM/volume/PR series for ?exercise=NAME[&from=YYYY-MM-DD&to=YYYY-MM-DD&points=N]."""
+    name = request.args.get("exercise", "").strip()
+    if not name:
+        return jsonify({"error": "Missing exercise"}), 400
+    try:
+        first_day = date.fromisoformat(request.args["from"]) if request.args.get("from") else None
+        last_day = date.fromisoformat(request.args["to"]) if request.args.get("to") else None
+    except ValueError:
+        return jsonify({"error": "Dates must be YYYY-MM-DD"}), 400
+    if first_day and last_day and first_day > last_day:
+        return jsonify({"error": "'from' must not be after 'to'"}), 400
+    max_points = min(max(request.args.get("points", MAX_POINTS, type=int), 10), 1000)
+
+    points, bucket_days = series(current_user.id, name, first_day, last_day, max_points)
+    return jsonify({"exercise": name, "bucket_days": bucket_days, "points": points})
+
+
 @workout_bp.route("/export-pdf")
 @login_required
 def export_pdf():
-    from fpdf import FPDF
+    """This week's plan as a PDF, from the disk cache when it hasn't changed.
 
-    latest_plan = WorkoutPlan.query.filter_by(user_id=current_user.id).order_by(
-        WorkoutPlan.week_number.desc()
-    ).first()
+    The ETag is the content hash, so a client that already has this version
+    gets a 304.
+    """
+    latest_plan = get_latest_plan(current_user.id)
 
     if not latest_plan:
         flash("No plan to export.", "error")
         return redirect(url_for("workout.plan"))
 
-    pdf = FPDF()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.add_page()
-
-    pdf.set_font("Helvetica", "B", 20)
-    pdf.cell(0, 15, f"ForgeFit - Week {latest_plan.week_number}", ln=True, align="C")
-    pdf.ln(5)
-
-    for day_obj in latest_plan.days:
-        pdf.set_font("Helvetica", "B", 14)
-        pdf.set_fill_color(240, 240, 240)
-        pdf.cell(0, 10, day_obj.label, ln=True, fill=True)
-        pdf.ln(2)
-
-        pdf.set_font("Helvetica", "B", 10)
-        pdf.cell(80, 8, "Exercise", border=1)
-        pdf.cell(25, 8, "Sets", border=1, align="C")
-        pdf.cell(25, 8, "Reps", border=1, align="C")
-        pdf.cell(35, 8, "Weight (kg)", border=1, align="C")
-        pdf.ln()
-
-        pdf.set_font("Helvetica", "", 10)
-        for ex in day_obj.exercises:
-            pdf.cell(80, 8, ex.name[:35], border=1)
-            pdf.cell(25, 8, str(ex.sets), border=1, align="C")
-            pdf.cell(25, 8, str(ex.reps), border=1, align="C")
-            pdf.cell(35, 8, str(ex.weight_kg), border=1, align="C")
-            pdf.ln()
-
-        pdf.ln(5)
-
-    pdf_bytes = pdf.output()
-    buffer = io.BytesIO(pdf_bytes)
-    buffer.seek(0)
-
-    return send_file(
-        buffer,
+    key, path = pdf_export.week_pdf(latest_plan)
+    return _send_pdf(path, key, f"forgefit_week_{latest_plan.week_number}.pdf")
+
+
+def _send_pdf(path, key, filename):
+    response = send_file(
+        path,
         mimetype="application/pdf",
         as_attachment=True,
-        download_name=f"forgefit_week_{latest_plan.week_number}.pdf",
+        download_name=filename,
+        etag=key,
+        conditional=True,
     )
+    response.cache_control.private = True
+    response.cache_control.no_cache = True  # Revalidate; the plan may have changed
+    return response
+
+
+@workout_bp.route("/export-pdf/history", methods=["POST"])
+@login_required
+def export_pdf_history():
+    """Start a background export of the last few weeks, with logged sets and notes."""
+    weeks = request.form.get("weeks", 4, type=int)
+    if not weeks or not 1 <= weeks <= pdf_export.MAX_HISTORY_WEEKS:
+        return jsonify({"error": f"weeks must be between 1 and {pdf_export.MAX_HISTORY_WEEKS}"}), 400
+    job = enqueue("export_pdf", user_id=current_user.id, weeks=weeks)
+    return jsonify(job_to_dict(job)), 202
+
+
+@workout_bp.route("/export-pdf/history/<int:job_id>")
+@login_required
+def download_pdf_history(job_id):
+    job = db.session.get(Job, job_id)
+    if not job or job.kind != "export_pdf" or job.user_id != current_user.id:
+        abort(404)
+    if job.status != "done":
+        return jsonify(job_to_dict(job)), 409
+    result = json.loads(job.result)
+    path = pdf_export.cached_path(result["key"])
+    if path is None:
+        flash("That export has expired. Please export again.", "error")
+        return redirect(url_for("workout.plan"))
+    return _send_pdf(path, result["key"], result["filename"])
 
 
 @workout_bp.route("/next-week", methods=["POST"])
@@ -237,12 +265,15 @@ def next_week():
     if not current_user.profile:
         return redirect(url_for("profile.onboarding"))
 
-    latest_plan = WorkoutPlan.query.filter_by(user_id=current_user.id).order_by(
-        WorkoutPlan.week_number.desc()
-    ).first()
+    job = latest_job(current_user.id, "generate_plan")
+    if job and job.status in ACTIVE_STATUSES:
+        flash("A plan is already being generated.", "info")
+        return redirect(url_for("workout.plan"))
 
-    current_week = latest_plan.week_number if latest_plan else 0
-    next_week_num = current_week + 1
+    latest_plan = get_latest_plan(current_user.id)
+    # From the plans table, not the page the user was looking at: a second submit
+    # (or another worker) may already have added a week
+    next_week_num = next_week_number(current_user.id)
 
     profile = current_user.profile
     # Fetch all user exercise notes for AI context
@@ -265,42 +296,36 @@ def next_week():
 
     previous_plan = plan_to_dict_with_logs(latest_plan, current_user.id) if latest_plan else None
 
-    try:
-        plan_data = generate_plan_with_ai(data, week_number=next_week_num, previous_plan=previous_plan)
-        save_plan_to_db(current_user.id, next_week_num, plan_data)
-        flash(f"Week {next_week_num} plan generated!", "success")
-    except Exception as e:
-        flash(f"Failed to generate next week: {e}", "error")
-
+    # Routine weeks are progressed locally; Claude only redesigns on request
+    if request.form.get("redesign"):
+        queue_plan_generation(current_user.id, data, week_number=next_week_num, previous_plan=previous_plan)
+        flash(f"Redesigning week {next_week_num} with AI...", "info")
+    else:
+        try:
+            save_plan_to_db(current_user.id, next_week_num, local_plan(data, next_week_num, previous_plan))
+        except WeekExists:
+            flash(f"Week {next_week_num} was already created.", "info")
+            return redirect(url_for("workout.plan"))
+        flash(f"Week {next_week_num} is ready.", "success")
     return redirect(url_for("workout.plan"))
 
 
 @workout_bp.route("/session/<int:day_id>")
 @login_required
 def session(day_id):
-    day = WorkoutDay.query.get_or_404(day_id)
+    day = get_day(day_id)
+    if not day:
+        abort(404)
     if day.plan.user_id != current_user.id:
         abort(403)
 
-    # Existing logs for today
-    exercise_ids = [ex.id for ex in day.exercises]
-    logs = WorkoutLog.query.filter(
-        WorkoutLog.exercise_id.in_(exercise_ids),
-        WorkoutLog.user_id == current_user.id,
-    ).all()
-    logged_map = {log.exercise_id: log for log in logs}
-
-    # Personal notes
-    exercise_names = [ex.name.lower().strip() for ex in day.exercises]
-    user_notes = ExerciseNote.query.filter(
-        ExerciseNote.user_id == current_user.id,
-        ExerciseNote.exercise_name.in_(exercise_names),
-    ).all()
-    notes_map = {n.exercise_name: n.note for n in user_notes}
+    # Sets already logged, and personal notes
+    notes_map = load_notes(current_user.id, day.exercises)
+    set_map = load_sets(current_user.id, day.exercises)
 
     exercises_data = []
     for ex in day.exercises:
-        log = logged_map.get(ex.id)
+        logged = set_map.get(ex.id, {})
         exercises_data.append({
             "id": ex.id,
             "name": ex.name,
@@ -310,8 +335,11 @@ def session(day_id):
             "muscle_group": ex.muscle_group or "",
             "notes": ex.notes or "",
             "user_note": notes_map.get(ex.name.lower().strip(), ""),
-            "logged_reps": log.actual_reps if log else ex.reps,
-            "logged_weight": log.actual_weight_kg if log else ex.weight_kg,
+            # set_index -> what was logged; rows without an entry show the prescription
+            "logged_sets": {
+                s.set_index: {"reps": s.reps, "weight_kg": s.weight_kg, "rpe": s.rpe}
+                for s in logged.values()
+            },
         })
 
     return render_template(
@@ -18,6 +18,71 @@ function showDay(index) {
     });
 }
 
+/* Background jobs */
+function watchJob(jobId, statusEl) {
+    function poll() {
+        fetch("/jobs/" + jobId)
+        .then(function (res) { return res.json(); })
+        .then(function (job) {
+            if (job.status === "done" || job.status === "cancelled") {
+                // Cancelled: superseded by a newer generation, which the reloaded page shows
+                location.reload();
+                return;
+            }
+            if (job.status === "failed") {
+                if (statusEl) {
+                    statusEl.className = "flash flash-error";
+                    statusEl.textContent = "Plan generation failed: " + (job.error || "Unknown error");
+                }
+                return;
+            }
+            setTimeout(poll, 2000);
+        })
+        .catch(function () { setTimeout(poll, 5000); });
+    }
+    poll();
+}
+
+/* Exports prepared by a background job (multi-week PDF, account data), then downloaded
+   from the form's data-download-url plus the job id */
+function exportInBackground(form) {
+    var button = form.querySelector("button");
+    var statusEl = form.querySelector(".export-status");
+    button.disabled = true;
+    statusEl.textContent = "Preparing your export…";
+
+    function fail(message) {
+        button.disabled = false;
+        statusEl.textContent = message;
+    }
+
+    function poll(jobId) {
+        fetch("/jobs/" + jobId)
+        .then(function (res) { return res.json(); })
+        .then(function (job) {
+            if (job.status === "done") {
+                button.disabled = false;
+                statusEl.textContent = "";
+                window.location = form.dataset.downloadUrl + jobId;
+            } else if (job.status === "failed") {
+                fail("Export failed: " + (job.error || "Unknown error"));
+            } else {
+                setTimeout(function () { poll(jobId); }, 1500);
+            }
+        })
+        .catch(function () { setTimeout(function () { poll(jobId); }, 5000); });
+    }
+
+    fetch(form.action, { method: "POST", body: new FormData(form) })
+    .then(function (res) { return res.json(); })
+    .then(function (job) {
+        if (job.error && !job.id) { fail(job.error); return; }
+        poll(job.id);
+    })
+    .catch(function () { fail("Export failed. Please try again."); });
+    return false;
+}
+
 /* Workout Logging */
 function logExercise(exerciseId) {
     var repsInput = document.getElementById("reps-" + exerciseId);
@@ -95,45 +160,98 @@ function sendChat() {
     messagesDiv.appendChild(typing);
     messagesDiv.scrollTop = messagesDiv.scrollHeight;
 
-    fetch("/api/chat", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ message: message }),
-    })
-    .then(function (res) { return res.json(); })
-    .then(function (data) {
-        messagesDiv.removeChild(typing);
-
-        var aiMsg = document.createElement("div");
-        aiMsg.className = "chat-msg chat-msg-ai";
+    var aiMsg = null;
+    function showReply(text) {
+        if (!aiMsg) {
+            messagesDiv.removeChild(typing);
+            aiMsg = document.createElement("div");
+            aiMsg.className = "chat-msg chat-msg-ai";
+            messagesDiv.appendChild(aiMsg);
+        }
+        aiMsg.textContent = text;
+        messagesDiv.scrollTop = messagesDiv.scrollHeight;
+    }
 
-        if (data.error) {
-            aiMsg.textContent = "Error: " + data.error;
-        } else {
-            aiMsg.textContent = data.reply;
+    var replyText = "";
+    function handleEvent(event, data) {
+        if (event === "delta") {
+            replyText += data.text;
+            showReply(replyText);
+        } else if (event === "done") {
+            showReply(data.reply);
             if (data.plan_updated) {
                 var notice = document.createElement("div");
                 notice.className = "chat-plan-updated";
                 notice.innerHTML = '<i data-feather="refresh-cw" style="width:14px;height:14px;"></i> Plan updated! <a href="/workout/plan">View changes</a>';
                 aiMsg.appendChild(notice);
                 feather.replace();
+            } else if (data.plan_error) {
+                var warning = document.createElement("div");
+                warning.className = "chat-plan-updated";
+                warning.textContent = data.plan_error;
+                aiMsg.appendChild(warning);
             }
+        } else if (event === "error") {
+            showReply("Error: " + data.error);
         }
+    }
 
-        messagesDiv.appendChild(aiMsg);
-        messagesDiv.scrollTop = messagesDiv.scrollHeight;
+    // The reply is streamed over Server-Sent Events as it is written
+    fetch("/api/chat", {
+        method: "POST",
+        headers: { "Content-Type": "application/json", "Accept": "text/event-stream" },
+        body: JSON.stringify({ message: message }),
+    })
+    .then(function (res) {
+        var type = res.headers.get("Content-Type") || "";
+        if (type.indexOf("text/event-stream") === -1 || !res.body) {
+            // Validation errors come back as plain JSON
+            return res.json().then(function (data) {
+                if (data.error) handleEvent("error", data);
+                else handleEvent("done", data);
+            });
+        }
+        return readEventStream(res.body, handleEvent);
     })
     .catch(function (err) {
-        messagesDiv.removeChild(typing);
-        var errMsg = document.createElement("div");
-        errMsg.className = "chat-msg chat-msg-ai";
-        errMsg.textContent = "Failed to connect. Please try again.";
-        messagesDiv.appendChild(errMsg);
+        showReply("Failed to connect. Please try again.");
     });
 }
 
+function readEventStream(body, onEvent) {
+    var reader = body.getReader();
+    var decoder = new TextDecoder();
+    var buffer = "";
+
+    function dispatch(frame) {
+        var event = "message";
+        var data = "";
+        frame.split("\n").forEach(function (line) {
+            if (line.indexOf("event:") === 0) event = line.slice(6).trim();
+            else if (line.indexOf("data:") === 0) data += line.slice(5).trim();
+        });
+        if (data) onEvent(event, JSON.parse(data));
+    }
+
+    function pump() {
+        return reader.read().then(function (result) {
+            if (result.done) {
+                if (buffer.trim()) dispatch(buffer);
+                return;
+            }
+            buffer += decoder.decode(result.value, { stream: true });
+            var frames = buffer.split("\n\n");
+            buffer = frames.pop();
+            frames.forEach(dispatch);
+            return pump();
+        });
+    }
+    return pump();
+}
+
 /* Food / Nutrition */
 var _foodDebounce = null;
+var _foodSearchAbort = null;
 var _foodResults = [];
 
 function foodSearch() {
@@ -141,13 +259,18 @@ function foodSearch() {
     var resultsEl = document.getElementById("foodResults");
 
     if (!q) {
+        if (_foodSearchAbort) _foodSearchAbort.abort();
+        clearTimeout(_foodDebounce);
         resultsEl.style.display = "none";
         return;
     }
 
     clearTimeout(_foodDebounce);
     _foodDebounce = setTimeout(function () {
-        fetch("/food/search?q=" + encodeURIComponent(q))
+        // A newer search supersedes any still in flight
+        if (_foodSearchAbort) _foodSearchAbort.abort();
+        var controller = _foodSearchAbort = new AbortController();
+        fetch("/food/search?q=" + encodeURIComponent(q), { signal: controller.signal })
         .then(function (r) { return r.json(); })
         .then(function (items) {
             _foodResults = items;
@@ -165,7 +288,9 @@ function foodSearch() {
             });
             resultsEl.style.display = "block";
         })
-        .catch(function () { resultsEl.style.display = "none"; });
+        .catch(function (err) {
+            if (err.name !== "AbortError") resultsEl.style.display = "none";
+        });
     }, 300);
 }
 
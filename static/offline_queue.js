@@ -0,0 +1,191 @@
+/* ============================================================
+   ForgeFit — offline write queue for workout sessions
+   Writes are stored in IndexedDB first and flushed to /workout/sync
+   in batches. Every op carries an idempotency key, so a batch can be
+   re-sent after a dropped connection without double-logging.
+   The queue is per account: the database is named after the user id
+   from the script tag, every op carries that id, and logging out
+   flushes and then deletes it.
+   ============================================================ */
+
+var OfflineQueue = (function() {
+    var script = document.currentScript;
+    var USER_ID = script && parseInt(script.dataset.userId, 10);
+    var DB_NAME = 'forgefit-user-' + USER_ID;
+    var LEGACY_DB_NAME = 'forgefit';  // shared by every account and holding untagged ops
+    var STORE = 'pending_ops';
+    var LOGOUT_FLUSH_MS = 3000;
+    var BATCH_SIZE = 100;
+    var RETRY_MS = 30000;
+
+    var dbPromise = null;
+    var memoryOps = [];  // fallback when IndexedDB is unavailable (private mode, old browsers)
+    var flushing = false;
+    var statusListener = null;
+
+    function newKey() {
+        if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+        return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2) + Math.random().toString(36).slice(2);
+    }
+
+    function openDb() {
+        if (dbPromise) return dbPromise;
+        dbPromise = new Promise(function(resolve) {
+            if (!window.indexedDB || !USER_ID) { resolve(null); return; }
+            var req = indexedDB.open(DB_NAME, 1);
+            req.onupgradeneeded = function() {
+                req.result.createObjectStore(STORE, {keyPath: 'key'});
+            };
+            req.onsuccess = function() { resolve(req.result); };
+            req.onerror = function() { resolve(null); };
+        });
+        return dbPromise;
+    }
+
+    function tx(mode, fn) {
+        return openDb().then(function(db) {
+            if (!db) { var r = fn(null); return r && r.value; }
+            return new Promise(function(resolve, reject) {
+                var t = db.transaction(STORE, mode);
+                var result = fn(t.objectStore(STORE));
+                t.oncomplete = function() { resolve(result && result.value); };
+                t.onerror = function() { reject(t.error); };
+            });
+        });
+    }
+
+    function putAll(ops) {
+        return tx('readwrite', function(store) {
+            if (!store) { memoryOps = memoryOps.concat(ops); return; }
+            ops.forEach(function(op) { store.put(op); });
+        });
+    }
+
+    function readAll() {
+        return tx('readonly', function(store) {
+            if (!store) return {value: memoryOps.slice()};
+            var holder = {value: []};
+            store.getAll().onsuccess = function(e) {
+                holder.value = e.target.result.sort(function(a, b) { return a.queued_at - b.queued_at; });
+            };
+            return holder;
+        });
+    }
+
+    function removeKeys(keys) {
+        if (!keys.length) return Promise.resolve();
+        return tx('readwrite', function(store) {
+            if (!store) {
+                memoryOps = memoryOps.filter(function(op) { return keys.indexOf(op.key) === -1; });
+                return;
+            }
+            keys.forEach(function(k) { store.delete(k); });
+        });
+    }
+
+    function notify(pending) {
+        if (statusListener) statusListener(pending);
+    }
+
+    /* Queue writes. Each op is {type: 'set' | 'note', ...fields}. */
+    function enqueue(ops) {
+        var now = Date.now();
+        var stamped = ops.map(function(op, i) {
+            return Object.assign({key: newKey(), queued_at: now + i / 1000}, op, {user_id: USER_ID});
+        });
+        return putAll(stamped).then(function() { return flush(); });
+    }
+
+    /* Queued ops of this account; anything else is dropped rather than sent. */
+    function readOwn() {
+        return readAll().then(function(ops) {
+            var foreign = ops.filter(function(op) { return op.user_id !== USER_ID; });
+            return removeKeys(foreign.map(function(op) { return op.key; })).then(function() {
+                return ops.filter(function(op) { return op.user_id === USER_ID; });
+            });
+        });
+    }
+
+    function sendBatch(batch, keepalive) {
+        return fetch('/workout/sync', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({ops: batch}),
+            keepalive: !!keepalive,
+        }).then(function(res) {
+            if (!res.ok) throw new Error(res.status);
+            return res.json();
+        }).then(function(data) {
+            // Rejected ops will never succeed; drop them with the rest
+            var done = data.applied.concat(data.duplicates, Object.keys(data.rejected || {}));
+            return removeKeys(done);
+        });
+    }
+
+    /* Send everything queued. Safe to call at any time; stops at the first failure. */
+    function flush(keepalive) {
+        if (flushing || navigator.onLine === false) return readAll().then(function(ops) { notify(ops.length); });
+        flushing = true;
+        return readOwn().then(function(ops) {
+            var chain = Promise.resolve();
+            for (var i = 0; i < ops.length; i += BATCH_SIZE) {
+                (function(batch) {
+                    chain = chain.then(function() { return sendBatch(batch, keepalive); });
+                })(ops.slice(i, i + BATCH_SIZE));
+            }
+            return chain;
+        }).catch(function() {
+            // Offline or server error: keep the ops, retry later
+        }).then(function() {
+            flushing = false;
+            return readAll();
+        }).then(function(ops) {
+            notify(ops.length);
+            return ops.length;
+        });
+    }
+
+    /* Drop everything queued for this account and delete its database. */
+    function clear() {
+        memoryOps = [];
+        var opened = dbPromise || Promise.resolve(null);
+        dbPromise = null;
+        return opened.then(function(db) {
+            if (db) db.close();
+            if (!window.indexedDB) return;
+            return new Promise(function(resolve) {
+                var req = indexedDB.deleteDatabase(DB_NAME);
+                req.onsuccess = req.onerror = req.onblocked = function() { resolve(); };
+            });
+        });
+    }
+
+    /* Logging out: send what we can, briefly, then clear the queue before leaving. */
+    function logout(url) {
+        var timeout = new Promise(function(resolve) { setTimeout(resolve, LOGOUT_FLUSH_MS); });
+        return Promise.race([flush(true), timeout]).then(clear, clear).then(function() {
+            window.location.href = url;
+        });
+    }
+
+    function onStatus(fn) {
+        statusListener = fn;
+        readAll().then(function(ops) { notify(ops.length); });
+    }
+
+    if (window.indexedDB) indexedDB.deleteDatabase(LEGACY_DB_NAME);
+    document.addEventListener('click', function(e) {
+        var link = e.target.closest && e.target.closest('a[data-logout]');
+        if (!link) return;
+        e.preventDefault();
+        logout(link.href);
+    });
+    window.addEventListener('online', function() { flush(); });
+    document.addEventListener('visibilitychange', function() {
+        if (document.visibilityState === 'hidden') flush(true);
+    });
+    setInterval(function() { flush(); }, RETRY_MS);
+    flush();  // leftovers from a previous session
+
+    return {enqueue: enqueue, flush: flush, clear: clear, onStatus: onStatus};
+})();
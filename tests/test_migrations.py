@@ -0,0 +1,56 @@
+"""Schema migrations run by more than one process at once.
+
+    python -m pytest tests
+"""
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine, text
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "sqlite:///" + str(tmp_path / "test.db"))
+    monkeypatch.setenv("AUTO_MIGRATE", "0")  # Leave the database empty
+    from app import create_app
+
+    create_app()
+    engine = create_engine("sqlite:///" + str(tmp_path / "test.db"), connect_args={"timeout": 30})
+    yield engine
+    engine.dispose()
+
+
+def test_concurrent_upgrades_apply_each_migration_once(engine, monkeypatch):
+    import migrations
+    from migrations import v004_unique_plan_weeks
+
+    calls = []
+    original = v004_unique_plan_weeks.upgrade
+
+    def slow_upgrade(conn):
+        calls.append(threading.get_ident())
+        time.sleep(0.2)  # Long enough for the other process to reach this step
+        original(conn)
+
+    monkeypatch.setattr(v004_unique_plan_weeks, "upgrade", slow_upgrade)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(migrations.upgrade(engine))) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(len(applied) for applied in results) == [0, migrations.latest_version()]
+    assert migrations.current_version(engine) == migrations.latest_version()
+
+
+def test_current_version_of_a_new_database_is_zero(engine):
+    import migrations
+
+    assert migrations.current_version(engine) == 0
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE schema_version (version INTEGER NOT NULL)"))
+        conn.execute(text("INSERT INTO schema_version (version) VALUES (3)"))
+    assert migrations.current_version(engine) == 3
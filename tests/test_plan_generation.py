@@ -0,0 +1,92 @@
+"""Queueing AI plan generation when the profile changes mid-flight.
+
+    python -m pytest tests
+"""
+import pytest
+
+PROFILE = {
+    "height_cm": 180, "weight_kg": 80, "goal": "muscle", "plan_type": "full_body", "days_per_week": 3,
+    "squat_1rm": 140, "bench_1rm": 100, "deadlift_1rm": 180, "ohp_1rm": 60, "gym_equipment": "",
+}
+EDITED = {**PROFILE, "days_per_week": 4}
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "sqlite:///" + str(tmp_path / "test.db"))
+    monkeypatch.setenv("JOB_BACKEND", "worker")  # Jobs stay queued until run_job
+    from app import create_app
+
+    app = create_app()
+    app.config["TESTING"] = True
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def user_id(app, monkeypatch):
+    import ai_engine
+    from app import db
+    from models import User
+    from progression import local_plan
+
+    monkeypatch.setattr(ai_engine, "generate_plan_with_ai", lambda data, week_number, previous_plan: local_plan(
+        data, week_number, previous_plan))
+    user = User(email="gen@example.com", password_hash="x")
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def _status(job_id):
+    from app import db
+    from models import Job
+
+    db.session.expire_all()
+    return db.session.get(Job, job_id).status
+
+
+def test_same_request_reuses_the_queued_job(user_id):
+    from ai_engine import queue_plan_generation
+
+    first = queue_plan_generation(user_id, dict(PROFILE))
+    assert queue_plan_generation(user_id, dict(PROFILE)).id == first.id
+
+
+def test_edit_cancels_a_queued_generation(user_id):
+    from ai_engine import queue_plan_generation
+    from jobs import run_job
+    from plans import get_latest_plan
+
+    first = queue_plan_generation(user_id, PROFILE)
+    second = queue_plan_generation(user_id, EDITED)
+    assert second.id != first.id
+    assert _status(first.id) == "cancelled"
+
+    run_job(first.id)  # A worker that picks it up anyway does nothing
+    run_job(second.id)
+    assert _status(second.id) == "done"
+    assert len(get_latest_plan(user_id).days) == 4
+
+
+def test_edit_supersedes_a_running_generation(user_id, monkeypatch):
+    import ai_engine
+    from jobs import run_job
+    from plans import get_latest_plan
+
+    first = ai_engine.queue_plan_generation(user_id, PROFILE)
+    generate = ai_engine.generate_plan_with_ai
+
+    def edit_while_generating(data, week_number, previous_plan):
+        # The user saves their profile while this job is talking to the API
+        monkeypatch.setattr(ai_engine, "generate_plan_with_ai", generate)
+        ai_engine.queue_plan_generation(user_id, EDITED)
+        return generate(data, week_number, previous_plan)
+
+    monkeypatch.setattr(ai_engine, "generate_plan_with_ai", edit_while_generating)
+    run_job(first.id)
+    assert _status(first.id) == "done"
+    assert get_latest_plan(user_id) is None  # The older profile's plan wasn't saved
+
+    run_job(ai_engine.latest_job(user_id, "generate_plan").id)
+    assert len(get_latest_plan(user_id).days) == 4
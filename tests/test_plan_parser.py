@@ -0,0 +1,65 @@
+"""Parsing and repairing AI plan responses.
+
+    python -m pytest tests
+"""
+import json
+
+import pytest
+
+from plan_parser import MAX_PREAMBLE, PlanStreamParser, PlanStructureError, parse_plan
+
+
+def _day(index, names=("Back Squat", "Bench Press")):
+    return {
+        "day_index": index,
+        "label": f"Day {index + 1}",
+        "exercises": [{"name": n, "sets": 3, "reps": 8, "weight_kg": 60, "muscle_group": "legs"} for n in names],
+    }
+
+
+PLAN = json.dumps([_day(0), _day(1)], indent=2)
+
+
+def _labels(days):
+    return [day and day["label"] for day in days]
+
+
+def test_fenced():
+    days = parse_plan(f"Here is your plan:\n```json\n{PLAN}\n```\nGood luck!")
+    assert _labels(days) == ["Day 1", "Day 2"]
+
+
+def test_quoted_prose_and_brackets_before_the_array():
+    text = f'As "progressive overload" [1] suggests, {{start light}} [see notes]:\n{PLAN}'
+    assert _labels(parse_plan(text)) == ["Day 1", "Day 2"]
+
+
+def test_array_split_across_chunks():
+    parser = PlanStreamParser()
+    for chunk in ["Plan: [", "  \n", " {", PLAN.split("{", 1)[1]]:
+        parser.feed(chunk)
+    assert _labels(parser.finish()) == ["Day 1", "Day 2"]
+
+
+def test_truncated_last_day_keeps_its_complete_exercises():
+    text = json.dumps([_day(0), _day(1, names=("Deadlift", "Row", "Curl"))])
+    cut = text.index('"Curl"') + 8  # Mid-way through the last exercise
+    days = parse_plan(text[:cut])
+    assert _labels(days) == ["Day 1", "Day 2"]
+    assert [ex["name"] for ex in days[1]["exercises"]] == ["Deadlift", "Row"]
+
+
+def test_trailing_commas():
+    text = PLAN.replace('"legs"\n', '"legs",\n').replace("\n  }\n]", "\n  },\n]")
+    assert text != PLAN
+    assert _labels(parse_plan(text)) == ["Day 1", "Day 2"]
+
+
+def test_broken_day_is_none():
+    text = json.dumps([_day(0), {"label": "Day 2", "exercises": []}, _day(2)])
+    assert _labels(parse_plan(text)) == ["Day 1", None, "Day 3"]
+
+
+def test_response_without_an_array_is_rejected_early():
+    with pytest.raises(PlanStructureError):
+        parse_plan('{"error": "I can\'t help with that"} ' + "x" * MAX_PREAMBLE)
@@ -0,0 +1,174 @@
+"""Query counts for loading and rendering plans.
+
+Plans, days and their logs are loaded with a fixed number of queries (see
+``plans``). Each test builds a one-day plan and a large one, each exercise
+logged and noted, and checks that both cost the same number of SQL
+statements, so a lazy load per day or per exercise can't creep back in.
+
+    python -m pytest tests
+"""
+import pytest
+from sqlalchemy import event
+
+SMALL = (1, 2)  # days, exercises per day
+LARGE = (6, 10)
+
+
+def _plan(days, exercises):
+    return [
+        {
+            "day_index": d,
+            "label": f"Day {d + 1}",
+            "exercises": [
+                {"name": f"Exercise {d}-{e}", "sets": 3, "reps": 8, "weight_kg": 50.0, "muscle_group": "chest"}
+                for e in range(exercises)
+            ],
+        }
+        for d in range(days)
+    ]
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "sqlite:///" + str(tmp_path / "test.db"))
+    monkeypatch.setenv("JOB_BACKEND", "worker")  # Nothing here should start job threads
+    monkeypatch.setenv("PDF_CACHE_DIR", str(tmp_path / "pdf_cache"))
+    from app import create_app
+
+    app = create_app()
+    app.config["TESTING"] = True
+    return app
+
+
+@pytest.fixture
+def make_user(app):
+    """Create a user with a profile and a logged, noted plan of ``(days, exercises)``; returns the id."""
+    from app import db
+    from models import Profile, User
+    from plan_writer import create_plan
+    from plans import plan_exercises
+    from workout_logs import record_sets, upsert_note
+
+    def make(size):
+        with app.app_context():
+            return _make(size)
+
+    def _make(size):
+        days, exercises = size
+        user = User(email=f"user-{days}x{exercises}@example.com", password_hash="x")
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(Profile(
+            user_id=user.id, height_cm=180, weight_kg=80, goal="muscle", plan_type="full_body",
+            days_per_week=days, squat_1rm=140, bench_1rm=100, deadlift_1rm=180, ohp_1rm=60,
+        ))
+        db.session.commit()
+        plan = create_plan(user.id, 1, _plan(days, exercises))
+        logged = plan_exercises(plan)
+        record_sets(user.id, [
+            {"exercise_id": ex.id, "set_index": i, "reps": 8, "weight_kg": 50.0, "rpe": None}
+            for ex in logged
+            for i in range(ex.sets)
+        ])
+        for ex in logged:
+            upsert_note(user.id, ex.name, "Pause at the bottom", commit=False)
+        db.session.commit()
+        return user.id
+
+    return make
+
+
+@pytest.fixture
+def count_queries(app):
+    """``count_queries(fn)`` runs ``fn`` and returns the number of statements it sent.
+
+    ``fn`` pushes its own app context (a request does), so it starts with an
+    empty session and nothing comes from the identity map.
+    """
+    from app import db
+
+    with app.app_context():
+        engine = db.engine
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+
+    def count(fn):
+        statements.clear()
+        fn()
+        return len(statements)
+
+    yield count
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def _first_day_id(app, user_id):
+    from models import WorkoutDay, WorkoutPlan
+
+    with app.app_context():
+        return WorkoutDay.query.join(WorkoutPlan).filter(
+            WorkoutPlan.user_id == user_id, WorkoutDay.day_index == 0
+        ).one().id
+
+
+def _log_in(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+        session["_fresh"] = True
+    return client
+
+
+def test_latest_plan_queries_do_not_grow(app, make_user, count_queries):
+    from plans import get_latest_plan, load_logs_and_notes, plan_exercises
+
+    def load(user_id):
+        with app.app_context():
+            exercises = plan_exercises(get_latest_plan(user_id))
+            load_logs_and_notes(user_id, exercises)
+
+    counts = []
+    for size in (SMALL, LARGE):
+        user_id = make_user(size)
+        counts.append(count_queries(lambda: load(user_id)))
+    assert counts[0] == counts[1]
+
+
+def test_day_queries_do_not_grow(app, make_user, count_queries):
+    from plans import get_day, load_logs_and_notes, load_sets
+
+    def load(user_id, day_id):
+        with app.app_context():
+            day = get_day(day_id)
+            load_logs_and_notes(user_id, day.exercises)
+            load_sets(user_id, day.exercises)
+            return day.plan.week_number
+
+    counts = []
+    for size in (SMALL, LARGE):
+        user_id = make_user(size)
+        day_id = _first_day_id(app, user_id)
+        counts.append(count_queries(lambda: load(user_id, day_id)))
+    assert counts[0] == counts[1]
+
+
+@pytest.mark.parametrize("page", ["plan", "day", "session", "export_pdf"])
+def test_page_queries_do_not_grow(app, make_user, count_queries, page):
+    def get(client, url):
+        assert client.get(url).status_code == 200
+
+    counts = []
+    for size in (SMALL, LARGE):
+        user_id = make_user(size)
+        url = {
+            "plan": "/workout/plan",
+            "day": "/workout/day/0",
+            "session": f"/workout/session/{_first_day_id(app, user_id)}",
+            "export_pdf": "/workout/export-pdf",
+        }[page]
+        client = _log_in(app, user_id)
+        counts.append(count_queries(lambda: get(client, url)))
+    assert counts[0] == counts[1]
@@ -0,0 +1,71 @@
+"""The logged-in user cache across workers.
+
+Two apps stand in for two workers sharing one backend (Redis in
+production), so an invalidation in one must be seen by the other.
+
+    python -m pytest tests
+"""
+import pytest
+
+
+@pytest.fixture
+def workers(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "sqlite:///" + str(tmp_path / "test.db"))
+    monkeypatch.setenv("JOB_BACKEND", "worker")
+    from app import create_app
+    from user_cache import MemoryBackend, UserCache
+
+    shared = MemoryBackend(16)
+    apps = [create_app(), create_app()]
+    for app in apps:
+        app.config["TESTING"] = True
+        app.extensions["user_cache"] = UserCache(shared, ttl=60)
+    return apps
+
+
+def _user(app):
+    from app import db
+    from models import Profile, User
+
+    with app.app_context():
+        user = User(email="cache@example.com", password_hash="x")
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(Profile(
+            user_id=user.id, height_cm=180, weight_kg=80, goal="muscle", plan_type="full_body",
+            days_per_week=3, squat_1rm=140, bench_1rm=100, deadlift_1rm=180, ohp_1rm=60,
+        ))
+        db.session.commit()
+        return user.id
+
+
+def test_invalidation_reaches_other_workers(workers):
+    import user_cache
+    from app import db
+    from models import Profile
+
+    a, b = workers
+    user_id = _user(a)
+    with b.app_context():
+        assert user_cache.load_user(user_id).profile.weight_kg == 80  # b now holds a snapshot
+
+    with a.app_context():
+        Profile.query.filter_by(user_id=user_id).update({"weight_kg": 91})
+        db.session.commit()
+        user_cache.invalidate(user_id)
+
+    with b.app_context():
+        assert user_cache.load_user(user_id).profile.weight_kg == 91
+
+
+def test_snapshot_written_across_an_invalidation_is_not_served(workers):
+    import user_cache
+
+    a, _ = workers
+    user_id = _user(a)
+    with a.app_context():
+        cache = user_cache.get_user_cache()
+        _, generation = cache.get(user_id)  # A request misses and reads the row...
+        user_cache.invalidate(user_id)  # ...another commits a change...
+        cache.set(user_id, generation, {"user": {}, "profile": None})  # ...then the first stores what it read
+        assert cache.get(user_id)[0] is None
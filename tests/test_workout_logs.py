@@ -0,0 +1,66 @@
+"""Logging results through the workout routes.
+
+    python -m pytest tests
+"""
+import pytest
+
+PLAN = [{
+    "day_index": 0, "label": "Day 1",
+    "exercises": [{"name": "Back Squat", "sets": 3, "reps": 5, "weight_kg": 100.0, "muscle_group": "legs"}],
+}]
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "sqlite:///" + str(tmp_path / "test.db"))
+    monkeypatch.setenv("JOB_BACKEND", "worker")
+    from app import create_app
+
+    app = create_app()
+    app.config["TESTING"] = True
+    return app
+
+
+@pytest.fixture
+def logged_in(app):
+    """A client logged in as a user with a one-exercise plan; returns (client, user_id, exercise_id)."""
+    from app import db
+    from models import Profile, User
+    from plan_writer import create_plan
+    from plans import plan_exercises
+
+    with app.app_context():
+        user = User(email="log@example.com", password_hash="x")
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(Profile(
+            user_id=user.id, height_cm=180, weight_kg=80, goal="strength", plan_type="full_body",
+            days_per_week=1, squat_1rm=140, bench_1rm=100, deadlift_1rm=180, ohp_1rm=60,
+        ))
+        db.session.commit()
+        user_id = user.id
+        exercise_id = plan_exercises(create_plan(user_id, 1, PLAN))[0].id
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+        session["_fresh"] = True
+    return client, user_id, exercise_id
+
+
+def test_summary_log_corrects_earlier_sets(app, logged_in):
+    from models import WorkoutLog, WorkoutSet
+
+    client, user_id, exercise_id = logged_in
+    sets = [{"exercise_id": exercise_id, "set_index": i, "reps": 5, "weight_kg": 100} for i in range(3)]
+    assert client.post("/workout/log/batch", json={"sets": sets}).status_code == 200
+
+    # Corrected from the day view: 80 kg, not 100
+    response = client.post("/workout/log", json={"exercise_id": exercise_id, "actual_reps": 5, "actual_weight_kg": 80})
+    assert response.status_code == 200
+
+    with app.app_context():
+        log = WorkoutLog.query.filter_by(user_id=user_id, exercise_id=exercise_id).one()
+        assert (log.actual_reps, log.actual_weight_kg) == (5, 80)
+        stored = WorkoutSet.query.filter_by(user_id=user_id, exercise_id=exercise_id).all()
+        assert [(s.set_index, s.weight_kg) for s in stored] == [(0, 80)]
@@ -0,0 +1,176 @@
+"""Short-lived cache of the logged-in user, their profile and current plan id.
+
+Every authenticated request loads the user, and nearly every page then
+touches ``current_user.profile`` and the current plan. ``load_user`` serves
+the user (including ``current_plan_id``) and profile from a snapshot kept for
+``USER_CACHE_TTL`` seconds, re-attached to the request's session with
+``merge(load=False)``, which emits no SQL.
+
+Snapshots are stamped with a per-user generation; ``invalidate`` (called
+when a profile is saved and when a plan is created) bumps it, so a snapshot
+read or written around an invalidation is never served. A hit costs one
+backend round trip for both keys. Where the snapshots live decides who sees
+an invalidation:
+
+- ``USER_CACHE_URL`` (a Redis URL): shared by every web and job worker.
+  Required for multi-worker deployments.
+- in-process (``USER_CACHE_LOCAL=1``, the default on SQLite): only for a
+  single process running its own jobs (``JOB_BACKEND=thread``,
+  ``WEB_CONCURRENCY`` unset or 1); otherwise it is turned off.
+
+With neither, the user and profile are read with one joined query per
+request. The password hash is never cached; it loads on first access like
+any expired attribute.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy.orm import joinedload, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app import db
+from food_cache import LRUCache
+from models import Profile, User
+
+logger = logging.getLogger(__name__)
+
+USER_FIELDS = ("id", "email", "created_at", "current_plan_id")
+PROFILE_FIELDS = tuple(column.key for column in Profile.__table__.columns)
+
+
+class MemoryBackend:
+    """The subset of the Redis client UserCache uses, in process memory."""
+
+    def __init__(self, max_size):
+        self.values = LRUCache(max_size)
+        # Generations outlive snapshots: an evicted one would read as 0 and revive old snapshots
+        self.generations = LRUCache(max_size * 4)
+        self._incr_lock = threading.Lock()
+
+    def _store(self, key):
+        return self.generations if key.endswith(":gen") else self.values
+
+    def mget(self, keys):
+        result = []
+        for key in keys:
+            entry = self._store(key).get(key)
+            result.append(entry[0] if entry is not None and time.monotonic() < entry[1] else None)
+        return result
+
+    def set(self, key, value, ex):
+        self._store(key).set(key, (value, time.monotonic() + ex))
+
+    def incr(self, key):
+        with self._incr_lock:
+            value = int(self.mget([key])[0] or 0) + 1
+            self.generations.set(key, (value, float("inf")))
+        return value
+
+    def delete(self, key):
+        self._store(key).set(key, (None, 0))
+
+
+class UserCache:
+    def __init__(self, backend, ttl=30):
+        # Anything with mget, set(key, value, ex=seconds), incr and delete, e.g. a redis client
+        self.backend = backend
+        self.ttl = ttl
+
+    @staticmethod
+    def _keys(user_id):
+        return f"forgefit:user:{user_id}", f"forgefit:user:{user_id}:gen"
+
+    def get(self, user_id):
+        """``(snapshot or None, generation)``; store a fresh snapshot under that generation."""
+        raw, generation = self.backend.mget(self._keys(user_id))
+        generation = int(generation or 0)
+        if raw is not None:
+            snapshot = json.loads(raw)
+            if snapshot["generation"] == generation:
+                return snapshot, generation
+        return None, generation
+
+    def set(self, user_id, generation, snapshot):
+        key, _ = self._keys(user_id)
+        self.backend.set(key, json.dumps({**snapshot, "generation": generation}), ex=self.ttl)
+
+    def invalidate(self, user_id):
+        key, generation_key = self._keys(user_id)
+        # Bump first: from here on any snapshot, even one being written right now, is stale
+        self.backend.incr(generation_key)
+        self.backend.delete(key)
+
+
+def _single_process(config):
+    return config.get("JOB_BACKEND", "thread") == "thread" and int(os.environ.get("WEB_CONCURRENCY") or 1) <= 1
+
+
+def get_user_cache():
+    """The app-wide UserCache, created on first use from config; None when caching is off."""
+    extensions = current_app.extensions
+    if "user_cache" not in extensions:
+        config = current_app.config
+        cache = None
+        if config["USER_CACHE_URL"]:
+            import redis  # Only needed when a shared backend is configured
+            cache = UserCache(redis.Redis.from_url(config["USER_CACHE_URL"]), ttl=config["USER_CACHE_TTL"])
+        elif config["USER_CACHE_LOCAL"]:
+            if _single_process(config):
+                cache = UserCache(MemoryBackend(config["USER_CACHE_SIZE"]), ttl=config["USER_CACHE_TTL"])
+            else:
+                logger.warning("USER_CACHE_LOCAL needs a single process running its own jobs; "
+                               "set USER_CACHE_URL to cache users across workers")
+        extensions["user_cache"] = cache
+    return extensions["user_cache"]
+
+
+def _load(user_id):
+    """The user with their profile, in one query."""
+    return User.query.options(joinedload(User.profile)).filter_by(id=user_id).first()
+
+
+def _snapshot(user):
+    """Plain, JSON-safe copy of what load_user needs."""
+    profile = user.profile
+    return {
+        "user": {**{f: getattr(user, f) for f in USER_FIELDS}, "created_at": user.created_at.isoformat()},
+        "profile": {f: getattr(profile, f) for f in PROFILE_FIELDS} if profile else None,
+    }
+
+
+def _attach(model, fields):
+    """A persistent instance in the current session built from cached column values, without SQL."""
+    obj = model(**fields)
+    make_transient_to_detached(obj)
+    return db.session.merge(obj, load=False)
+
+
+def load_user(user_id):
+    """flask_login user loader: the user with ``profile`` already populated."""
+    cache = get_user_cache()
+    if cache is None:
+        return _load(user_id)
+
+    snapshot, generation = cache.get(user_id)
+    if snapshot is None:
+        user = _load(user_id)
+        if user is not None:
+            cache.set(user_id, generation, _snapshot(user))
+        return user
+
+    user = _attach(User, {**snapshot["user"], "created_at": datetime.fromisoformat(snapshot["user"]["created_at"])})
+    profile = _attach(Profile, snapshot["profile"]) if snapshot["profile"] else None
+    set_committed_value(user, "profile", profile)
+    return user
+
+
+def invalidate(user_id):
+    """Drop a user's snapshot after their profile or current plan changes. Call after the commit."""
+    cache = get_user_cache()
+    if cache is not None:
+        cache.invalidate(user_id)
@@ -0,0 +1,237 @@
+"""Writing workout logs.
+
+Every logged set is stored in ``workout_set``; ``workout_log`` keeps one
+summary row per exercise (the top set) for the plan, day and progression
+views, and ``exercise_daily_stat`` holds the per-day progress rollup (see
+``progress``). ``record_sets`` writes a whole batch with a fixed number of
+statements in a single transaction. ``apply_sync_ops`` applies queued
+offline writes exactly once, using client-generated idempotency keys.
+"""
+from datetime import datetime
+
+from sqlalchemy import delete, insert, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app import db
+from models import Exercise, ExerciseNote, SyncReceipt, WorkoutDay, WorkoutPlan, WorkoutLog, WorkoutSet
+from progress import logged_range, refresh_daily_stats, top_set
+
+MAX_SETS_PER_BATCH = 500
+MAX_SYNC_OPS = 500
+
+
+class InvalidSets(ValueError):
+    """The batch of sets is malformed."""
+
+
+class UnknownExercise(InvalidSets):
+    """The batch references an exercise that doesn't exist or isn't the user's."""
+
+
+def _parse_set(raw):
+    try:
+        parsed = {
+            "exercise_id": int(raw["exercise_id"]),
+            "set_index": int(raw.get("set_index", 0)),
+            "reps": int(raw["reps"]),
+            "weight_kg": float(raw["weight_kg"]),
+            "rpe": float(raw["rpe"]) if raw.get("rpe") not in (None, "") else None,
+        }
+    except (KeyError, TypeError, ValueError):
+        raise InvalidSets("Each set needs exercise_id, reps and weight_kg")
+    if parsed["set_index"] < 0 or parsed["reps"] < 0 or parsed["weight_kg"] < 0:
+        raise InvalidSets("set_index, reps and weight_kg must not be negative")
+    if parsed["rpe"] is not None and not 1 <= parsed["rpe"] <= 10:
+        raise InvalidSets("rpe must be between 1 and 10")
+    return parsed
+
+
+def parse_sets(raw_sets):
+    """Validate a list of set dicts from a request body."""
+    if not isinstance(raw_sets, list) or not raw_sets:
+        raise InvalidSets("'sets' must be a non-empty list")
+    if len(raw_sets) > MAX_SETS_PER_BATCH:
+        raise InvalidSets(f"At most {MAX_SETS_PER_BATCH} sets per batch")
+    if not all(isinstance(raw, dict) for raw in raw_sets):
+        raise InvalidSets("Each set must be an object")
+    return [_parse_set(raw) for raw in raw_sets]
+
+
+def _upsert_sets(rows):
+    dialect_insert = pg_insert if db.engine.dialect.name == "postgresql" else sqlite_insert
+    stmt = dialect_insert(WorkoutSet)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "exercise_id", "set_index"],
+        set_={
+            "reps": stmt.excluded.reps,
+            "weight_kg": stmt.excluded.weight_kg,
+            "rpe": stmt.excluded.rpe,
+            "logged_at": stmt.excluded.logged_at,
+        },
+    )
+    db.session.execute(stmt, rows)
+
+
+def _refresh_summaries(user_id, exercise_ids, now):
+    """Point each exercise's WorkoutLog row at its current top set."""
+    sets_by_exercise = {}
+    for exercise_id, reps, weight in db.session.query(
+        WorkoutSet.exercise_id, WorkoutSet.reps, WorkoutSet.weight_kg
+    ).filter(
+        WorkoutSet.user_id == user_id,
+        WorkoutSet.exercise_id.in_(exercise_ids),
+    ):
+        sets_by_exercise.setdefault(exercise_id, []).append((reps, weight))
+
+    existing = dict(db.session.query(WorkoutLog.exercise_id, WorkoutLog.id).filter(
+        WorkoutLog.user_id == user_id,
+        WorkoutLog.exercise_id.in_(exercise_ids),
+    ).all())
+
+    updates, inserts = [], []
+    for exercise_id, sets in sets_by_exercise.items():
+        reps, weight = top_set(sets)
+        row = {"actual_reps": reps, "actual_weight_kg": weight, "logged_at": now}
+        if exercise_id in existing:
+            updates.append({"id": existing[exercise_id], **row})
+        else:
+            inserts.append({"exercise_id": exercise_id, "user_id": user_id, **row})
+
+    # Bulk statements: one executemany each, no per-row round trips
+    if updates:
+        db.session.execute(update(WorkoutLog), updates)
+    if inserts:
+        db.session.execute(insert(WorkoutLog), inserts)
+
+
+def _owned_exercise_ids(user_id, exercise_ids):
+    return {
+        row[0]
+        for row in db.session.query(Exercise.id)
+        .join(WorkoutDay, Exercise.day_id == WorkoutDay.id)
+        .join(WorkoutPlan, WorkoutDay.plan_id == WorkoutPlan.id)
+        .filter(Exercise.id.in_(exercise_ids), WorkoutPlan.user_id == user_id)
+    }
+
+
+def record_sets(user_id, sets, commit=True, replace=False):
+    """Write parsed sets (see ``parse_sets``) for a user in one transaction.
+
+    Re-sending a set with the same (exercise_id, set_index) overwrites it;
+    with ``replace`` the batch also drops the exercises' other stored sets.
+    Raises UnknownExercise if any exercise doesn't belong to the user.
+    """
+    exercise_ids = {s["exercise_id"] for s in sets}
+    if _owned_exercise_ids(user_id, exercise_ids) != exercise_ids:
+        raise UnknownExercise("Exercise not found")
+
+    # Overwritten sets may move between days; refresh where they were too
+    previous = logged_range(user_id, exercise_ids)
+    now = datetime.utcnow()
+    rows = {}
+    for s in sets:
+        # Last write wins for duplicate set keys inside one batch
+        rows[(s["exercise_id"], s["set_index"])] = {**s, "user_id": user_id, "logged_at": now}
+
+    if replace:
+        db.session.execute(delete(WorkoutSet).where(
+            WorkoutSet.user_id == user_id,
+            WorkoutSet.exercise_id.in_(exercise_ids),
+        ))
+    _upsert_sets(list(rows.values()))
+    _refresh_summaries(user_id, exercise_ids, now)
+    first_day = min(previous[0], now).date() if previous else now.date()
+    refresh_daily_stats(user_id, exercise_ids, first_day, now.date())
+    if commit:
+        db.session.commit()
+    return len(rows)
+
+
+def upsert_note(user_id, exercise_name, note, commit=True):
+    """Create, update or clear a user's personal note for an exercise name."""
+    exercise_name = exercise_name.strip().lower()
+    note = note.strip()
+    existing = ExerciseNote.query.filter_by(user_id=user_id, exercise_name=exercise_name).first()
+    if existing:
+        existing.note = note
+        existing.updated_at = datetime.utcnow()
+    elif note:  # Only create if there's actually a note
+        db.session.add(ExerciseNote(user_id=user_id, exercise_name=exercise_name, note=note))
+    if commit:
+        db.session.commit()
+
+
+def apply_sync_ops(user_id, ops):
+    """Apply a batch of queued offline writes exactly once.
+
+    Each op is ``{"key": <idempotency key>, "type": "set" | "note",
+    "user_id": <queueing account>, ...}``. Ops whose key was already
+    applied are skipped; malformed ops, and ops queued by another account
+    on a shared browser, are rejected without blocking the rest. Everything
+    else, plus the new receipts, is committed in one transaction.
+
+    Returns ``(applied_keys, duplicate_keys, rejected)`` where ``rejected``
+    maps key -> reason.
+    """
+    if not isinstance(ops, list):
+        raise InvalidSets("'ops' must be a list")
+    if len(ops) > MAX_SYNC_OPS:
+        raise InvalidSets(f"At most {MAX_SYNC_OPS} ops per sync")
+
+    rejected = {}
+    keyed = {}
+    for op in ops:
+        key = op.get("key") if isinstance(op, dict) else None
+        if not isinstance(key, str) or not 8 <= len(key) <= 64:
+            continue  # Without a usable key there is nothing to acknowledge
+        keyed[key] = op
+
+    seen = {
+        row[0]
+        for row in db.session.query(SyncReceipt.idempotency_key).filter(
+            SyncReceipt.user_id == user_id,
+            SyncReceipt.idempotency_key.in_(list(keyed)),
+        )
+    }
+    duplicates = [key for key in keyed if key in seen]
+
+    sets, set_keys, notes = [], {}, []
+    for key, op in keyed.items():
+        if key in seen:
+            continue
+        if op.get("user_id") != user_id:
+            rejected[key] = "Op was queued by another account"
+            continue
+        try:
+            if op.get("type") == "set":
+                parsed = _parse_set(op)
+                sets.append(parsed)
+                set_keys[key] = parsed["exercise_id"]
+            elif op.get("type") == "note" and op.get("exercise_name"):
+                notes.append((key, str(op["exercise_name"]), str(op.get("note") or "")))
+            else:
+                rejected[key] = "Unknown op"
+        except InvalidSets as e:
+            rejected[key] = str(e)
+
+    if sets:
+        owned = _owned_exercise_ids(user_id, set(set_keys.values()))
+        for key, exercise_id in set_keys.items():
+            if exercise_id not in owned:
+                rejected[key] = "Exercise not found"
+        sets = [s for s in sets if s["exercise_id"] in owned]
+        if sets:
+            record_sets(user_id, sets, commit=False)
+    for key, exercise_name, note in notes:
+        upsert_note(user_id, exercise_name, note, commit=False)
+
+    applied = [key for key in keyed if key not in seen and key not in rejected]
+    if applied:
+        now = datetime.utcnow()
+        db.session.execute(
+            insert(SyncReceipt),
+            [{"user_id": user_id, "idempotency_key": key, "created_at": now} for key in applied],
+        )
+    db.session.commit()
+    return applied, duplicates, rejected